@@ -0,0 +1,143 @@
+"""
+Benchmark: action dispatch latency for each Assistant Service deployment mode.
+
+Starts the Integrations and Actions services as local uvicorn processes, then
+dispatches the same action through each transport the Assistant Service
+supports:
+
+    http                    assistant -> actions -> integrations (two HTTP hops)
+    inprocess               actions library in-process -> integrations over HTTP
+    inprocess+integrations  actions library and integrations app in-process (ASGI)
+
+The action is send_slack_notification with SLACK_WEBHOOK_URL unset, so the
+Integrations handler answers with a mock response and only the hop overhead is
+measured.
+
+    python benchmarks/bench_dispatch_modes.py --requests 500 --concurrency 1
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = os.path.join(ROOT, "services")
+
+
+def load_module(name, relative_path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+transport_module = load_module("action_transport", "services/assistant/app/action_transport.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(service, port, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.join(SERVICES, service),
+        env={**os.environ, **env},
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{service} did not start on port {port}")
+
+
+async def measure(transport, total, concurrency):
+    action_request = {
+        "action": "send_slack_notification",
+        "details": {"message": "Benchmark notification", "channel": "#bench"},
+        "user_token": "bench-token",
+    }
+    headers = {"Authorization": "Bearer bench-token"}
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await transport.execute_action(action_request, headers)
+            samples.append((time.perf_counter() - started) * 1000)
+
+    await transport.start()
+    try:
+        # Warm up connections and lazy imports before timing
+        for _ in range(min(20, total)):
+            await transport.execute_action(action_request, headers)
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await transport.close()
+
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "mean": statistics.fmean(samples),
+        "rps": total / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.pop("SLACK_WEBHOOK_URL", None)
+    integrations_port, actions_port = free_port(), free_port()
+    integrations_url = f"http://127.0.0.1:{integrations_port}"
+    actions_url = f"http://127.0.0.1:{actions_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        processes = [
+            start_service("integrations", integrations_port, {}),
+            start_service("actions", actions_port, {
+                "INTEGRATIONS_SERVICE_URL": integrations_url,
+                "ACTION_QUEUE_PATH": os.path.join(tmp, "action_queue.db"),
+            }),
+        ]
+        try:
+            modes = [
+                ("http", transport_module.create_action_transport("http", actions_url, integrations_url)),
+                ("inprocess", transport_module.create_action_transport("inprocess", actions_url, integrations_url)),
+                ("inprocess+integrations", transport_module.create_action_transport(
+                    "inprocess", actions_url, integrations_url, integrations_mode="inprocess"
+                )),
+            ]
+            results = [(name, asyncio.run(measure(transport, args.requests, args.concurrency))) for name, transport in modes]
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=10)
+
+    print(f"requests={args.requests} concurrency={args.concurrency} python={sys.version.split()[0]}")
+    print(f"{'mode':<24}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'req/s':>10}")
+    for name, r in results:
+        print(f"{name:<24}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['mean']:>10.3f}{r['rps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
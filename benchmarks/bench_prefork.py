@@ -0,0 +1,181 @@
+"""
+Benchmark: Assistant Service throughput and memory against worker count, for
+`uvicorn --workers N` (every worker loads its own models) and the preforking
+server in app/prefork.py (models loaded once, shared copy-on-write).
+
+The Integrations Service is replaced by benchmarks/stub_integrations.py and
+actions are dispatched in-process, so the Assistant is the only thing under
+load. For each configuration the benchmark drives POST /api/v1/recommend from
+keep-alive client threads for a fixed duration, then sums RSS, PSS and USS
+over the master and its workers. Summed RSS double-counts shared pages; PSS is
+the real total.
+
+    python benchmarks/bench_prefork.py --workers 1 2 4 --duration 10 --clients 16
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSISTANT_DIR = os.path.join(ROOT, "services", "assistant")
+sys.path.insert(0, ASSISTANT_DIR)
+
+from app.process_memory import memory_usage  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with status {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def process_tree(pid):
+    pids = [pid]
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children = [int(child) for child in f.read().split()]
+        except OSError:
+            continue
+        for child in children:
+            pids.extend(process_tree(child))
+    return pids
+
+
+def tree_memory(pid):
+    totals = {"processes": 0, "rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0}
+    for member in process_tree(pid):
+        usage = memory_usage(member)
+        if usage is None:
+            continue
+        totals["processes"] += 1
+        for key in ("rss_mb", "pss_mb", "uss_mb"):
+            totals[key] += usage[key]
+    return totals
+
+
+def drive_load(port, duration, clients):
+    body = json.dumps({"user_token": "bench-token", "user_id": "bench-user"})
+    headers = {"Content-Type": "application/json"}
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        ok = errors = 0
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.perf_counter() < stop_at:
+            try:
+                connection.request("POST", "/api/v1/recommend", body, headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    ok += 1
+                else:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        connection.close()
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {**counts, "rps": counts["ok"] / elapsed}
+
+
+def run_configuration(mode, workers, args, env):
+    port = free_port()
+    if mode == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--workers", str(workers)]
+    else:
+        command = [sys.executable, "-m", "app.prefork", "--workers", str(workers)]
+    command += ["--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+
+    process = subprocess.Popen(command, cwd=ASSISTANT_DIR, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        # Let every worker finish starting up, then warm them all
+        time.sleep(2 + workers)
+        drive_load(port, 1.0, workers * 2)
+        idle = tree_memory(process.pid)
+        load = drive_load(port, args.duration, args.clients)
+        loaded = tree_memory(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"mode": mode, "workers": workers, **load, "idle": idle, "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["uvicorn", "prefork"], default=["uvicorn", "prefork"])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=16)
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "stub_integrations.py"), "--port", str(stub_port)]
+    )
+    env = {
+        **os.environ,
+        "INTEGRATIONS_SERVICE_URL": f"http://127.0.0.1:{stub_port}",
+        "ACTIONS_DISPATCH_MODE": "inprocess",
+        "SCORING_SCHEDULER_ENABLED": "false",
+        "ACTION_COOLDOWN_ENABLED": "false",
+        "TRACE_EXPORTER": "none",
+        "PYTHONWARNINGS": "ignore",
+    }
+    results = []
+    try:
+        wait_for_port(stub_port, stub)
+        for workers in args.workers:
+            for mode in args.modes:
+                results.append(run_configuration(mode, workers, args, env))
+                print(f"done: {mode} x{workers}", file=sys.stderr)
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    print(f"duration={args.duration}s clients={args.clients} cpus={os.cpu_count()} python={sys.version.split()[0]}")
+    print(f"{'mode':<10}{'workers':>8}{'req/s':>10}{'errors':>8}"
+          f"{'rss MiB':>10}{'pss MiB':>10}{'uss MiB':>10}{'pss/worker':>12}")
+    for r in results:
+        memory = r["loaded"]
+        print(f"{r['mode']:<10}{r['workers']:>8}{r['rps']:>10.1f}{r['errors']:>8}"
+              f"{memory['rss_mb']:>10.1f}{memory['pss_mb']:>10.1f}{memory['uss_mb']:>10.1f}"
+              f"{memory['pss_mb'] / r['workers']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
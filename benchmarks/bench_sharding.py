@@ -0,0 +1,213 @@
+"""
+Benchmark: per-user cache hit rate and throughput of several Assistant replicas
+behind a round-robin load balancer, without and with user-affinity sharding
+(app/sharding.py).
+
+Each replica is a separate uvicorn process. The load generator plays the load
+balancer: every request goes to the next replica in turn, for a user drawn
+from a fixed pool. In "round_robin" mode each replica serves whatever it gets.
+In "sharded" mode the replicas share a node list and forward every user's
+requests to that user's owner. After each run the replicas' /metrics give the
+payload cache hit rate (an unchanged aggregate answered with 304 and the
+cached features reused) and the number of forwarded requests.
+
+The Integrations Service is replaced by benchmarks/stub_integrations.py (whose
+data never changes, so every miss is a first sighting of a user on that
+replica) and actions are dispatched in-process. The benchmark also reports
+how many users change owner when a node joins or leaves the ring.
+
+    python benchmarks/bench_sharding.py --nodes 1 2 3 4 --users 200 --duration 10 --clients 8
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSISTANT_DIR = os.path.join(ROOT, "services", "assistant")
+sys.path.insert(0, ASSISTANT_DIR)
+
+from app.sharding import HashRing  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with status {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def ring_movement(nodes, keys=20000):
+    """
+    Share of keys that change owner when a node joins an n-node ring, and when one leaves it.
+    """
+    names = [f"http://node-{i}" for i in range(nodes + 1)]
+    users = [f"id:user-{i}" for i in range(keys)]
+    before = HashRing(names[:nodes])
+    grown = HashRing(names)
+    shrunk = HashRing(names[1:nodes])
+    joined = sum(before.owner(user) != grown.owner(user) for user in users) / keys
+    left = sum(before.owner(user) != shrunk.owner(user) for user in users) / keys if nodes > 1 else None
+    return joined, left
+
+
+def drive_load(ports, users, duration, clients, seed=7):
+    headers = {"Content-Type": "application/json"}
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+    turn = itertools.count()
+    stop_at = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        connections = {port: http.client.HTTPConnection("127.0.0.1", port, timeout=60) for port in ports}
+        ok = errors = 0
+        while time.perf_counter() < stop_at:
+            port = ports[next(turn) % len(ports)]
+            user = rng.randrange(users)
+            body = json.dumps({"user_token": f"bench-token-{user}", "user_id": f"bench-user-{user}"})
+            try:
+                connections[port].request("POST", "/api/v1/recommend", body, headers)
+                response = connections[port].getresponse()
+                response.read()
+                if response.status == 200:
+                    ok += 1
+                else:
+                    errors += 1
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                connections[port].close()
+                connections[port] = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        for connection in connections.values():
+            connection.close()
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {**counts, "rps": counts["ok"] / elapsed}
+
+
+def replica_metrics(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("GET", "/metrics")
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def run_configuration(mode, nodes, args, env):
+    ports = [free_port() for _ in range(nodes)]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    processes = []
+    try:
+        for port, url in zip(ports, urls):
+            replica_env = dict(env)
+            if mode == "sharded":
+                replica_env["ASSISTANT_SHARD_NODES"] = ",".join(urls)
+                replica_env["ASSISTANT_SHARD_SELF"] = url
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app",
+                 "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                cwd=ASSISTANT_DIR, env=replica_env, stdout=subprocess.DEVNULL
+            ))
+        for port, process in zip(ports, processes):
+            wait_for_port(port, process)
+        load = drive_load(ports, args.users, args.duration, args.clients)
+        reused = fetches = forwarded = 0
+        for port in ports:
+            metrics = replica_metrics(port)
+            cache = metrics["payload_cache"]
+            reused += cache["features_reused"]
+            fetches += cache["not_modified"] + cache["modified"]
+            forwarded += (metrics.get("sharding") or {}).get("forwarded", 0)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+    return {
+        "mode": mode,
+        "nodes": nodes,
+        **load,
+        "hit_rate": reused / fetches if fetches else 0.0,
+        "forwarded": forwarded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--modes", nargs="+", choices=["round_robin", "sharded"], default=["round_robin", "sharded"])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "stub_integrations.py"), "--port", str(stub_port)]
+    )
+    env = {
+        **os.environ,
+        "INTEGRATIONS_SERVICE_URL": f"http://127.0.0.1:{stub_port}",
+        "ACTIONS_DISPATCH_MODE": "inprocess",
+        "SCORING_SCHEDULER_ENABLED": "false",
+        "ACTION_COOLDOWN_ENABLED": "false",
+        "FEATURE_HISTORY_ENABLED": "false",
+        "PREDICTION_STORE_ENABLED": "false",
+        "TRACE_EXPORTER": "none",
+        "PYTHONWARNINGS": "ignore",
+    }
+    results = []
+    try:
+        wait_for_port(stub_port, stub)
+        for nodes in args.nodes:
+            for mode in args.modes:
+                results.append(run_configuration(mode, nodes, args, env))
+                print(f"done: {mode} x{nodes}", file=sys.stderr)
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    print(f"users={args.users} duration={args.duration}s clients={args.clients} cpus={os.cpu_count()}")
+    print(f"{'mode':<12}{'nodes':>6}{'req/s':>10}{'errors':>8}{'hit rate':>10}{'forwarded':>11}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['nodes']:>6}{r['rps']:>10.1f}{r['errors']:>8}{r['hit_rate']:>10.1%}{r['forwarded']:>11}")
+
+    print()
+    print(f"{'nodes':>6}{'moved on join':>15}{'moved on leave':>16}{'ideal':>8}")
+    for nodes in sorted(set(args.nodes)):
+        joined, left = ring_movement(nodes)
+        print(f"{nodes:>6}{joined:>15.1%}{(f'{left:.1%}' if left is not None else '-'):>16}{1 / (nodes + 1):>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
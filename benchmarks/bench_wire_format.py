@@ -0,0 +1,134 @@
+"""
+Benchmark: JSON vs columnar binary wire format for /api/v1/data/aggregate.
+
+Builds a synthetic aggregate payload (calendar events + Google Fit heart-rate
+points), then compares payload size, server-side encode time, client-side
+decode time, and decode + feature computation time for both formats.
+
+    python benchmarks/bench_wire_format.py --events 500 --hr-points 20000
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(name, relative_path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+encoding = load_module("columnar_encoding", "services/integrations/app/columnar_encoding.py")
+decoding = load_module("columnar_decoding", "services/assistant/app/columnar_decoding.py")
+calendar_features = load_module("calendar_features", "services/assistant/app/calendar_features.py")
+
+
+def synthetic_payload(n_events, n_points, seed=7):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    events = []
+    for i in range(n_events):
+        start = now + timedelta(minutes=rng.randint(0, 24 * 60))
+        end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+        events.append({
+            "kind": "calendar#event",
+            "etag": f"\"{rng.getrandbits(48)}\"",
+            "id": f"evt{i:06d}{rng.getrandbits(32):08x}",
+            "status": "confirmed",
+            "htmlLink": f"https://www.google.com/calendar/event?eid=evt{i}",
+            "created": now.isoformat(),
+            "updated": now.isoformat(),
+            "summary": rng.choice(["Standup", "1:1", "Design review", "URGENT: incident follow-up", "Lunch"]),
+            "description": rng.choice(["", "Agenda in doc", "Please reply asap", "Weekly sync with the team"]),
+            "creator": {"email": "user@example.com", "self": True},
+            "organizer": {"email": "user@example.com", "self": True},
+            "start": {"dateTime": start.isoformat(), "timeZone": "UTC"},
+            "end": {"dateTime": end.isoformat(), "timeZone": "UTC"},
+            "iCalUID": f"evt{i}@google.com",
+            "sequence": 0,
+            "reminders": {"useDefault": True},
+            "eventType": "default",
+        })
+    start_ns = int((now - timedelta(hours=24)).timestamp() * 1e9)
+    points = []
+    for i in range(n_points):
+        t = start_ns + i * 4_000_000_000
+        points.append({
+            "startTimeNanos": str(t),
+            "endTimeNanos": str(t + 1_000_000_000),
+            "dataTypeName": "com.google.heart_rate.bpm",
+            "originDataSourceId": "raw:com.google.heart_rate.bpm:com.example:watch",
+            "value": [{"fpVal": rng.gauss(72, 9), "mapVal": []}],
+        })
+    return {"calendar_events": events, "heart_rate_data": points, "timestamp": now.isoformat()}
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def json_features(body):
+    data = json.loads(body)
+    accumulator = calendar_features.CalendarFeatureAccumulator()
+    for event in data["calendar_events"]:
+        accumulator.add(event)
+    heart_rates = [v["fpVal"] for p in data["heart_rate_data"] for v in p.get("value", []) if "fpVal" in v]
+    avg = round(sum(heart_rates) / len(heart_rates), 1) if heart_rates else 70.0
+    return accumulator.busy_hours(), accumulator.sleep_duration(), avg
+
+
+def columnar_features(body):
+    payload = decoding.decode_columnar(body)
+    return decoding.busy_hours(payload), decoding.sleep_duration(payload), decoding.heart_rate_average(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--hr-points", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = synthetic_payload(args.events, args.hr_points)
+    json_body = json.dumps(payload).encode("utf-8")
+    columnar_body = encoding.encode_user_data(
+        payload["calendar_events"], payload["heart_rate_data"], {"timestamp": payload["timestamp"]}
+    )
+
+    rows = [
+        ("payload bytes", len(json_body), len(columnar_body)),
+        ("encode ms", time_it(lambda: json.dumps(payload).encode("utf-8"), args.repeat),
+         time_it(lambda: encoding.encode_user_data(payload["calendar_events"], payload["heart_rate_data"]), args.repeat)),
+        ("decode ms", time_it(lambda: json.loads(json_body), args.repeat),
+         time_it(lambda: decoding.decode_columnar(columnar_body), args.repeat)),
+        ("decode+features ms", time_it(lambda: json_features(json_body), args.repeat),
+         time_it(lambda: columnar_features(columnar_body), args.repeat)),
+    ]
+
+    print(f"events={args.events} hr_points={args.hr_points} repeat={args.repeat} python={sys.version.split()[0]}")
+    print(f"{'metric':<20}{'json':>14}{'columnar':>14}{'ratio':>9}")
+    for name, json_value, columnar_value in rows:
+        ratio = json_value / columnar_value if columnar_value else float("inf")
+        print(f"{name:<20}{json_value:>14.3f}{columnar_value:>14.3f}{ratio:>8.1f}x")
+
+    json_result, columnar_result = json_features(json_body), columnar_features(columnar_body)
+    print(f"features json={json_result} columnar={columnar_result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Stand-in for the Integrations Service, used by the benchmarks that drive the
+full Assistant /recommend path without Google credentials.
+
+It serves synthetic calendar events and heart-rate points on the data endpoints
+the Assistant calls (aggregate, calendar, calendar/stream), one new inbox
+message per incremental emails/sync call, and acknowledges every POST (the
+action endpoints) with a success response. Data responses carry an ETag and
+answer a matching If-None-Match with 304, like the real service. --tail-fraction/--tail-ms delay a
+random share of GETs to imitate a dependency with a slow tail.
+
+    python benchmarks/stub_integrations.py --port 18001 --events 50 --hr-points 500
+    python benchmarks/stub_integrations.py --port 18001 --tail-fraction 0.05 --tail-ms 2000
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+from urllib.parse import parse_qs, urlparse
+
+
+def synthetic_data(n_events, n_points, seed=11):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    events = []
+    for i in range(n_events):
+        start = now - timedelta(hours=12) + timedelta(minutes=rng.randint(0, 24 * 60))
+        end = start + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+        events.append({
+            "summary": rng.choice(["Standup", "1:1", "Design review", "URGENT: reply asap", "Lunch"]),
+            "description": rng.choice(["", "Agenda in doc", "Important email follow-up", "Weekly sync"]),
+            "start": {"dateTime": start.isoformat()},
+            "end": {"dateTime": end.isoformat()},
+        })
+    start_ns = int((now - timedelta(hours=24)).timestamp() * 1e9)
+    points = [
+        {
+            "startTimeNanos": str(start_ns + i * 60_000_000_000),
+            "endTimeNanos": str(start_ns + i * 60_000_000_000 + 1_000_000_000),
+            "value": [{"fpVal": rng.gauss(74, 8)}],
+        }
+        for i in range(n_points)
+    ]
+    return events, points
+
+
+def make_handler(events, points, tail_fraction=0.0, tail_ms=0.0):
+    aggregate = json.dumps({
+        "calendar_events": events, "heart_rate_data": points, "timestamp": datetime.now(timezone.utc).isoformat()
+    }).encode("utf-8")
+    aggregate_without_calendar = json.dumps({
+        "calendar_events": [], "heart_rate_data": points, "timestamp": datetime.now(timezone.utc).isoformat()
+    }).encode("utf-8")
+    calendar = json.dumps({"events": events}).encode("utf-8")
+    stream = "".join(json.dumps(event) + "\n" for event in events).encode("utf-8")
+    history_ids = itertools.count(1000)
+
+    def email_sync(query):
+        history_id = next(history_ids)
+        subjects = ["Weekly digest", "URGENT: contract needs signature today", "Lunch on Friday?"]
+        count = 3 if "full=true" in query else 1
+        messages = [
+            {
+                "id": f"m{history_id}-{i}",
+                "subject": subjects[(history_id + i) % len(subjects)],
+                "snippet": "Please take a look when you get a chance",
+                "internal_date": int(datetime.now(timezone.utc).timestamp() * 1000),
+            }
+            for i in range(count)
+        ]
+        return json.dumps({
+            "messages": messages,
+            "history_id": str(history_id),
+            "previous_history_id": parse_qs(query).get("start_history_id", [None])[0],
+            "full_sync": count == 3,
+            "watermark_reset": False,
+            "truncated": False,
+        }).encode("utf-8")
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body, content_type="application/json", status=200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_data(self, body):
+            etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if tail_fraction and random.random() < tail_fraction:
+                time.sleep(tail_ms / 1000)
+            if url.path == "/api/v1/data/aggregate":
+                self._send_data(aggregate_without_calendar if "include_calendar=false" in url.query else aggregate)
+            elif url.path == "/api/v1/data/calendar":
+                self._send_data(calendar)
+            elif url.path == "/api/v1/data/calendar/stream":
+                self._send(stream, "application/x-ndjson")
+            elif url.path == "/api/v1/data/emails/sync":
+                self._send(email_sync(url.query))
+            elif url.path == "/health":
+                self._send(b'{"status": "healthy"}')
+            else:
+                self._send(b'{"detail": "Not Found"}', status=404)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._send(json.dumps({"status": "success", "stub": True, "path": self.path}).encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--hr-points", type=int, default=500)
+    parser.add_argument("--tail-fraction", type=float, default=0.0, help="share of GETs that are delayed")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="delay of those GETs")
+    args = parser.parse_args()
+
+    events, points = synthetic_data(args.events, args.hr_points)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(events, points, args.tail_fraction, args.tail_ms))
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
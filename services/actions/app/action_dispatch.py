@@ -0,0 +1,324 @@
+"""
+Action dispatch logic of the Actions Service, usable as a library.
+
+The Actions Service wraps an ActionDispatcher in HTTP endpoints. The Assistant
+Service can also import this module directly (in-process dispatch mode) to skip
+the assistant -> actions hop. The dispatcher reaches the Integrations Service
+through any httpx.AsyncClient, so a client with an ASGI transport collapses the
+actions -> integrations hop as well.
+
+Calls to the Integrations Service can be guarded by a circuit breaker (fail
+fast with 503 while it is down) and capped by the current request's deadline,
+whose remaining time is forwarded in the X-Request-Deadline-Ms header. Both
+come from the host service's resilience module and are passed in, because this
+module deliberately has no imports from the rest of the service package.
+Action POSTs are not idempotent, so they are never hedged.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class ActionRequest(BaseModel):
+    action: str
+    user_token: Optional[str] = None
+    details: Dict[str, Any] = {}
+    idempotency_key: Optional[str] = None
+
+class BulkActionRequest(BaseModel):
+    actions: List[ActionRequest]
+
+# --- Action Registry ---
+# Each action declares the Integrations endpoint it calls, how its payload is built
+# from the request details, and its timeout. Actions whose Integrations endpoint has a
+# bulk variant also declare it (and the list field it takes) for /execute_actions.
+# Adding an action only means registering a new payload builder below.
+
+@dataclass(frozen=True)
+class ActionHandler:
+    endpoint: str
+    build_payload: Callable[[Dict[str, Any]], Dict[str, Any]]
+    timeout: float = 30.0
+    bulk_endpoint: Optional[str] = None
+    bulk_field: Optional[str] = None
+    bulk_timeout: float = 120.0
+
+ACTION_HANDLERS: Dict[str, ActionHandler] = {}
+
+def register_action(
+    name: str,
+    endpoint: str,
+    timeout: float = 30.0,
+    bulk_endpoint: Optional[str] = None,
+    bulk_field: Optional[str] = None,
+    bulk_timeout: float = 120.0
+):
+    """
+    Decorator that registers a payload builder as the handler for an action.
+    """
+    def decorator(build_payload: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        ACTION_HANDLERS[name] = ActionHandler(
+            endpoint=endpoint,
+            build_payload=build_payload,
+            timeout=timeout,
+            bulk_endpoint=bulk_endpoint,
+            bulk_field=bulk_field,
+            bulk_timeout=bulk_timeout
+        )
+        return build_payload
+    return decorator
+
+@register_action(
+    "create_break_event", "/api/v1/create_calendar_event",
+    bulk_endpoint="/api/v1/create_calendar_events", bulk_field="events"
+)
+def build_break_event_payload(details: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": details.get("title", "Quick Break"),
+        "duration_minutes": details.get("duration", 15),
+        "description": details.get("description", "AI-suggested break time")
+    }
+
+@register_action(
+    "draft_email", "/api/v1/draft_email",
+    bulk_endpoint="/api/v1/draft_emails", bulk_field="emails"
+)
+def build_draft_email_payload(details: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "to": details.get("to"),
+        "subject": details.get("subject"),
+        "body": details.get("body")
+    }
+
+@register_action("send_slack_notification", "/api/v1/send_slack_notification")
+def build_slack_notification_payload(details: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "message": details.get("message"),
+        "channel": details.get("channel", "#team-harmonia")
+    }
+
+def auth_headers(user_token: Optional[str]) -> Dict[str, str]:
+    """
+    Forwards the user's token to the Integrations Service.
+    """
+    headers = {}
+    if user_token:
+        headers["Authorization"] = f"Bearer {user_token}"
+    return headers
+
+def bulk_item_error(index: int, action: str, status_code: int, detail: str) -> Dict[str, Any]:
+    """
+    Per-item error entry in a bulk response.
+    """
+    return {"index": index, "status": "error", "action": action, "status_code": status_code, "detail": detail}
+
+
+class ActionDispatcher:
+    """
+    Executes actions against the Integrations Service through `client`
+    (an httpx.AsyncClient whose base_url points at the Integrations Service).
+    `breaker` is a resilience.CircuitBreaker guarding those calls, and
+    `remaining_seconds` returns the time left before the current request's
+    deadline (resilience.remaining_seconds). Both are optional.
+    """
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        bulk_concurrency: int = 16,
+        bulk_group_size: int = 500,
+        breaker: Optional[Any] = None,
+        remaining_seconds: Optional[Callable[[], Optional[float]]] = None
+    ):
+        self.client = client
+        self.bulk_concurrency = bulk_concurrency
+        self.bulk_group_size = bulk_group_size
+        self.breaker = breaker
+        self.remaining_seconds = remaining_seconds
+
+    async def call_integrations(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        user_token: Optional[str],
+        timeout: float
+    ) -> Dict[str, Any]:
+        """
+        POSTs a payload to the Integrations Service and returns its JSON response.
+        Transport and HTTP errors are mapped to 504/503/502 HTTPExceptions; an open
+        circuit or an expired deadline fails with 503/504 without calling it.
+        """
+        headers = auth_headers(user_token)
+        remaining = self.remaining_seconds() if self.remaining_seconds is not None else None
+        if remaining is not None:
+            if remaining <= 0:
+                raise HTTPException(status_code=504, detail="Request deadline passed before calling Integrations Service")
+            timeout = min(timeout, remaining)
+            headers[DEADLINE_HEADER] = str(int(remaining * 1000))
+        if self.breaker is not None:
+            retry_after = self.breaker.allow()
+            if retry_after is not None:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Integrations Service circuit is open; failing fast",
+                    headers={"Retry-After": str(max(1, int(round(retry_after))))}
+                )
+
+        failed = True
+        try:
+            response = await self.client.post(
+                endpoint,
+                json=payload,
+                headers=headers,
+                timeout=timeout
+            )
+            failed = response.status_code >= 500
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="Timeout while communicating with Integrations Service")
+        except httpx.ConnectError:
+            raise HTTPException(status_code=503, detail="Cannot connect to Integrations Service")
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Error communicating with Integrations Service: {str(e)}")
+        finally:
+            if self.breaker is not None:
+                if failed:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+    async def dispatch(self, action_request: ActionRequest) -> Dict[str, Any]:
+        """
+        Looks up the registered handler for the action and forwards it to the Integrations Service.
+        Raises HTTPException on validation or upstream errors.
+        """
+        action_name = action_request.action
+        if not action_name:
+            raise HTTPException(status_code=400, detail="Action name is required.")
+
+        handler = ACTION_HANDLERS.get(action_name)
+        if handler is None:
+            raise HTTPException(status_code=400, detail=f"Unknown action: {action_name}")
+
+        # The Actions service is just a middleman, it tells the Integrations service what to do.
+        integration_response = await self.call_integrations(
+            handler.endpoint,
+            handler.build_payload(action_request.details),
+            action_request.user_token,
+            handler.timeout
+        )
+
+        # Return both the action result and the response from integrations service
+        return {
+            "status": "success",
+            "action": action_name,
+            "message": "Action executed successfully.",
+            "integration_response": integration_response
+        }
+
+    async def _dispatch_bulk_group(
+        self,
+        handler: ActionHandler,
+        action_name: str,
+        user_token: Optional[str],
+        items: List[Tuple[int, ActionRequest]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Forwards a group of same-action, same-user items as one Integrations bulk request.
+        """
+        try:
+            response = await self.call_integrations(
+                handler.bulk_endpoint,
+                {handler.bulk_field: [handler.build_payload(item.details) for _, item in items]},
+                user_token,
+                handler.bulk_timeout
+            )
+        except HTTPException as e:
+            return [bulk_item_error(index, action_name, e.status_code, e.detail) for index, _ in items]
+
+        # Integrations returns one result per payload item, in order
+        item_results = response.get("results", [])
+        results = []
+        for position, (index, _) in enumerate(items):
+            item_result = item_results[position] if position < len(item_results) else None
+            if item_result is None:
+                results.append(bulk_item_error(index, action_name, 502, "Missing result from Integrations Service"))
+            elif item_result.get("status") == "success":
+                results.append({
+                    "index": index,
+                    "status": "success",
+                    "action": action_name,
+                    "integration_response": item_result
+                })
+            else:
+                results.append(bulk_item_error(
+                    index, action_name, item_result.get("status_code") or 502, item_result.get("detail", "Action failed")
+                ))
+        return results
+
+    async def _dispatch_single_item(self, index: int, action_request: ActionRequest) -> List[Dict[str, Any]]:
+        """
+        Dispatches one bulk item on its own (for actions without a bulk endpoint).
+        """
+        try:
+            response = await self.dispatch(action_request)
+            return [{**response, "index": index, "status": "success"}]
+        except HTTPException as e:
+            return [bulk_item_error(index, action_request.action, e.status_code, e.detail)]
+        except Exception as e:
+            return [bulk_item_error(index, action_request.action, 500, f"An error occurred: {str(e)}")]
+
+    async def dispatch_bulk(self, actions: List[ActionRequest]) -> Dict[str, Any]:
+        """
+        Executes many actions and returns a result per item, in request order.
+
+        Items are grouped by action and user. Groups whose action has an Integrations bulk
+        endpoint are forwarded as one request per `bulk_group_size` items; the rest are
+        dispatched individually. At most `bulk_concurrency` downstream calls run at once.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(actions)
+        groups: Dict[Tuple[str, Optional[str]], List[Tuple[int, ActionRequest]]] = {}
+
+        for index, action_request in enumerate(actions):
+            if action_request.action not in ACTION_HANDLERS:
+                results[index] = bulk_item_error(index, action_request.action, 400, f"Unknown action: {action_request.action}")
+                continue
+            groups.setdefault((action_request.action, action_request.user_token), []).append((index, action_request))
+
+        semaphore = asyncio.Semaphore(self.bulk_concurrency)
+
+        async def limited(coro):
+            async with semaphore:
+                return await coro
+
+        calls = []
+        for (action_name, user_token), items in groups.items():
+            handler = ACTION_HANDLERS[action_name]
+            if handler.bulk_endpoint:
+                for offset in range(0, len(items), self.bulk_group_size):
+                    chunk = items[offset:offset + self.bulk_group_size]
+                    calls.append(limited(self._dispatch_bulk_group(handler, action_name, user_token, chunk)))
+            else:
+                calls.extend(limited(self._dispatch_single_item(index, item)) for index, item in items)
+
+        for group_results in await asyncio.gather(*calls):
+            for item_result in group_results:
+                results[item_result["index"]] = item_result
+
+        succeeded = sum(1 for r in results if r["status"] == "success")
+        failed = len(results) - succeeded
+        return {
+            "status": "success" if failed == 0 else ("failed" if succeeded == 0 else "partial"),
+            "succeeded": succeeded,
+            "failed": failed,
+            "results": results
+        }
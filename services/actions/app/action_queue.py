@@ -0,0 +1,318 @@
+"""
+Durable local queue for actions, backed by SQLite in WAL mode.
+
+Actions are persisted under a client-supplied idempotency key before they are
+acknowledged, so a client retry never creates a second job and queued work
+survives a process restart. A pool of asyncio workers claims pending jobs,
+executes them, and retries failures with exponential backoff; jobs that keep
+failing (or fail permanently) are moved to the dead_letters table.
+
+Note: the stored payload includes the user's token so the action can be run
+later; the database file should be treated like any other credential store.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, next_run_at);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+_JOB_COLUMNS = "id, idempotency_key, action, payload, status, attempts, next_run_at, created_at, updated_at, result, last_error"
+
+
+def _row_to_job(row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    job = dict(zip([c.strip() for c in _JOB_COLUMNS.split(",")], row))
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class DurableActionQueue:
+    """
+    SQLite-backed job table. All methods are blocking; call them via asyncio.to_thread.
+    """
+    def __init__(self, path: str, max_attempts: int = 5, backoff_base: float = 1.0, backoff_cap: float = 300.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def recover(self) -> int:
+        """
+        Returns jobs left 'running' by a previous process to the pending state.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'pending', updated_at = ? WHERE status = 'running'", (time.time(),)
+            )
+            return cursor.rowcount
+
+    def enqueue(self, idempotency_key: str, action: str, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Persists a job unless one with the same key exists. Returns (job, created).
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (idempotency_key, action, payload, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (idempotency_key, action, json.dumps(payload), now, now, now)
+            )
+            created = cursor.rowcount == 1
+            row = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        return _row_to_job(row), created
+
+    def get(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        return _row_to_job(row)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically marks the oldest due pending job as running and returns it.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM jobs WHERE status = 'pending' AND next_run_at <= ? "
+                    "ORDER BY next_run_at, id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = _row_to_job(row)
+        if job is not None:
+            job["status"] = "running"
+            job["attempts"] += 1
+        return job
+
+    def complete(self, job_id: int, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job: Dict[str, Any], error: str, retryable: bool) -> str:
+        """
+        Schedules a retry with jittered exponential backoff, or dead-letters the job.
+        Returns the job's new status.
+        """
+        now = time.time()
+        with self._lock:
+            if retryable and job["attempts"] < self.max_attempts:
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** job["attempts"])))
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'pending', next_run_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (now + delay, error, now, job["id"])
+                )
+                return "pending"
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+                    (error, now, job["id"])
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO dead_letters "
+                    "(id, idempotency_key, action, payload, attempts, last_error, created_at, failed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job["id"], job["idempotency_key"], job["action"], json.dumps(job["payload"]),
+                     job["attempts"], error, job["created_at"], now)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return "dead"
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, idempotency_key, action, attempts, last_error, created_at, failed_at "
+                "FROM dead_letters ORDER BY failed_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        keys = ["id", "idempotency_key", "action", "attempts", "last_error", "created_at", "failed_at"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def counts(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest_pending = self._conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()[0]
+            dead = self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return {
+            "by_status": by_status,
+            "depth": by_status.get("pending", 0) + by_status.get("running", 0),
+            "dead_letters": dead,
+            "oldest_pending_age_seconds": round(time.time() - oldest_pending, 3) if oldest_pending else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ActionWorkerPool:
+    """
+    Runs queued jobs on `concurrency` asyncio workers.
+
+    `execute(job)` performs the action and returns its result; `is_retryable(exc)`
+    decides whether a failure is retried or dead-lettered straight away. A failed
+    queue call (e.g. "database is locked") is logged and retried after
+    `poll_interval`; it never stops a worker.
+    """
+    def __init__(
+        self,
+        queue: DurableActionQueue,
+        execute: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        is_retryable: Callable[[Exception], bool],
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.execute = execute
+        self.is_retryable = is_retryable
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._completed_at: deque = deque(maxlen=10000)
+        self._lags: deque = deque(maxlen=1000)
+        self.stats = {"succeeded": 0, "retried": 0, "dead_lettered": 0, "queue_errors": 0}
+
+    def notify(self):
+        """
+        Wakes idle workers after a new job was enqueued.
+        """
+        self._wakeup.set()
+
+    async def start(self):
+        recovered = await asyncio.to_thread(self.queue.recover)
+        if recovered:
+            logger.warning("Action queue: re-queued %d job(s) interrupted by the last shutdown", recovered)
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _run(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+            except Exception as e:
+                await self._queue_failed("claim a job", e)
+                continue
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._lags.append(time.time() - job["created_at"])
+            try:
+                result = await self.execute(job)
+            except asyncio.CancelledError:
+                # Shutting down mid-job: leave it 'running' so recover() re-queues it on restart
+                raise
+            except Exception as e:
+                try:
+                    status = await asyncio.to_thread(self.queue.fail, job, str(e), self.is_retryable(e))
+                except Exception as queue_error:
+                    await self._queue_failed(f"record the failure of job {job['id']}", queue_error)
+                    continue
+                self.stats["retried" if status == "pending" else "dead_lettered"] += 1
+                continue
+
+            try:
+                await asyncio.to_thread(self.queue.complete, job["id"], result)
+            except Exception as e:
+                await self._queue_failed(f"record the result of job {job['id']}", e)
+                continue
+            self.stats["succeeded"] += 1
+            self._completed_at.append(time.monotonic())
+
+    async def _queue_failed(self, step: str, error: Exception):
+        """
+        Logs a failed queue call and backs off for one poll interval. A job whose
+        outcome could not be recorded stays 'running' until recover() re-queues it.
+        """
+        self.stats["queue_errors"] += 1
+        logger.warning("Action queue: could not %s (%r); retrying in %ss", step, error, self.poll_interval)
+        await asyncio.sleep(self.poll_interval)
+
+    def snapshot(self, window_seconds: float = 60.0) -> Dict[str, Any]:
+        now = time.monotonic()
+        recent = sum(1 for t in self._completed_at if now - t <= window_seconds)
+        lags = sorted(self._lags)
+        return {
+            **self.stats,
+            "workers": self.concurrency,
+            "throughput_per_second": round(recent / window_seconds, 3),
+            "queue_lag_seconds": {
+                "p50": round(lags[len(lags) // 2], 3) if lags else 0.0,
+                "p95": round(lags[int(len(lags) * 0.95) - 1], 3) if lags else 0.0,
+                "max": round(lags[-1], 3) if lags else 0.0,
+            },
+        }
@@ -0,0 +1,247 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+Synchronous I/O inside an `async def` handler (requests.get, a googleapiclient
+.execute(), a blocking webhook send) stops the event loop. Every other request
+on the worker waits behind it, and nothing fails, so it shows up only as
+latency. This monitor makes it visible:
+
+- A heartbeat callback is scheduled on the loop every `interval_ms`. How late
+  it runs is the loop's scheduling lag, which is summarized in /metrics under
+  "event_loop" (max and recent p50/p99).
+- A watchdog thread notices when the heartbeat is more than `threshold_ms`
+  overdue, meaning the loop is blocked right now. It then captures the loop
+  thread's stack. The innermost frame in the service's own code is the
+  blocking call site, and the ASGI scope on the stack names the endpoint
+  ("(background)" for work outside a request). When the loop resumes, the
+  episode is charged to that (endpoint, call site) with its duration.
+
+The worst offenders, by total blocked time, are listed in /metrics without
+stacks, and with the stack of each one's longest block at GET
+/admin/event-loop (admin token, as for app/profiling.py).
+POST /admin/event-loop/reset clears them, e.g. between benchmark runs.
+
+Configuration:
+    LOOP_MONITOR_ENABLED          default true
+    LOOP_MONITOR_INTERVAL_MS      heartbeat interval (default 50)
+    LOOP_BLOCK_THRESHOLD_MS       lag that counts as a blocked loop (default 100)
+    LOOP_MONITOR_MAX_OFFENDERS    distinct (endpoint, call site) pairs kept (default 50)
+
+The cost is one loop callback per interval and one mostly idle thread.
+
+Like app/tracing.py, this module is copied unchanged into every service.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends
+
+from app.profiling import admin_guard
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_MONITOR_MAX_OFFENDERS = int(os.getenv("LOOP_MONITOR_MAX_OFFENDERS", "50"))
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_MAX_STACK_FRAMES = 30
+
+
+def _location(frame) -> str:
+    parts = frame.f_code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{frame.f_code.co_name} ({'/'.join(parts[-2:])}:{frame.f_lineno})"
+
+
+def _describe_stack(frame) -> Tuple[str, str, List[str]]:
+    """
+    (endpoint, blocking call site, stack outermost first) of a blocked loop thread's innermost frame.
+    """
+    endpoint = None
+    site = None
+    stack = []
+    innermost = _location(frame) if frame is not None else "(unknown)"
+    while frame is not None:
+        stack.append(_location(frame))
+        code = frame.f_code
+        if site is None and code.co_filename.startswith(_APP_DIR) and code.co_filename != __file__:
+            site = stack[-1]
+        # ASGI apps and middleware hold the request's scope; routing adds the matched route to it
+        if endpoint is None and "scope" in code.co_varnames:
+            scope = frame.f_locals.get("scope")
+            if isinstance(scope, dict) and scope.get("type") == "http":
+                route = getattr(scope.get("route"), "path", None)
+                endpoint = f"{scope.get('method')} {route or scope.get('path')}"
+        frame = frame.f_back
+    stack.reverse()
+    return endpoint or "(background)", site or innermost, stack[-_MAX_STACK_FRAMES:]
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class EventLoopMonitor:
+    """
+    Measures the running loop's scheduling lag and attributes blocked periods to endpoints and call sites.
+    """
+    def __init__(self, interval_ms: float = 50.0, threshold_ms: float = 100.0, max_offenders: int = 50,
+                 recent_beats: int = 1200):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.max_offenders = max_offenders
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = 0.0
+        self._beat_id = 0
+        # (beat it was detected in, endpoint, call site, stack) of the block in progress
+        self._episode: Optional[Tuple[int, str, str, List[str]]] = None
+        self._lags: Deque[float] = deque(maxlen=recent_beats)
+        self._offenders: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.stats = {"beats": 0, "max_lag_ms": 0.0, "blocked_episodes": 0, "blocked_ms": 0.0, "offenders_dropped": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self):
+        """
+        Starts monitoring the running loop. Call from the loop's thread (e.g. in the lifespan).
+        """
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._handle = self._loop.call_later(self.interval, self._beat)
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._handle.cancel()
+        self._watchdog.join()
+        self._loop = None
+
+    def _beat(self):
+        now = time.monotonic()
+        with self._lock:
+            lag = max(0.0, now - self._last_beat - self.interval)
+            episode = self._episode if self._episode is not None and self._episode[0] == self._beat_id else None
+            self._episode = None
+            self._last_beat = now
+            self._beat_id += 1
+            self._lags.append(lag)
+            self.stats["beats"] += 1
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag * 1000)
+            if episode is not None and lag >= self.threshold:
+                self._record(episode[1], episode[2], episode[3], lag)
+        if not self._stop.is_set():
+            self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _record(self, endpoint: str, site: str, stack: List[str], lag: float):
+        self.stats["blocked_episodes"] += 1
+        self.stats["blocked_ms"] += lag * 1000
+        offender = self._offenders.get((endpoint, site))
+        if offender is None:
+            if len(self._offenders) >= self.max_offenders:
+                self.stats["offenders_dropped"] += 1
+                return
+            offender = self._offenders[(endpoint, site)] = {
+                "endpoint": endpoint, "call_site": site, "count": 0, "blocked_ms": 0.0, "max_ms": 0.0, "stack": stack,
+            }
+        offender["count"] += 1
+        offender["blocked_ms"] += lag * 1000
+        if lag * 1000 >= offender["max_ms"]:
+            offender["max_ms"] = lag * 1000
+            offender["stack"] = stack
+        offender["last_seen"] = time.time()
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat - self.interval
+                if overdue < self.threshold or self._episode is not None:
+                    continue
+                beat_id = self._beat_id
+            # The loop thread is stuck in whatever it is running now
+            frame = sys._current_frames().get(self._loop_thread)
+            endpoint, site, stack = _describe_stack(frame)
+            with self._lock:
+                if self._beat_id == beat_id:
+                    self._episode = (beat_id, endpoint, site, stack)
+
+    def reset(self):
+        with self._lock:
+            self._offenders.clear()
+            self._lags.clear()
+            self.stats.update({"max_lag_ms": 0.0, "blocked_episodes": 0, "blocked_ms": 0.0, "offenders_dropped": 0})
+
+    def offenders(self, limit: Optional[int] = None, stacks: bool = False) -> List[Dict[str, Any]]:
+        """
+        (endpoint, call site) pairs by total blocked time, worst first.
+        """
+        with self._lock:
+            ranked = sorted(self._offenders.values(), key=lambda o: o["blocked_ms"], reverse=True)[:limit]
+            return [
+                {
+                    **{k: v for k, v in offender.items() if stacks or k != "stack"},
+                    "blocked_ms": round(offender["blocked_ms"], 1),
+                    "max_ms": round(offender["max_ms"], 1),
+                }
+                for offender in ranked
+            ]
+
+    def snapshot(self, top: int = 5) -> Dict[str, Any]:
+        with self._lock:
+            ordered = sorted(self._lags)
+            summary = {
+                **self.stats,
+                "running": self.running,
+                "interval_ms": self.interval * 1000,
+                "threshold_ms": self.threshold * 1000,
+                "lag_p50_ms": round(_percentile(ordered, 0.5) * 1000, 2) if ordered else None,
+                "lag_p99_ms": round(_percentile(ordered, 0.99) * 1000, 2) if ordered else None,
+            }
+        summary["max_lag_ms"] = round(summary["max_lag_ms"], 1)
+        summary["blocked_ms"] = round(summary["blocked_ms"], 1)
+        summary["worst_offenders"] = self.offenders(top)
+        return summary
+
+
+def create_loop_monitor_router(monitor: EventLoopMonitor, admin_token: Optional[str] = None) -> APIRouter:
+    """
+    /admin/event-loop: the blocking offenders with stacks, and a reset.
+    """
+    router = APIRouter(
+        prefix="/admin/event-loop", dependencies=[Depends(admin_guard(admin_token))], include_in_schema=False
+    )
+
+    @router.get("")
+    async def event_loop_offenders(limit: int = 20):
+        """
+        Lag summary and the worst blocking offenders, each with the stack of its longest block.
+        """
+        return {**monitor.snapshot(top=0), "worst_offenders": monitor.offenders(limit, stacks=True)}
+
+    @router.post("/reset")
+    async def reset_event_loop_offenders():
+        """
+        Clears the offenders and lag statistics.
+        """
+        monitor.reset()
+        return {"status": "reset"}
+
+    return router
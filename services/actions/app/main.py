@@ -1,19 +1,123 @@
 import os
-import requests
-from fastapi import FastAPI, HTTPException, Request
-from pydantic import BaseModel
-from typing import Dict, Any, Optional
-
-app = FastAPI(title="Actions Service")
+import asyncio
+import uuid
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Header
+from typing import Any, Dict, Optional
+from app.action_dispatch import (
+    ACTION_HANDLERS,
+    ActionDispatcher,
+    ActionRequest,
+    BulkActionRequest,
+)
+from app.action_queue import ActionWorkerPool, DurableActionQueue
+from app.profiling import Profiler, ProfilingMiddleware, create_profiling_router
+from app.loop_monitor import (
+    LOOP_BLOCK_THRESHOLD_MS,
+    LOOP_MONITOR_ENABLED,
+    LOOP_MONITOR_INTERVAL_MS,
+    LOOP_MONITOR_MAX_OFFENDERS,
+    EventLoopMonitor,
+    create_loop_monitor_router,
+)
+from app.resilience import CircuitBreaker, DeadlineMiddleware, deadline_stats, remaining_seconds
+from app.tracing import Tracer, TracingMiddleware, TracingTransport
 
 # URL for the Integrations Service
 # Use localhost for local development, Docker service name for containerized deployment
 INTEGRATIONS_SERVICE_URL = os.getenv("INTEGRATIONS_SERVICE_URL", "http://localhost:8001")
 
-class ActionRequest(BaseModel):
-    action: str
-    user_token: Optional[str] = None
-    details: Dict[str, Any] = {}
+# Connection pool sizing for the shared Integrations Service client
+INTEGRATIONS_MAX_CONNECTIONS = int(os.getenv("INTEGRATIONS_MAX_CONNECTIONS", "100"))
+INTEGRATIONS_MAX_KEEPALIVE = int(os.getenv("INTEGRATIONS_MAX_KEEPALIVE", "20"))
+
+# Bulk dispatch limits: concurrent downstream calls, and items per downstream bulk call
+ACTIONS_BULK_CONCURRENCY = int(os.getenv("ACTIONS_BULK_CONCURRENCY", "16"))
+ACTIONS_BULK_GROUP_SIZE = int(os.getenv("ACTIONS_BULK_GROUP_SIZE", "500"))
+
+# Circuit breaker on Integrations Service calls: after INTEGRATIONS_BREAKER_FAILURES
+# failures in a row, actions fail fast (503) for INTEGRATIONS_BREAKER_RESET_SECONDS
+# before a single probe call is let through.
+INTEGRATIONS_BREAKER_FAILURES = int(os.getenv("INTEGRATIONS_BREAKER_FAILURES", "5"))
+INTEGRATIONS_BREAKER_RESET_SECONDS = float(os.getenv("INTEGRATIONS_BREAKER_RESET_SECONDS", "10"))
+
+# Durable action queue (SQLite WAL) and its worker pool
+ACTION_QUEUE_PATH = os.getenv("ACTION_QUEUE_PATH", "action_queue.db")
+ACTION_QUEUE_WORKERS = int(os.getenv("ACTION_QUEUE_WORKERS", "4"))
+ACTION_QUEUE_MAX_ATTEMPTS = int(os.getenv("ACTION_QUEUE_MAX_ATTEMPTS", "5"))
+
+# Shared keep-alive client, created on startup and closed on shutdown
+integrations_client: Optional[httpx.AsyncClient] = None
+action_dispatcher: Optional[ActionDispatcher] = None
+integrations_breaker = CircuitBreaker(
+    "integrations",
+    failure_threshold=INTEGRATIONS_BREAKER_FAILURES,
+    reset_timeout=INTEGRATIONS_BREAKER_RESET_SECONDS
+)
+
+action_queue: Optional[DurableActionQueue] = None
+action_workers: Optional[ActionWorkerPool] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs the loop monitor, opens the pooled Integrations Service client and action dispatcher,
+    and opens the durable action queue and starts its workers for the lifetime of the app.
+    Shutdown stops the workers first, so no job is claimed after the queue is closed.
+    """
+    global integrations_client, action_dispatcher, action_queue, action_workers
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    # Each request to the Integrations Service is recorded as a client span and carries the trace context
+    integrations_client = httpx.AsyncClient(
+        base_url=INTEGRATIONS_SERVICE_URL,
+        transport=TracingTransport(tracer, httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=INTEGRATIONS_MAX_CONNECTIONS,
+                max_keepalive_connections=INTEGRATIONS_MAX_KEEPALIVE
+            )
+        )),
+        timeout=30
+    )
+    action_dispatcher = ActionDispatcher(
+        integrations_client,
+        bulk_concurrency=ACTIONS_BULK_CONCURRENCY,
+        bulk_group_size=ACTIONS_BULK_GROUP_SIZE,
+        breaker=integrations_breaker,
+        remaining_seconds=remaining_seconds
+    )
+    action_queue = DurableActionQueue(ACTION_QUEUE_PATH, max_attempts=ACTION_QUEUE_MAX_ATTEMPTS)
+    action_workers = ActionWorkerPool(
+        action_queue,
+        execute_queued_job,
+        is_retryable_failure,
+        concurrency=ACTION_QUEUE_WORKERS
+    )
+    await action_workers.start()
+    try:
+        yield
+    finally:
+        await action_workers.stop()
+        action_queue.close()
+        await integrations_client.aclose()
+        integrations_client = None
+        loop_monitor.stop()
+
+app = FastAPI(title="Actions Service", lifespan=lifespan)
+
+# Request tracing: continues the caller's trace (traceparent header) on every endpoint
+tracer = Tracer("actions")
+# On-demand CPU/memory profiling and slow-request capture under /admin/profiling (see app/profiling.py)
+profiler = Profiler("actions")
+# Event-loop lag and the endpoints that block the loop, under /admin/event-loop (see app/loop_monitor.py)
+loop_monitor = EventLoopMonitor(LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS, LOOP_MONITOR_MAX_OFFENDERS)
+# Requests run under the caller's X-Request-Deadline-Ms budget, which is passed on to Integrations
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.include_router(create_profiling_router(profiler))
+app.include_router(create_loop_monitor_router(loop_monitor))
 
 @app.post("/api/v1/execute_action")
 async def execute_action(action_request: ActionRequest):
@@ -21,77 +125,111 @@ async def execute_action(action_request: ActionRequest):
     Receives an action command from the Assistant Service and executes it.
     """
     try:
-        action_name = action_request.action
-        user_token = action_request.user_token
-        details = action_request.details
-
-        if not action_name:
-            raise HTTPException(status_code=400, detail="Action name is required.")
-
-        headers = {}
-        if user_token:
-            headers["Authorization"] = f"Bearer {user_token}"
-        
-        # Dispatch the action based on the payload
-        if action_name == "create_break_event":
-            # The Actions service is just a middleman, it tells the Integrations service what to do.
-            response = requests.post(
-                f"{INTEGRATIONS_SERVICE_URL}/api/v1/create_calendar_event",
-                json={
-                    "title": details.get("title", "Quick Break"), 
-                    "duration_minutes": details.get("duration", 15),
-                    "description": details.get("description", "AI-suggested break time")
-                },
-                headers=headers,
-                timeout=30
-            )
-        
-        elif action_name == "draft_email":
-            response = requests.post(
-                f"{INTEGRATIONS_SERVICE_URL}/api/v1/draft_email",
-                json={
-                    "to": details.get("to"), 
-                    "subject": details.get("subject"), 
-                    "body": details.get("body")
-                },
-                headers=headers,
-                timeout=30
-            )
-
-        elif action_name == "send_slack_notification":
-            response = requests.post(
-                f"{INTEGRATIONS_SERVICE_URL}/api/v1/send_slack_notification",
-                json={
-                    "message": details.get("message"),
-                    "channel": details.get("channel", "#team-harmonia")
-                },
-                headers=headers,
-                timeout=30
-            )
-               
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown action: {action_name}")
-
-        response.raise_for_status()
-        
-        # Return both the action result and the response from integrations service
-        integration_response = response.json()
-        return {
-            "status": "success", 
-            "action": action_name, 
-            "message": "Action executed successfully.",
-            "integration_response": integration_response
-        }
-
-    except requests.exceptions.Timeout:
-        raise HTTPException(status_code=504, detail="Timeout while communicating with Integrations Service")
-    except requests.exceptions.ConnectionError:
-        raise HTTPException(status_code=503, detail="Cannot connect to Integrations Service")
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Error communicating with Integrations Service: {str(e)}")
+        return await action_dispatcher.dispatch(action_request)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@app.post("/api/v1/execute_actions")
+async def execute_actions(bulk_request: BulkActionRequest):
+    """
+    Executes many actions in one call and returns a result per item, in request order.
+    
+    Items are grouped by action and user. Groups whose action has an Integrations bulk
+    endpoint are forwarded as one request per ACTIONS_BULK_GROUP_SIZE items; the rest are
+    dispatched individually. At most ACTIONS_BULK_CONCURRENCY downstream calls run at once.
+    """
+    return await action_dispatcher.dispatch_bulk(bulk_request.actions)
+
+async def execute_queued_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker entry point: runs a persisted action through the normal dispatch path.
+    """
+    with tracer.span("action_queue.execute", action=job["action"], attempt=job["attempts"]):
+        return await action_dispatcher.dispatch(ActionRequest(**job["payload"]))
+
+def is_retryable_failure(error: Exception) -> bool:
+    """
+    Client errors (unknown action, bad payload, auth) are dead-lettered immediately;
+    timeouts, throttling and upstream/server errors are retried.
+    """
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500 or error.status_code in (408, 429)
+    return True
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Public view of a queued job (the stored user token is never returned).
+    """
+    return {
+        "job_id": job["id"],
+        "idempotency_key": job["idempotency_key"],
+        "action": job["action"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "last_error": job["last_error"]
+    }
+
+@app.post("/api/v1/enqueue_action", status_code=202)
+async def enqueue_action(
+    action_request: ActionRequest,
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Persists an action to the durable queue and acknowledges it immediately.
+    
+    The idempotency key (Idempotency-Key header or `idempotency_key` field) identifies
+    the action: re-sending the same key returns the existing job instead of creating
+    a duplicate. Without a key a random one is assigned.
+    """
+    if action_request.action not in ACTION_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {action_request.action}")
+
+    key = idempotency_key or action_request.idempotency_key or str(uuid.uuid4())
+    payload = action_request.dict(exclude={"idempotency_key"})
+    job, created = await asyncio.to_thread(action_queue.enqueue, key, action_request.action, payload)
+    if created:
+        action_workers.notify()
+
+    return {**job_view(job), "duplicate": not created}
+
+@app.get("/api/v1/actions/{idempotency_key}")
+async def get_queued_action(idempotency_key: str):
+    """
+    Returns the current state (and result, once done) of a queued action.
+    """
+    job = await asyncio.to_thread(action_queue.get, idempotency_key)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No action with that idempotency key.")
+    return job_view(job)
+
+@app.get("/api/v1/dead_letters")
+async def list_dead_letters(limit: int = 100):
+    """
+    Lists actions that exhausted their retries or failed permanently.
+    """
+    return {"dead_letters": await asyncio.to_thread(action_queue.dead_letters, limit)}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics: action queue depth, lag, throughput and outcomes.
+    """
+    return {
+        "service": "actions",
+        "action_queue": {
+            **await asyncio.to_thread(action_queue.counts),
+            **action_workers.snapshot()
+        },
+        "integrations_circuit": integrations_breaker.snapshot(),
+        "deadlines": dict(deadline_stats),
+        "tracing": tracer.snapshot(),
+        "profiling": profiler.snapshot(),
+        "event_loop": loop_monitor.snapshot()
+    }
+
 @app.get("/health")
 async def health_check():
     """
@@ -99,11 +237,11 @@ async def health_check():
     """
     try:
         # Test connection to integrations service
-        response = requests.get(f"{INTEGRATIONS_SERVICE_URL}/health", timeout=5)
+        response = await integrations_client.get("/health", timeout=5)
         integrations_healthy = response.status_code == 200
     except:
         integrations_healthy = False
-        
+
     return {
         "status": "healthy" if integrations_healthy else "degraded",
         "service": "actions",
@@ -123,6 +261,11 @@ async def root():
         "description": "Executes actions by coordinating with the Integrations Service",
         "endpoints": {
             "execute_action": "/api/v1/execute_action",
+            "execute_actions": "/api/v1/execute_actions",
+            "enqueue_action": "/api/v1/enqueue_action",
+            "queued_action": "/api/v1/actions/{idempotency_key}",
+            "metrics": "/metrics",
             "health": "/health"
-        }
-    }
\ No newline at end of file
+        },
+        "actions": sorted(ACTION_HANDLERS)
+    }
@@ -0,0 +1,406 @@
+"""
+On-demand CPU and memory profiling of a live service, behind an admin token.
+
+Endpoints (under /admin/profiling, X-Admin-Token header required):
+    POST /cpu?seconds=10            sample every thread's stack for `seconds` and
+                                    return collapsed stacks (one "frame;frame;... count"
+                                    line per stack, the input of flamegraph.pl / speedscope)
+    POST /memory/snapshot           start tracemalloc if needed, take a snapshot and
+                                    return its top allocators
+    GET  /memory/diff?base=1&to=2   top allocation growth between two snapshots
+                                    (`to` omitted: against a new snapshot)
+    POST /memory/stop               stop tracemalloc and drop the snapshots
+    PUT  /slow?threshold_ms=500     profile requests still running after the threshold
+                                    (0 turns it off)
+    GET  /slow, GET /slow/{id}      captured slow-request profiles, and one as collapsed stacks
+
+Configuration:
+    PROFILING_ADMIN_TOKEN      token for the endpoints; unset, they answer 404
+    PROFILING_SLOW_REQUEST_MS  initial slow-request threshold (default 0: off)
+    PROFILING_SAMPLE_MS        sampling interval (default 10)
+
+Overhead when nothing is being profiled is nil: no sampler thread runs,
+tracemalloc is off, and ProfilingMiddleware passes requests straight through
+while the slow-request threshold is 0. With a threshold, each request arms one
+event-loop timer. Sampling only starts when a request outlives the threshold,
+and then only until that request finishes (at most PROFILING_SLOW_MAX_SECONDS).
+One profile records at a time: slow requests that overlap it are counted as
+`slow_skipped` rather than sampled twice.
+
+Samples record wall-clock stacks. In "cpu" mode (the default on Linux),
+samples of threads that are not running are dropped (thread state from
+/proc/self/task), so idle pool threads and threads blocked on I/O do not
+drown the profile. "wall" mode keeps them, which shows where a slow request
+is waiting.
+
+The three services share this file as identical copies, not as a package.
+"""
+
+import asyncio
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN")
+PROFILING_SLOW_REQUEST_MS = float(os.getenv("PROFILING_SLOW_REQUEST_MS", "0"))
+PROFILING_SLOW_MAX_SECONDS = float(os.getenv("PROFILING_SLOW_MAX_SECONDS", "10"))
+PROFILING_SAMPLE_MS = float(os.getenv("PROFILING_SAMPLE_MS", "10"))
+PROFILING_MAX_CAPTURES = int(os.getenv("PROFILING_MAX_CAPTURES", "20"))
+CPU_PROFILE_MAX_SECONDS = 60
+PROFILING_PATH_PREFIX = "/admin/profiling"
+MEMORY_MAX_SNAPSHOTS = 5
+
+_HAS_PROC = os.path.isdir("/proc/self/task")
+
+
+def _frame_label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+def _thread_running(native_id: Optional[int]) -> bool:
+    if native_id is None:
+        return True
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return False
+    # Field 3 (state) follows the parenthesised thread name, which may itself contain spaces
+    return stat[stat.rindex(b")") + 2:stat.rindex(b")") + 3] == b"R"
+
+
+class StackSampler:
+    """
+    Background thread that samples the stacks of all other threads into collapsed-stack counts.
+    """
+    def __init__(self, interval: float, mode: str = "cpu"):
+        self.interval = interval
+        self.mode = mode if _HAS_PROC else "wall"
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread = threads.get(ident)
+                if self.mode == "cpu" and not _thread_running(getattr(thread, "native_id", None)):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(thread.name if thread is not None else f"thread-{ident}")
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """
+    Owns the CPU sampler (one at a time), tracemalloc snapshots and slow-request captures.
+    """
+    def __init__(self, service: str, slow_threshold_ms: Optional[float] = None, sample_interval_ms: Optional[float] = None,
+                 slow_max_seconds: Optional[float] = None, max_captures: Optional[int] = None):
+        self.service = service
+        self.slow_threshold_ms = PROFILING_SLOW_REQUEST_MS if slow_threshold_ms is None else slow_threshold_ms
+        self.sample_interval = (PROFILING_SAMPLE_MS if sample_interval_ms is None else sample_interval_ms) / 1000
+        self.slow_max_seconds = PROFILING_SLOW_MAX_SECONDS if slow_max_seconds is None else slow_max_seconds
+        self._sampler: Optional[StackSampler] = None
+        self._sampler_lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+        self._snapshot_ids = itertools.count(1)
+        self._captures: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._capture_ids = itertools.count(1)
+        self.max_captures = PROFILING_MAX_CAPTURES if max_captures is None else max_captures
+        self.stats = {"cpu_profiles": 0, "slow_captures": 0, "slow_skipped": 0, "memory_snapshots": 0}
+
+    # --- CPU ---
+
+    def _start_sampler(self, mode: str) -> Optional[StackSampler]:
+        with self._sampler_lock:
+            if self._sampler is not None:
+                return None
+            self._sampler = StackSampler(self.sample_interval, mode).start()
+            return self._sampler
+
+    def _stop_sampler(self, sampler: StackSampler):
+        sampler.stop()
+        with self._sampler_lock:
+            self._sampler = None
+
+    async def cpu_profile(self, seconds: float, mode: str = "cpu") -> StackSampler:
+        sampler = self._start_sampler(mode)
+        if sampler is None:
+            raise HTTPException(status_code=409, detail="A profile is already being recorded")
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(self._stop_sampler, sampler)
+        self.stats["cpu_profiles"] += 1
+        return sampler
+
+    # --- Slow requests ---
+
+    def slow_request_started(self) -> Optional[StackSampler]:
+        sampler = self._start_sampler("wall")
+        if sampler is None:
+            self.stats["slow_skipped"] += 1
+        return sampler
+
+    def slow_request_finished(self, sampler: StackSampler, method: str, path: str, duration_ms: float, status: int):
+        self._stop_sampler(sampler)
+        capture_id = next(self._capture_ids)
+        self._captures[capture_id] = {
+            "id": capture_id,
+            "method": method,
+            "path": path,
+            "status_code": status,
+            "duration_ms": round(duration_ms, 1),
+            "samples": sampler.samples,
+            "captured_at": sampler.started,
+            "collapsed": sampler.collapsed(),
+        }
+        while len(self._captures) > self.max_captures:
+            self._captures.popitem(last=False)
+        self.stats["slow_captures"] += 1
+
+    def captures(self) -> List[Dict[str, Any]]:
+        return [{k: v for k, v in capture.items() if k != "collapsed"} for capture in reversed(self._captures.values())]
+
+    def capture(self, capture_id: int) -> Dict[str, Any]:
+        capture = self._captures.get(capture_id)
+        if capture is None:
+            raise HTTPException(status_code=404, detail=f"No slow-request capture {capture_id}")
+        return capture
+
+    # --- Memory ---
+
+    def memory_snapshot(self, limit: int, group_by: str) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        snapshot_id = next(self._snapshot_ids)
+        self._snapshots[snapshot_id] = snapshot
+        while len(self._snapshots) > MEMORY_MAX_SNAPSHOTS:
+            self._snapshots.popitem(last=False)
+        self.stats["memory_snapshots"] += 1
+        stats = snapshot.statistics(group_by)
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "snapshot_id": snapshot_id,
+            "traced_mb": round(current / 1024 / 1024, 2),
+            "peak_traced_mb": round(peak / 1024 / 1024, 2),
+            "top": [
+                {"location": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in stats[:limit]
+            ],
+        }
+
+    def memory_diff(self, base: int, to: Optional[int], limit: int, group_by: str) -> Dict[str, Any]:
+        if base not in self._snapshots or (to is not None and to not in self._snapshots):
+            raise HTTPException(
+                status_code=404, detail=f"Unknown snapshot; available: {sorted(self._snapshots)}"
+            )
+        if to is None:
+            to = self.memory_snapshot(0, group_by)["snapshot_id"]
+        diff = self._snapshots[to].compare_to(self._snapshots[base], group_by)
+        return {
+            "base": base,
+            "to": to,
+            "total_growth_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+            "top": [
+                {
+                    "location": str(stat.traceback[0]),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count_diff": stat.count_diff,
+                }
+                for stat in diff[:limit]
+            ],
+        }
+
+    def memory_stop(self):
+        self._snapshots.clear()
+        tracemalloc.stop()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "sampling": self._sampler is not None,
+            "tracemalloc": tracemalloc.is_tracing(),
+            "memory_snapshots_held": len(self._snapshots),
+            "captures_held": len(self._captures),
+        }
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: samples stacks while a request runs past the profiler's slow-request threshold.
+    """
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        threshold_ms = self.profiler.slow_threshold_ms
+        if scope["type"] != "http" or threshold_ms <= 0 or scope["path"].startswith(PROFILING_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        sampler: Optional[StackSampler] = None
+        status = 500
+
+        def start_sampling():
+            nonlocal sampler
+            sampler = self.profiler.slow_request_started()
+            if sampler is not None:
+                # Never sample longer than slow_max_seconds, even if the request hangs
+                asyncio.get_running_loop().call_later(self.profiler.slow_max_seconds, sampler._stop.set)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        timer = asyncio.get_running_loop().call_later(threshold_ms / 1000, start_sampling)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            timer.cancel()
+            if sampler is not None:
+                duration_ms = (time.perf_counter() - started) * 1000
+                await asyncio.to_thread(
+                    self.profiler.slow_request_finished, sampler, scope["method"], scope["path"], duration_ms, status
+                )
+
+
+def admin_guard(admin_token: Optional[str] = None) -> Callable[..., None]:
+    """
+    Dependency for admin endpoints: 404 while no admin token is configured, 401 for a wrong X-Admin-Token.
+    """
+    admin_token = admin_token or PROFILING_ADMIN_TOKEN
+
+    def require_admin(x_admin_token: Optional[str] = Header(None)):
+        if not admin_token:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if not hmac.compare_digest(x_admin_token or "", admin_token):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    return require_admin
+
+
+def create_profiling_router(profiler: Profiler, admin_token: Optional[str] = None) -> APIRouter:
+    """
+    The /admin/profiling endpoints. Without an admin token they all answer 404.
+    """
+    router = APIRouter(
+        prefix=PROFILING_PATH_PREFIX, dependencies=[Depends(admin_guard(admin_token))], include_in_schema=False
+    )
+
+    @router.post("/cpu")
+    async def cpu_profile(seconds: float = 10.0, mode: str = "cpu"):
+        """
+        Samples all threads for `seconds` and returns the collapsed stacks as a file.
+        """
+        if not 0 < seconds <= CPU_PROFILE_MAX_SECONDS:
+            raise HTTPException(status_code=400, detail=f"seconds must be in (0, {CPU_PROFILE_MAX_SECONDS}]")
+        if mode not in ("cpu", "wall"):
+            raise HTTPException(status_code=400, detail="mode must be cpu or wall")
+        sampler = await profiler.cpu_profile(seconds, mode)
+        filename = f"{profiler.service}-{mode}-{time.strftime('%Y%m%dT%H%M%S')}.collapsed"
+        return PlainTextResponse(
+            sampler.collapsed(),
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "X-Profile-Samples": str(sampler.samples),
+                "X-Profile-Mode": sampler.mode,
+            }
+        )
+
+    @router.post("/memory/snapshot")
+    async def memory_snapshot(limit: int = 25, group_by: str = "lineno"):
+        """
+        Takes a tracemalloc snapshot (starting tracemalloc on first use) and returns its top allocators.
+        """
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+        return await asyncio.to_thread(profiler.memory_snapshot, limit, group_by)
+
+    @router.get("/memory/diff")
+    async def memory_diff(base: int, to: Optional[int] = None, limit: int = 25, group_by: str = "lineno"):
+        """
+        Top allocation growth from snapshot `base` to snapshot `to` (or to a new snapshot).
+        """
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+        return await asyncio.to_thread(profiler.memory_diff, base, to, limit, group_by)
+
+    @router.post("/memory/stop")
+    async def memory_stop():
+        """
+        Stops tracemalloc (removing its overhead) and drops the held snapshots.
+        """
+        profiler.memory_stop()
+        return {"tracemalloc": False}
+
+    @router.put("/slow")
+    async def set_slow_threshold(threshold_ms: float):
+        """
+        Profiles requests that run longer than threshold_ms; 0 turns slow-request capture off.
+        """
+        profiler.slow_threshold_ms = max(0.0, threshold_ms)
+        return {"slow_threshold_ms": profiler.slow_threshold_ms}
+
+    @router.get("/slow")
+    async def list_captures():
+        """
+        Slow-request captures, newest first.
+        """
+        return {"slow_threshold_ms": profiler.slow_threshold_ms, "captures": profiler.captures()}
+
+    @router.get("/slow/{capture_id}")
+    async def get_capture(capture_id: int):
+        """
+        One slow-request capture as collapsed stacks.
+        """
+        capture = profiler.capture(capture_id)
+        return PlainTextResponse(
+            capture["collapsed"],
+            headers={"Content-Disposition": f'attachment; filename="{profiler.service}-slow-{capture_id}.collapsed"'}
+        )
+
+    return router
@@ -0,0 +1,171 @@
+"""
+Resilience for the Actions Service's calls to the Integrations Service.
+
+- Deadlines. Each request runs under the deadline its caller sent in the
+  X-Request-Deadline-Ms header (DeadlineMiddleware). A request that arrives
+  with no budget left gets a 504 straight away. Calls to the Integrations
+  Service are capped by the time left and forward it in the same header.
+- Circuit breaking. After `failure_threshold` consecutive failures (transport
+  errors and 5xx), calls fail fast for `reset_timeout` seconds. Then a single
+  probe call is let through (half-open): success closes the circuit, failure
+  opens it again.
+
+The deadline functions, DeadlineMiddleware and CircuitBreaker are the same in
+every service's resilience.py, so a budget means the same thing at each hop.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Mapping, Optional
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Absolute deadline (time.monotonic()) of the request being served, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+deadline_stats = {"with_deadline": 0, "expired_on_arrival": 0}
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Runs the block under a deadline `seconds` from now, or the enclosing one if that is sooner.
+    """
+    current = _deadline.get()
+    deadline = current
+    if seconds is not None and seconds > 0:
+        deadline = time.monotonic() + seconds
+        if current is not None:
+            deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """
+    Seconds left before the current request's deadline (may be negative), or None without one.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_headers() -> Dict[str, str]:
+    """
+    The header telling a downstream service how long the caller will still wait.
+    """
+    remaining = remaining_seconds()
+    return {} if remaining is None else {DEADLINE_HEADER: str(max(0, int(remaining * 1000)))}
+
+
+def deadline_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    The caller's remaining budget in seconds from an X-Request-Deadline-Ms header
+    (0 or less once it has passed), or None without a valid header.
+    """
+    for key, value in headers.items():
+        if key.lower() == DEADLINE_HEADER.lower():
+            try:
+                return int(value) / 1000
+            except ValueError:
+                return None
+    return None
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: runs each request under the deadline its caller sent (if any).
+    A request that arrives with no budget left is answered 504 without running it.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = deadline_from_headers(
+            {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        )
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline_stats["with_deadline"] += 1
+        if budget <= 0:
+            deadline_stats["expired_on_arrival"] += 1
+            body = json.dumps({"detail": "Request deadline already passed"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        with deadline_scope(budget):
+            await self.app(scope, receive, send)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a single half-open probe. Thread-safe.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"rejected": 0, "opened": 0, "probes": 0}
+
+    def allow(self) -> Optional[float]:
+        """
+        None if the call may proceed (it must then report record_success/record_failure),
+        else the seconds until the next probe.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return None
+            waited = time.monotonic() - self._opened_at
+            if self.state == "open" and waited >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                self.stats["probes"] += 1
+                return None
+            self.stats["rejected"] += 1
+            return max(self.reset_timeout - waited, 0.1)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                **self.stats,
+            }
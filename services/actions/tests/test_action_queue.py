@@ -0,0 +1,151 @@
+"""
+Idempotent enqueueing, retries and dead letters of the durable action queue,
+and workers that outlive failing queue calls.
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.action_queue import ActionWorkerPool, DurableActionQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    action_queue = DurableActionQueue(str(tmp_path / "queue.db"), max_attempts=2, backoff_base=0.0)
+    yield action_queue
+    action_queue.close()
+
+
+class FlakyQueue:
+    """
+    Wraps a queue so that the first `failures` calls of `method` raise "database is locked".
+    """
+    def __init__(self, queue, method, failures=1):
+        self._queue = queue
+        self._method = method
+        self.failures = failures
+
+    def __getattr__(self, name):
+        attribute = getattr(self._queue, name)
+        if name != self._method:
+            return attribute
+
+        def call(*args):
+            if self.failures:
+                self.failures -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return attribute(*args)
+        return call
+
+
+def run_pool(queue, execute, is_retryable=lambda e: True, until=None, **options):
+    """
+    Runs one worker until `until(pool)` is true, then stops it. Fails after a second.
+    """
+    async def scenario():
+        pool = ActionWorkerPool(queue, execute, is_retryable, concurrency=1, poll_interval=0.01, **options)
+        await pool.start()
+        for _ in range(100):
+            if until(pool):
+                break
+            await asyncio.sleep(0.01)
+        else:
+            pytest.fail(f"workers stopped short: {pool.stats}")
+        alive = all(not worker.done() for worker in pool._workers)
+        await pool.stop()
+        return pool, alive
+
+    return asyncio.run(scenario())
+
+
+async def succeed(job):
+    return {"done": job["payload"]["n"]}
+
+
+async def fail(job):
+    raise RuntimeError("integrations unavailable")
+
+
+def test_enqueue_is_idempotent(queue):
+    job, created = queue.enqueue("key-1", "send_slack", {"n": 1})
+    again, created_again = queue.enqueue("key-1", "send_slack", {"n": 2})
+
+    assert created and not created_again
+    assert again["id"] == job["id"]
+    assert again["payload"] == {"n": 1}
+
+
+def test_claim_takes_each_job_once(queue):
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+
+    job = queue.claim()
+    assert job["status"] == "running"
+    assert job["attempts"] == 1
+    assert queue.claim() is None
+
+
+def test_recover_requeues_running_jobs(queue):
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+    queue.claim()
+
+    assert queue.recover() == 1
+    assert queue.claim()["attempts"] == 2
+
+
+def test_workers_run_jobs_to_completion(queue):
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+
+    pool, alive = run_pool(queue, succeed, until=lambda pool: pool.stats["succeeded"] == 1)
+
+    assert alive
+    assert queue.get("key-1")["status"] == "succeeded"
+    assert queue.get("key-1")["result"] == {"done": 1}
+
+
+def test_failures_are_retried_then_dead_lettered(queue):
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+
+    pool, _ = run_pool(queue, fail, until=lambda pool: pool.stats["dead_lettered"] == 1)
+
+    assert pool.stats["retried"] == 1
+    assert queue.get("key-1")["status"] == "dead"
+    assert [letter["idempotency_key"] for letter in queue.dead_letters()] == ["key-1"]
+
+
+def test_permanent_failures_skip_the_retries(queue):
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+
+    pool, _ = run_pool(queue, fail, is_retryable=lambda e: False, until=lambda pool: pool.stats["dead_lettered"] == 1)
+
+    assert pool.stats["retried"] == 0
+    assert queue.get("key-1")["attempts"] == 1
+
+
+@pytest.mark.parametrize("method", ["claim", "complete"])
+def test_worker_survives_a_failed_queue_call(queue, method):
+    flaky = FlakyQueue(queue, method)
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+    queue.enqueue("key-2", "send_slack", {"n": 2})
+
+    pool, alive = run_pool(flaky, succeed, until=lambda pool: pool.stats["succeeded"] == 2 - (method == "complete"))
+
+    assert alive
+    assert pool.stats["queue_errors"] == 1
+    statuses = sorted(queue.get(key)["status"] for key in ("key-1", "key-2"))
+    # A job whose result could not be recorded stays 'running' until recover()
+    assert statuses == (["running", "succeeded"] if method == "complete" else ["succeeded", "succeeded"])
+
+
+def test_worker_survives_a_failed_retry_record(queue):
+    flaky = FlakyQueue(queue, "fail")
+    queue.enqueue("key-1", "send_slack", {"n": 1})
+    queue.enqueue("key-2", "send_slack", {"n": 2})
+
+    pool, alive = run_pool(flaky, fail, until=lambda pool: pool.stats["dead_lettered"] == 1)
+
+    assert alive
+    assert pool.stats["queue_errors"] == 1
+    assert queue.get("key-1")["status"] == "running"
+    assert queue.get("key-2")["status"] == "dead"
@@ -0,0 +1,107 @@
+"""
+Per-user action cooldowns for the recommendation dispatch path.
+
+Each ACTION_MAPPING entry declares a `cooldown_seconds` window. If the same
+user was already sent the same action type within that window, for the same
+or a higher stress level, the action is not dispatched again and the previous
+action's details and Actions Service response are reused. A higher stress level is an escalation
+(e.g. a "High stress" Slack alert after a "great flow state" message) and is
+always dispatched.
+
+The index is bounded: entries older than the longest window are dropped, and
+once `max_entries` is reached the oldest entries are evicted first.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def token_digest(user_token: str) -> str:
+    """
+    Digest identifying a user token without keeping the token itself.
+    """
+    return hashlib.sha256(user_token.encode("utf-8")).hexdigest()[:32]
+
+
+def user_key_for(user_id: Optional[str], user_token: str) -> str:
+    """
+    Cooldown key for a user: the explicit user_id, or a digest of the token.
+    """
+    if user_id:
+        return f"id:{user_id}"
+    return "token:" + token_digest(user_token)
+
+
+class ActionCooldownIndex:
+    """
+    Bounded, expiring map of (user, action type) -> (dispatched_at, stress_level, details, response).
+    """
+    def __init__(self, max_entries: int = 100000, max_age_seconds: float = 86400.0):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int, Dict[str, Any], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            "dispatched": 0, "suppressed": 0, "escalations": 0, "evicted": 0, "expired": 0, "suppressed_by_action": {}
+        }
+
+    def _purge_expired(self, now: float):
+        # Entries are kept in dispatch order, so expired ones are at the front
+        while self._entries:
+            key, (dispatched_at, _, _, _) = next(iter(self._entries.items()))
+            if now - dispatched_at < self.max_age_seconds:
+                break
+            del self._entries[key]
+            self.stats["expired"] += 1
+
+    def lookup(
+        self, user_key: str, action: str, stress_level: int, cooldown_seconds: float
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Returns the previous (details, response) if `action` was dispatched to the user
+        within `cooldown_seconds` for a stress level at least `stress_level`, counting it
+        as a suppression; otherwise None.
+        """
+        if cooldown_seconds <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get((user_key, action))
+            if entry is None or now - entry[0] >= cooldown_seconds:
+                return None
+            if stress_level > entry[1]:
+                self.stats["escalations"] += 1
+                return None
+            self.stats["suppressed"] += 1
+            by_action = self.stats["suppressed_by_action"]
+            by_action[action] = by_action.get(action, 0) + 1
+            return entry[2], entry[3]
+
+    def record(
+        self, user_key: str, action: str, stress_level: int, details: Dict[str, Any], response: Dict[str, Any]
+    ):
+        """
+        Remembers a dispatched action, the stress level it was sent for and its response.
+        """
+        now = time.time()
+        with self._lock:
+            self.stats["dispatched"] += 1
+            key = (user_key, action)
+            self._entries.pop(key, None)
+            self._entries[key] = (now, stress_level, details, response)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "suppressed_by_action": dict(self.stats["suppressed_by_action"]),
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
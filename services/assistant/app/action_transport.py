@@ -0,0 +1,280 @@
+"""
+Transports the Assistant Service uses to execute recommended actions.
+
+- "http" (default): POST to the Actions Service over a pooled keep-alive session.
+  This is the split deployment, with one process per service.
+- "inprocess": import the Actions Service dispatch library
+  (services/actions/app/action_dispatch.py) and call it directly. This removes
+  the assistant -> actions hop. The dispatcher still reaches the Integrations
+  Service over HTTP, unless the integrations mode is also "inprocess". In that
+  case the Integrations app is loaded into this process and its handlers are
+  called through an in-memory ASGI transport, with no socket or connection
+  pool. Requests and responses are still JSON encoded at that boundary.
+
+Every transport returns the Actions Service response body, or raises a
+requests.exceptions.RequestException subclass, so callers handle both modes
+the same way.
+"""
+
+import abc
+import asyncio
+import importlib
+import importlib.util
+import os
+import sys
+import time
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import requests
+from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
+
+from app.resilience import CircuitBreaker, DeadlineExceeded, deadline_from_headers, deadline_scope, remaining_seconds
+
+ASSISTANT_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICES_DIR = os.path.dirname(os.path.dirname(ASSISTANT_APP_DIR))
+DEFAULT_ACTIONS_LIBRARY_PATH = os.path.join(SERVICES_DIR, "actions", "app", "action_dispatch.py")
+DEFAULT_INTEGRATIONS_SERVICE_DIR = os.path.join(SERVICES_DIR, "integrations")
+
+
+class ActionDispatchError(requests.exceptions.RequestException):
+    """
+    An in-process dispatch failed. Carries the status code the Actions Service would have returned.
+    """
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"Action dispatch failed with {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def load_module_from_path(module_name: str, path: str):
+    """
+    Imports a standalone module file under `module_name`.
+    """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load {module_name} from {path}")
+    module = importlib.util.module_from_spec(spec)
+    # Registered before exec so dataclasses and pydantic can resolve the module
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+def load_service_app(service_dir: str, module_name: str = "app.main"):
+    """
+    Imports another service's `app.main` without clashing with this service's `app` package.
+
+    Every service uses a top-level `app` package. This service's `app.*` entries
+    are set aside in sys.modules while the other service is imported from
+    `service_dir`, and then put back. The other service's modules stay
+    referenced by the module objects that imported them.
+    """
+    def is_app_module(name: str) -> bool:
+        return name == "app" or name.startswith("app.")
+
+    saved = {name: module for name, module in sys.modules.items() if is_app_module(name)}
+    for name in saved:
+        del sys.modules[name]
+    sys.path.insert(0, service_dir)
+    try:
+        return importlib.import_module(module_name)
+    finally:
+        sys.path.remove(service_dir)
+        for name in [name for name in sys.modules if is_app_module(name)]:
+            del sys.modules[name]
+        sys.modules.update(saved)
+
+
+class ActionTransport(abc.ABC):
+    """
+    Interface: execute one action request and return the Actions Service response body.
+    Subclasses implement _execute; execute_action adds the call statistics.
+    """
+    mode = "base"
+
+    def __init__(self):
+        self.stats = {"calls": 0, "errors": 0, "total_seconds": 0.0}
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    async def _execute(self, action_request: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Performs the action and returns the Actions Service response body.
+        """
+
+    async def execute_action(self, action_request: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.stats["calls"] += 1
+        try:
+            return await self._execute(action_request, headers)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.stats["total_seconds"] += time.perf_counter() - started
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = self.stats["calls"]
+        return {
+            "mode": self.mode,
+            "calls": calls,
+            "errors": self.stats["errors"],
+            "avg_latency_ms": round(1000 * self.stats["total_seconds"] / calls, 3) if calls else 0.0,
+        }
+
+
+class HttpActionTransport(ActionTransport):
+    """
+    Split deployment: POSTs to the Actions Service's /api/v1/execute_action.
+    """
+    mode = "http"
+
+    def __init__(self, actions_url: str, timeout: float = 30.0, pool_size: int = 20):
+        super().__init__()
+        self.actions_url = actions_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    async def _execute(self, action_request: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._post, action_request, headers)
+
+    def _post(self, action_request: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        timeout = self.timeout
+        budget = deadline_from_headers(headers)
+        if budget is not None:
+            # The Actions Service would answer 504; no point waiting longer than the caller's deadline
+            if budget <= 0:
+                raise DeadlineExceeded("Request deadline passed before calling the Actions Service")
+            timeout = min(timeout, budget)
+        response = self.session.post(
+            f"{self.actions_url}/api/v1/execute_action",
+            json=action_request,
+            headers=headers,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        self.session.close()
+
+
+class InProcessActionTransport(ActionTransport):
+    """
+    Combined deployment: runs the Actions Service dispatch library inside this process.
+
+    With `integrations_inprocess` the Integrations app is loaded too, and the
+    dispatcher's client talks to it through httpx.ASGITransport. Otherwise the
+    client is a pooled connection to `integrations_url`. `wrap_transport`, if
+    given, wraps the client's transport (used to add tracing).
+    """
+    mode = "inprocess"
+
+    def __init__(
+        self,
+        integrations_url: str,
+        actions_library_path: str = DEFAULT_ACTIONS_LIBRARY_PATH,
+        integrations_inprocess: bool = False,
+        integrations_service_dir: str = DEFAULT_INTEGRATIONS_SERVICE_DIR,
+        wrap_transport: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None,
+    ):
+        super().__init__()
+        self.integrations_url = integrations_url
+        self.actions_library_path = actions_library_path
+        self.integrations_inprocess = integrations_inprocess
+        self.integrations_service_dir = integrations_service_dir
+        self.wrap_transport = wrap_transport
+        self.mode = "inprocess+integrations" if integrations_inprocess else "inprocess"
+        self._library = None
+        self._dispatcher = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+
+    async def start(self):
+        self._library = load_module_from_path("harmonia_action_dispatch", self.actions_library_path)
+        self._exit_stack = AsyncExitStack()
+
+        if self.integrations_inprocess:
+            integrations_app = load_service_app(self.integrations_service_dir).app
+            # ASGITransport does not run lifespan events, so enter the app's lifespan here
+            await self._exit_stack.enter_async_context(integrations_app.router.lifespan_context(integrations_app))
+            transport = httpx.ASGITransport(app=integrations_app)
+            base_url = "http://integrations.inprocess"
+        else:
+            transport = httpx.AsyncHTTPTransport()
+            base_url = self.integrations_url
+
+        if self.wrap_transport is not None:
+            transport = self.wrap_transport(transport)
+        client = httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30)
+
+        await self._exit_stack.enter_async_context(client)
+        self._dispatcher = self._library.ActionDispatcher(
+            client, breaker=CircuitBreaker("integrations"), remaining_seconds=remaining_seconds
+        )
+
+    async def _execute(self, action_request: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+        if self._dispatcher is None:
+            raise ActionDispatchError(503, "In-process action dispatcher is not started")
+        # Same deadline the Actions Service would read from the header
+        budget = deadline_from_headers(headers)
+        if budget is not None and budget <= 0:
+            raise DeadlineExceeded("Request deadline passed before dispatching the action")
+        try:
+            with deadline_scope(budget):
+                return await self._dispatcher.dispatch(self._library.ActionRequest(**action_request))
+        except HTTPException as e:
+            raise ActionDispatchError(e.status_code, e.detail)
+
+    async def close(self):
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+        self._dispatcher = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = super().snapshot()
+        if self._dispatcher is not None and self._dispatcher.breaker is not None:
+            snapshot["integrations_circuit"] = self._dispatcher.breaker.snapshot()
+        return snapshot
+
+
+def create_action_transport(
+    mode: str,
+    actions_url: str,
+    integrations_url: str,
+    integrations_mode: str = "http",
+    actions_library_path: Optional[str] = None,
+    integrations_service_dir: Optional[str] = None,
+    wrap_transport: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None,
+) -> ActionTransport:
+    """
+    Builds the transport for ACTIONS_DISPATCH_MODE ("http" or "inprocess").
+    """
+    if mode == "http":
+        return HttpActionTransport(actions_url)
+    if mode == "inprocess":
+        return InProcessActionTransport(
+            integrations_url,
+            actions_library_path=actions_library_path or DEFAULT_ACTIONS_LIBRARY_PATH,
+            integrations_inprocess=integrations_mode == "inprocess",
+            integrations_service_dir=integrations_service_dir or DEFAULT_INTEGRATIONS_SERVICE_DIR,
+            wrap_transport=wrap_transport,
+        )
+    raise ValueError(f"Unknown action dispatch mode: {mode}")
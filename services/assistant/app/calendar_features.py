@@ -0,0 +1,122 @@
+"""
+Incremental calendar feature computation.
+
+CalendarFeatureAccumulator consumes calendar events one at a time and keeps
+only what Calendar_Busy_Hours and Sleep_Duration need (a running busy-minute
+total and the event start times), plus the (start, end) timestamps of timed
+events for the hourly feature history, so events can be fed straight from the
+Integrations Service's NDJSON stream without materialising the whole calendar.
+"""
+
+import json
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+
+class CalendarStreamError(requests.exceptions.RequestException):
+    """
+    Raised when the Integrations Service reports an error part-way through a stream.
+    """
+
+
+def _parse_event_time(event: Dict[str, Any], key: str, allow_date: bool) -> Optional[datetime]:
+    if key not in event:
+        return None
+    value = event[key].get('dateTime')
+    if not value and allow_date:
+        value = event[key].get('date')
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class CalendarFeatureAccumulator:
+    """
+    Running calendar aggregates for a single feature-extraction pass.
+    """
+    def __init__(self, now: Optional[datetime] = None):
+        self.now = now or datetime.now(timezone.utc)
+        self.window_start = self.now - timedelta(hours=24)
+        self.event_count = 0
+        self.busy_minutes = 0.0
+        self.start_times: List[datetime] = []
+        # (start, end) Unix timestamps of timed events
+        self.intervals: List[Tuple[float, float]] = []
+
+    def add(self, event: Dict[str, Any]):
+        self.event_count += 1
+        try:
+            start_time = _parse_event_time(event, 'start', allow_date=True)
+            end_time = _parse_event_time(event, 'end', allow_date=True)
+
+            # Calculate duration if both times are available and within last 24h
+            if start_time and end_time and start_time >= self.window_start:
+                duration_minutes = (end_time - start_time).total_seconds() / 60
+                self.busy_minutes += max(0, duration_minutes)
+        except (ValueError, KeyError, TypeError):
+            # Skip events with invalid time formats (or all-day dates that cannot be compared)
+            pass
+
+        try:
+            # Only timed events are used to estimate sleep gaps
+            timed_start = _parse_event_time(event, 'start', allow_date=False)
+            if timed_start:
+                self.start_times.append(timed_start)
+                timed_end = _parse_event_time(event, 'end', allow_date=False)
+                if timed_end:
+                    self.intervals.append((timed_start.timestamp(), timed_end.timestamp()))
+        except (ValueError, KeyError):
+            pass
+
+    def busy_hours(self) -> float:
+        return round(self.busy_minutes / 60, 2)  # Convert to hours
+
+    def sleep_duration(self) -> float:
+        """
+        Longest gap between consecutive event starts that looks like a night's sleep (6-12 hours).
+        """
+        if self.event_count == 0:
+            return 7.0  # Default 7 hours
+
+        sorted_starts = sorted(self.start_times)
+        gaps = []
+        for i in range(1, len(sorted_starts)):
+            gap_hours = (sorted_starts[i] - sorted_starts[i - 1]).total_seconds() / 3600
+            # Consider gaps between 6-12 hours as potential sleep periods
+            if 6 <= gap_hours <= 12:
+                gaps.append(gap_hours)
+
+        if gaps:
+            return round(max(gaps), 1)  # Return the longest reasonable gap
+        return 7.0  # Default
+
+
+def stream_calendar_features(
+    integrations_url: str,
+    headers: Dict[str, str],
+    timeout: float = 30,
+    hours: int = 24,
+) -> CalendarFeatureAccumulator:
+    """
+    Reads /api/v1/data/calendar/stream line by line and feeds every event into a
+    CalendarFeatureAccumulator as it arrives.
+    """
+    accumulator = CalendarFeatureAccumulator()
+    with requests.get(
+        f"{integrations_url}/api/v1/data/calendar/stream",
+        params={"hours": hours},
+        headers=headers,
+        stream=True,
+        timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if set(event) == {"error"}:
+                raise CalendarStreamError(f"Calendar stream failed: {event['error']}")
+            accumulator.add(event)
+    return accumulator
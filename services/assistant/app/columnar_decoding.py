@@ -0,0 +1,114 @@
+"""
+Zero-copy reader for the Integrations Service's columnar binary encoding
+(`application/vnd.harmonia.columnar`, see integrations/app/columnar_encoding.py).
+
+Every column is exposed as a NumPy array that views the response buffer
+directly, and the calendar/heart-rate features are computed on those arrays
+without building per-event Python objects.
+"""
+
+import json
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.harmonia.columnar"
+MAGIC = b"HCOL"
+SUPPORTED_VERSION = 1
+
+_EMPTY_COLUMNS = {
+    "hr_time_ns": np.dtype("<i8"),
+    "hr_value": np.dtype("<f8"),
+    "event_start": np.dtype("<f8"),
+    "event_end": np.dtype("<f8"),
+}
+
+
+class ColumnarPayload:
+    """
+    Decoded view over a columnar buffer. Missing columns read as empty arrays.
+    """
+    def __init__(self, buffer: bytes, meta: Dict[str, Any], columns: Dict[str, np.ndarray]):
+        self.buffer = buffer
+        self.meta = meta
+        self.columns = columns
+
+    def column(self, name: str) -> np.ndarray:
+        if name in self.columns:
+            return self.columns[name]
+        return np.empty(0, dtype=_EMPTY_COLUMNS.get(name, np.dtype("|u1")))
+
+    def texts(self, prefix: str) -> List[str]:
+        """
+        Materializes a text column (e.g. "event_summary") as Python strings.
+        """
+        offsets = self.columns.get(f"{prefix}_offsets")
+        data = self.columns.get(f"{prefix}_data")
+        if offsets is None or data is None:
+            return []
+        raw = data.tobytes()
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def decode_columnar(buffer: bytes) -> ColumnarPayload:
+    """
+    Parses the header and wraps each column with np.frombuffer (no copies).
+    """
+    view = memoryview(buffer)
+    if bytes(view[:4]) != MAGIC:
+        raise ValueError("Not a columnar payload")
+    version, _, header_len = struct.unpack_from("<HHI", view, 4)
+    if version != SUPPORTED_VERSION:
+        raise ValueError(f"Unsupported columnar payload version {version}")
+
+    header = json.loads(bytes(view[12:12 + header_len]))
+    columns = {}
+    for col in header["columns"]:
+        dtype = np.dtype(col["dtype"])
+        if col["count"] == 0:
+            columns[col["name"]] = np.empty(0, dtype=dtype)
+        else:
+            columns[col["name"]] = np.frombuffer(buffer, dtype=dtype, count=col["count"], offset=col["offset"])
+    return ColumnarPayload(buffer, header.get("meta", {}), columns)
+
+
+def busy_hours(payload: ColumnarPayload, now: Optional[datetime] = None) -> float:
+    """
+    Calendar_Busy_Hours from the event_start/event_end columns (timed events starting in the last 24h).
+    """
+    start = payload.column("event_start")
+    end = payload.column("event_end")
+    if start.size == 0:
+        return 0.0
+    window_start = (now or datetime.now(timezone.utc)).timestamp() - 24 * 3600
+    with np.errstate(invalid="ignore"):
+        mask = ~np.isnan(start) & ~np.isnan(end) & (start >= window_start)
+    busy_minutes = np.maximum(end[mask] - start[mask], 0.0).sum() / 60
+    return round(float(busy_minutes) / 60, 2)
+
+
+def sleep_duration(payload: ColumnarPayload) -> float:
+    """
+    Sleep_Duration as the longest 6-12 hour gap between consecutive timed event starts.
+    """
+    start = payload.column("event_start")
+    if start.size == 0:
+        return 7.0
+    starts = np.sort(start[~np.isnan(start)])
+    gaps = np.diff(starts) / 3600
+    gaps = gaps[(gaps >= 6) & (gaps <= 12)]
+    if gaps.size:
+        return round(float(gaps.max()), 1)
+    return 7.0
+
+
+def heart_rate_average(payload: ColumnarPayload) -> float:
+    """
+    HeartRate_Avg over every heart-rate value in the payload.
+    """
+    values = payload.column("hr_value")
+    if values.size == 0:
+        return 70.0  # Default resting heart rate
+    return round(float(values.mean()), 1)
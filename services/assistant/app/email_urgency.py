@@ -0,0 +1,100 @@
+"""
+Rolling per-user email urgency state.
+
+The Integrations Service returns only the inbox messages added since a Gmail
+historyId (/api/v1/data/emails/sync). Each message is classified once when it
+arrives and remembered here with its urgency, so a scoring only classifies new
+mail. The user's Urgent_Emails_Flag is 1.0 while any message received within
+the last `window_seconds` was classified as urgent.
+
+State lives in memory, is bounded per user and in users (least recently
+updated users are evicted), and is rebuilt by a full sync after a restart.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterable, Optional, Set, Tuple
+
+
+@dataclass
+class _UserEmailState:
+    history_id: Optional[str] = None
+    # (received at in ms, message id, urgent), oldest first
+    messages: Deque[Tuple[int, str, bool]] = field(default_factory=deque)
+    seen: Set[str] = field(default_factory=set)
+
+
+class EmailUrgencyTracker:
+    """
+    Per-user history id plus the urgency of recently received messages.
+    """
+    def __init__(self, window_seconds: float = 86400.0, max_messages_per_user: int = 200, max_users: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_messages_per_user = max_messages_per_user
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserEmailState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"classified": 0, "urgent": 0, "duplicates": 0, "full_syncs": 0, "evicted_users": 0}
+
+    def history_id(self, user_key: str) -> Optional[str]:
+        with self._lock:
+            state = self._users.get(user_key)
+            return state.history_id if state else None
+
+    def _prune(self, state: _UserEmailState, now_ms: int):
+        horizon = now_ms - self.window_seconds * 1000
+        while state.messages and (
+            state.messages[0][0] < horizon or len(state.messages) > self.max_messages_per_user
+        ):
+            _, message_id, _ = state.messages.popleft()
+            state.seen.discard(message_id)
+
+    def update(self, user_key: str, history_id: str, classified: Iterable[Tuple[str, int, bool]], full_sync: bool = False):
+        """
+        Records newly classified (message id, received at ms, urgent) messages and the history id they were synced up to.
+        A full sync replaces the user's previous state.
+        """
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            state = self._users.pop(user_key, None)
+            if state is None or full_sync:
+                state = _UserEmailState()
+                self.stats["full_syncs"] += full_sync
+            self._users[user_key] = state
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.stats["evicted_users"] += 1
+
+            state.history_id = history_id
+            for message_id, received_ms, urgent in sorted(classified, key=lambda item: item[1]):
+                if message_id in state.seen:
+                    # Concurrent scorings of one user can receive the same messages
+                    self.stats["duplicates"] += 1
+                    continue
+                state.seen.add(message_id)
+                state.messages.append((received_ms, message_id, urgent))
+                self.stats["classified"] += 1
+                self.stats["urgent"] += urgent
+            self._prune(state, now_ms)
+
+    def urgent_flag(self, user_key: str) -> float:
+        """
+        1.0 if any message received within the window was urgent, else 0.0.
+        """
+        with self._lock:
+            state = self._users.get(user_key)
+            if state is None:
+                return 0.0
+            self._prune(state, int(time.time() * 1000))
+            return 1.0 if any(urgent for _, _, urgent in state.messages) else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "users": len(self._users),
+                "tracked_messages": sum(len(state.messages) for state in self._users.values()),
+                "window_seconds": self.window_seconds,
+            }
@@ -0,0 +1,334 @@
+"""
+Per-user hourly feature history in fixed-size, memory-mapped NumPy ring buffers.
+
+Every scoring already fetches the last 24 hours of heart-rate data and the next
+24 hours of calendar events. Their hourly aggregates are written here, so
+feature extraction can see 7- and 30-day trends without fetching more raw data:
+
+    busy_minutes   calendar minutes booked in the hour
+    heart_rate     mean heart rate in the hour (only hours with samples count)
+    steps          estimated steps in the hour
+    urgent_emails  urgent messages received in the hour
+
+Each user owns one row of a ring of RING_HOURS hourly slots. A slot holds the
+*cumulative* sum (and count of hours with data) of every feature up to that
+hour, so the sum over any window is the difference of two slots. That makes a
+1-, 7- or 30-day statistic O(1). Rewriting an hour (a later scoring sees a
+calendar change, say) adds the difference to the slots from that hour to the
+newest one. That is at most a few dozen slots, because only recent hours are
+ever rewritten. Hours more than LOOKAHEAD_HOURS ahead of now are dropped, so a
+30-day window ending now always lies inside the ring.
+
+The rings live in three files under `directory`, opened with np.memmap:
+cum.npy (float64 sums), cnt.npy (int32 counts) and meta.npy (first hour,
+newest hour and last update per row). users.json maps user keys to rows. The
+kernel writes dirty pages back on its own; flush() forces it, e.g. at
+shutdown. When every row is taken, the least recently updated user is evicted.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ("busy_minutes", "heart_rate", "steps", "urgent_emails")
+WINDOWS = {"1d": 24, "7d": 7 * 24, "30d": 30 * 24}
+# Longest window plus room for calendar hours recorded ahead of "now"
+LOOKAHEAD_HOURS = 48
+RING_HOURS = max(WINDOWS.values()) + LOOKAHEAD_HOURS + 1
+
+_FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+# meta columns
+_FIRST, _LATEST, _UPDATED = 0, 1, 2
+
+
+def hour_of(timestamp: float) -> int:
+    """
+    Absolute hour number (hours since the Unix epoch) of a Unix timestamp.
+    """
+    return int(timestamp // 3600)
+
+
+def hourly_busy_minutes(starts: np.ndarray, ends: np.ndarray, from_hour: int, to_hour: int) -> Dict[int, float]:
+    """
+    Minutes of [start, end) intervals falling in each hour of [from_hour, to_hour]. Hours without events are 0.
+    """
+    hours = np.arange(from_hour, to_hour + 1)
+    if hours.size == 0:
+        return {}
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    valid = ~np.isnan(starts) & ~np.isnan(ends) & (ends > starts)
+    starts, ends = starts[valid], ends[valid]
+    hour_starts = hours * 3600.0
+    overlap = np.minimum(ends[:, None], hour_starts + 3600.0) - np.maximum(starts[:, None], hour_starts)
+    minutes = np.clip(overlap, 0.0, None).sum(axis=0) / 60 if starts.size else np.zeros(hours.size)
+    return {int(hour): float(value) for hour, value in zip(hours, minutes)}
+
+
+def hourly_means(times: np.ndarray, values: np.ndarray, from_hour: int, to_hour: int) -> Dict[int, Optional[float]]:
+    """
+    Mean of the values sampled in each hour of [from_hour, to_hour]; None for hours without samples.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    sample_hours = np.floor(times / 3600).astype(np.int64)
+    mask = (sample_hours >= from_hour) & (sample_hours <= to_hour) & ~np.isnan(values)
+    offsets = sample_hours[mask] - from_hour
+    span = to_hour - from_hour + 1
+    sums = np.bincount(offsets, weights=values[mask], minlength=span)
+    counts = np.bincount(offsets, minlength=span)
+    return {
+        from_hour + i: (float(sums[i] / counts[i]) if counts[i] else None)
+        for i in range(span)
+    }
+
+
+class FeatureHistoryStore:
+    """
+    Memory-mapped per-user rings of cumulative hourly feature sums with O(1) window statistics.
+    """
+    def __init__(self, directory: str, max_users: int = 2000):
+        self.directory = directory
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self.stats = {
+            "updates": 0, "hours_written": 0, "stale_hours_dropped": 0, "future_hours_dropped": 0, "evicted_users": 0
+        }
+        os.makedirs(directory, exist_ok=True)
+
+        shapes = {
+            "cum": ((max_users, RING_HOURS, len(FEATURES)), np.float64),
+            "cnt": ((max_users, RING_HOURS, len(FEATURES)), np.int32),
+            "meta": ((max_users, 3), np.int64),
+        }
+        users_path = os.path.join(directory, "users.json")
+        reuse = os.path.exists(users_path)
+        arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            path = os.path.join(directory, f"{name}.npy")
+            existing = None
+            if reuse and os.path.exists(path):
+                existing = np.lib.format.open_memmap(path, mode="r+")
+                if existing.shape != shape or existing.dtype != dtype:
+                    logger.warning("Feature history file %s has a different layout; starting a new history", path)
+                    existing = None
+            if existing is None:
+                reuse = False
+            arrays[name] = existing
+        if not reuse:
+            for name, (shape, dtype) in shapes.items():
+                arrays[name] = np.lib.format.open_memmap(
+                    os.path.join(directory, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape
+                )
+            arrays["meta"][:] = -1
+        self._cum, self._cnt, self._meta = arrays["cum"], arrays["cnt"], arrays["meta"]
+
+        self._rows: Dict[str, int] = {}
+        if reuse:
+            with open(users_path, encoding="utf-8") as f:
+                self._rows = json.load(f)
+        self._free = sorted(set(range(max_users)) - set(self._rows.values()), reverse=True)
+        self._save_users()
+
+    # --- Row management ---
+
+    def _save_users(self):
+        path = os.path.join(self.directory, "users.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._rows, f)
+        os.replace(path + ".tmp", path)
+
+    def _row(self, user_key: str, create: bool) -> Optional[int]:
+        row = self._rows.get(user_key)
+        if row is not None or not create:
+            return row
+        if not self._free:
+            # Evict the least recently updated user
+            victim = min(self._rows, key=lambda key: self._meta[self._rows[key], _UPDATED])
+            self._free.append(self._rows.pop(victim))
+            self.stats["evicted_users"] += 1
+        row = self._free.pop()
+        self._cum[row] = 0.0
+        self._cnt[row] = 0
+        self._meta[row] = -1
+        self._rows[user_key] = row
+        self._save_users()
+        return row
+
+    # --- Cumulative lookups ---
+
+    def _oldest(self, row: int) -> int:
+        """
+        Oldest hour whose slot the ring still holds.
+        """
+        return int(self._meta[row, _LATEST]) - RING_HOURS + 1
+
+    def _cumulative(self, row: int, hour: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cumulative sums and counts up to and including `hour`. Raises ValueError for hours
+        whose slot has been reused by a newer hour.
+        """
+        first, latest = self._meta[row, _FIRST], self._meta[row, _LATEST]
+        oldest = self._oldest(row)
+        # Before the first hour everything is zero, unless that hour has left the ring
+        if first < 0 or (hour < first and first >= oldest):
+            return np.zeros(len(FEATURES)), np.zeros(len(FEATURES), dtype=np.int32)
+        if hour < oldest:
+            raise ValueError(f"Hour {hour} is older than the ring (oldest hour {oldest})")
+        hour = min(hour, latest)
+        return self._cum[row, hour % RING_HOURS], self._cnt[row, hour % RING_HOURS]
+
+    def _advance(self, row: int, hour: int):
+        """
+        Extends the ring to `hour`, carrying the newest cumulative values forward.
+        """
+        first, latest = self._meta[row, _FIRST], self._meta[row, _LATEST]
+        if first < 0:
+            self._meta[row, _FIRST] = self._meta[row, _LATEST] = hour
+            self._cum[row, hour % RING_HOURS] = 0.0
+            self._cnt[row, hour % RING_HOURS] = 0
+            return
+        if hour <= latest:
+            return
+        cum, cnt = self._cum[row, latest % RING_HOURS].copy(), self._cnt[row, latest % RING_HOURS].copy()
+        positions = np.arange(max(latest + 1, hour - RING_HOURS + 1), hour + 1) % RING_HOURS
+        self._cum[row, positions] = cum
+        self._cnt[row, positions] = cnt
+        self._meta[row, _LATEST] = hour
+
+    def _prepend(self, row: int, hour: int) -> bool:
+        """
+        Extends the ring back to `hour` (before the user's first hour) if it still fits.
+        """
+        first, latest = self._meta[row, _FIRST], self._meta[row, _LATEST]
+        if latest - hour >= RING_HOURS:
+            return False
+        positions = np.arange(hour, first) % RING_HOURS
+        self._cum[row, positions] = 0.0
+        self._cnt[row, positions] = 0
+        self._meta[row, _FIRST] = hour
+        return True
+
+    # --- Updates ---
+
+    def record(self, user_key: str, hourly: Dict[int, Dict[str, Optional[float]]], accumulate: Iterable[str] = ()):
+        """
+        Writes hourly values: {hour: {feature: value}}. A value of None marks the hour as
+        having no data for that feature. Features in `accumulate` are added to the hour's
+        current value (for incremental sources such as new emails); the others replace it.
+        """
+        if not hourly:
+            return
+        accumulate = set(accumulate)
+        horizon = hour_of(time.time()) + LOOKAHEAD_HOURS
+        with self._lock:
+            row = self._row(user_key, create=True)
+            for hour in sorted(hourly):
+                values = hourly[hour]
+                if hour > horizon:
+                    self.stats["future_hours_dropped"] += 1
+                    continue
+                if self._meta[row, _FIRST] < 0 or hour > self._meta[row, _LATEST]:
+                    self._advance(row, hour)
+                elif hour < self._meta[row, _FIRST] and not self._prepend(row, hour):
+                    self.stats["stale_hours_dropped"] += 1
+                    continue
+                elif hour <= self._oldest(row):
+                    self.stats["stale_hours_dropped"] += 1
+                    continue
+
+                prev_cum, prev_cnt = self._cumulative(row, hour - 1)
+                cur_cum, cur_cnt = self._cumulative(row, hour)
+                old = cur_cum - prev_cum
+                old_present = cur_cnt - prev_cnt
+                new, new_present = old.copy(), old_present.copy()
+                for name, value in values.items():
+                    i = _FEATURE_INDEX[name]
+                    if name in accumulate:
+                        if value is not None:
+                            new[i] += value
+                            new_present[i] = 1
+                    else:
+                        new[i] = value if value is not None else 0.0
+                        new_present[i] = 1 if value is not None else 0
+
+                positions = np.arange(hour, self._meta[row, _LATEST] + 1) % RING_HOURS
+                self._cum[row, positions] += new - old
+                self._cnt[row, positions] += (new_present - old_present).astype(np.int32)
+                self.stats["hours_written"] += 1
+            self._meta[row, _UPDATED] = int(time.time())
+            self.stats["updates"] += 1
+
+    # --- Queries ---
+
+    def last_updated(self, user_key: str) -> Optional[float]:
+        """
+        Unix time of the user's last recorded update, or None.
+        """
+        with self._lock:
+            row = self._row(user_key, create=False)
+            if row is None or self._meta[row, _UPDATED] < 0:
+                return None
+            return float(self._meta[row, _UPDATED])
+
+    def window(self, user_key: str, hours: int, now: Optional[float] = None) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+        """
+        (sum, hours with data) of every feature over the `hours` hours ending with the current one,
+        plus how many of those hours the user's history covers. A window reaching back past the
+        ring (only possible for a `now` in the past) is shortened to the hours it still holds.
+        """
+        end = hour_of(now if now is not None else time.time())
+        with self._lock:
+            row = self._row(user_key, create=False)
+            if row is None or self._meta[row, _FIRST] < 0 or end < self._oldest(row):
+                return None
+            start = max(end - hours, self._oldest(row))
+            end_cum, end_cnt = self._cumulative(row, end)
+            start_cum, start_cnt = self._cumulative(row, start)
+            covered = int(min(end - start, max(0, end - self._meta[row, _FIRST] + 1)))
+            return end_cum - start_cum, end_cnt - start_cnt, covered
+
+    def rolling_stats(self, user_key: str, now: Optional[float] = None) -> Optional[Dict[str, Dict[str, Optional[float]]]]:
+        """
+        Per-day averages over the 1-, 7- and 30-day windows, or None for users without history.
+        A window longer than the history is averaged over the days it does cover.
+        """
+        stats = {}
+        for label, hours in WINDOWS.items():
+            result = self.window(user_key, hours, now)
+            if result is None:
+                return None
+            sums, counts, covered = result
+            days = max(covered, 1) / 24
+            hr_hours = int(counts[_FEATURE_INDEX["heart_rate"]])
+            stats[label] = {
+                "busy_hours_per_day": round(float(sums[_FEATURE_INDEX["busy_minutes"]]) / 60 / days, 2),
+                "heart_rate_avg": round(float(sums[_FEATURE_INDEX["heart_rate"]]) / hr_hours, 1) if hr_hours else None,
+                "steps_per_day": round(float(sums[_FEATURE_INDEX["steps"]]) / days, 0),
+                "urgent_emails_per_day": round(float(sums[_FEATURE_INDEX["urgent_emails"]]) / days, 2),
+                "heart_rate_coverage_hours": hr_hours,
+                "history_hours": covered,
+            }
+        return stats
+
+    def flush(self):
+        with self._lock:
+            for array in (self._cum, self._cnt, self._meta):
+                array.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "directory": self.directory,
+            "users": len(self._rows),
+            "max_users": self.max_users,
+            "ring_hours": RING_HOURS,
+            "file_mb": round(sum(a.nbytes for a in (self._cum, self._cnt, self._meta)) / 1024 / 1024, 1),
+        }
@@ -1,11 +1,48 @@
 import os
+import asyncio
+import hmac
+import json
 import pickle
+import threading
+import time
 import requests
 import pandas as pd
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import ExitStack, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Header, Body
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field, validator
-from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Any, Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any, Optional, Tuple, Union
+from app.calendar_features import CalendarFeatureAccumulator, stream_calendar_features
+from app import columnar_decoding
+from app.columnar_decoding import COLUMNAR_MEDIA_TYPE, ColumnarPayload, decode_columnar
+from app.action_cooldown import ActionCooldownIndex, token_digest, user_key_for
+from app.action_transport import ActionTransport, create_action_transport
+from app.profiling import Profiler, ProfilingMiddleware, create_profiling_router
+from app.loop_monitor import (
+    LOOP_BLOCK_THRESHOLD_MS,
+    LOOP_MONITOR_ENABLED,
+    LOOP_MONITOR_INTERVAL_MS,
+    LOOP_MONITOR_MAX_OFFENDERS,
+    EventLoopMonitor,
+    create_loop_monitor_router,
+)
+from app.tracing import Tracer, TracingMiddleware, TracingTransport, current_span, inject
+from app.scoring_scheduler import ScoringRegistration, ScoringScheduler
+from app.process_memory import memory_usage
+from app.nlp_admission import AdmissionRejected, NlpAdmissionController, SharedSlot
+from app.shadow_scoring import ShadowScorer
+from app.email_urgency import EmailUrgencyTracker
+from app.feature_history import LOOKAHEAD_HOURS, FeatureHistoryStore, hour_of, hourly_busy_minutes, hourly_means
+from app.payload_cache import PayloadCache
+from app.prediction_store import ALL_TEAMS, PredictionStore
+from app.sharding import ShardRouter, ShardRoutingMiddleware
+from app.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, DeadlineMiddleware,
+    ResilientHttpClient, cancellation_scope, deadline_headers, deadline_scope, deadline_stats
+)
 
 try:
     from transformers import AutoTokenizer, AutoModelForSequenceClassification
@@ -54,6 +91,110 @@ class DecisionEngine:
 INTEGRATIONS_SERVICE_URL = os.getenv("INTEGRATIONS_SERVICE_URL", "http://localhost:8001")
 ACTIONS_SERVICE_URL = os.getenv("ACTIONS_SERVICE_URL", "http://localhost:8003")
 
+# Resilience of calls to the Integrations Service (see app/resilience.py). A scoring
+# must finish within REQUEST_DEADLINE_SECONDS (or the caller's X-Request-Deadline-Ms);
+# the time left caps each call's timeout and is passed downstream. GETs slower than
+# the recent INTEGRATIONS_HEDGE_PERCENTILE latency are hedged (at most
+# INTEGRATIONS_HEDGE_MAX_RATIO of calls). After INTEGRATIONS_BREAKER_FAILURES failures
+# in a row, calls fail fast for INTEGRATIONS_BREAKER_RESET_SECONDS before one probe.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "20"))
+
+# User-affinity sharding over Assistant replicas (see app/sharding.py). ASSISTANT_SHARD_NODES
+# lists every replica's base URL (comma-separated, the same list on every replica) and
+# ASSISTANT_SHARD_SELF is this replica's. Empty: no sharding, every request is served here.
+ASSISTANT_SHARD_NODES = [node.strip() for node in os.getenv("ASSISTANT_SHARD_NODES", "").split(",") if node.strip()]
+ASSISTANT_SHARD_SELF = os.getenv("ASSISTANT_SHARD_SELF", "")
+ASSISTANT_SHARD_VNODES = int(os.getenv("ASSISTANT_SHARD_VNODES", "160"))
+ASSISTANT_SHARD_FORWARD_TIMEOUT_SECONDS = float(os.getenv("ASSISTANT_SHARD_FORWARD_TIMEOUT_SECONDS", "30"))
+ASSISTANT_SHARD_RETRY_SECONDS = float(os.getenv("ASSISTANT_SHARD_RETRY_SECONDS", "5"))
+INTEGRATIONS_TIMEOUT_SECONDS = float(os.getenv("INTEGRATIONS_TIMEOUT_SECONDS", "10"))
+INTEGRATIONS_HEDGE_ENABLED = os.getenv("INTEGRATIONS_HEDGE_ENABLED", "true").lower() == "true"
+INTEGRATIONS_HEDGE_PERCENTILE = float(os.getenv("INTEGRATIONS_HEDGE_PERCENTILE", "0.95"))
+INTEGRATIONS_HEDGE_MAX_RATIO = float(os.getenv("INTEGRATIONS_HEDGE_MAX_RATIO", "0.1"))
+INTEGRATIONS_BREAKER_FAILURES = int(os.getenv("INTEGRATIONS_BREAKER_FAILURES", "5"))
+INTEGRATIONS_BREAKER_RESET_SECONDS = float(os.getenv("INTEGRATIONS_BREAKER_RESET_SECONDS", "10"))
+
+# When enabled, calendar events are read from the paginated NDJSON stream and fed
+# straight into feature computation instead of the (truncated) aggregate payload.
+CALENDAR_STREAMING_ENABLED = os.getenv("CALENDAR_STREAMING_ENABLED", "true").lower() == "true"
+
+# Hours of upcoming events read from the calendar stream
+CALENDAR_STREAM_HOURS = 24
+
+# Per-user hourly feature history (see app/feature_history.py). Preforked
+# workers (app/prefork.py) each keep their own history under worker-<n>.
+FEATURE_HISTORY_ENABLED = os.getenv("FEATURE_HISTORY_ENABLED", "true").lower() == "true"
+FEATURE_HISTORY_DIR = os.getenv("FEATURE_HISTORY_DIR", "feature_history")
+FEATURE_HISTORY_MAX_USERS = int(os.getenv("FEATURE_HISTORY_MAX_USERS", "2000"))
+
+# Append-only prediction log and the team stress rollups served to dashboards
+# (see app/prediction_store.py). Preforked workers share the one log.
+PREDICTION_STORE_ENABLED = os.getenv("PREDICTION_STORE_ENABLED", "true").lower() == "true"
+PREDICTION_LOG_PATH = os.getenv("PREDICTION_LOG_PATH", "predictions.jsonl")
+# Stress levels from this one up count as high stress (the "high" band of ACTION_MAPPING)
+PREDICTION_HIGH_STRESS_LEVEL = int(os.getenv("PREDICTION_HIGH_STRESS_LEVEL", "7"))
+PREDICTION_ROLLUP_HOURS = int(os.getenv("PREDICTION_ROLLUP_HOURS", "168"))
+PREDICTION_ROLLUP_DAYS = int(os.getenv("PREDICTION_ROLLUP_DAYS", "90"))
+
+# Users whose last aggregate payload (with its ETag and features) is kept, so an
+# unchanged payload is answered with a 304 and not parsed or extracted again.
+# 0 disables conditional fetching (see app/payload_cache.py).
+PAYLOAD_CACHE_MAX_USERS = int(os.getenv("PAYLOAD_CACHE_MAX_USERS", "2000"))
+
+# Wire format requested from the Integrations Service data endpoints: "json" (default)
+# or "columnar" for the compact binary encoding decoded straight into NumPy arrays.
+INTEGRATIONS_WIRE_FORMAT = os.getenv("INTEGRATIONS_WIRE_FORMAT", "json").lower()
+
+# Per-user action cooldowns (windows are set per ACTION_MAPPING entry below)
+ACTION_COOLDOWN_ENABLED = os.getenv("ACTION_COOLDOWN_ENABLED", "true").lower() == "true"
+ACTION_COOLDOWN_MAX_ENTRIES = int(os.getenv("ACTION_COOLDOWN_MAX_ENTRIES", "100000"))
+
+# How recommended actions are executed: "http" posts to the Actions Service (split
+# deployment); "inprocess" imports the Actions dispatch library into this process.
+# With INTEGRATIONS_DISPATCH_MODE=inprocess the Integrations handlers are loaded too.
+ACTIONS_DISPATCH_MODE = os.getenv("ACTIONS_DISPATCH_MODE", "http").lower()
+INTEGRATIONS_DISPATCH_MODE = os.getenv("INTEGRATIONS_DISPATCH_MODE", "http").lower()
+ACTIONS_LIBRARY_PATH = os.getenv("ACTIONS_LIBRARY_PATH")
+INTEGRATIONS_SERVICE_DIR = os.getenv("INTEGRATIONS_SERVICE_DIR")
+
+# Background scoring of registered users. /recommend serves the precomputed result
+# while it is younger than SCORING_FRESHNESS_SECONDS and scores synchronously otherwise.
+# Change notifications (POST /api/v1/scoring/notify) trigger an early rescoring.
+SCORING_SCHEDULER_ENABLED = os.getenv("SCORING_SCHEDULER_ENABLED", "true").lower() == "true"
+SCORING_INTERVAL_SECONDS = float(os.getenv("SCORING_INTERVAL_SECONDS", "900"))
+SCORING_JITTER_FRACTION = float(os.getenv("SCORING_JITTER_FRACTION", "0.1"))
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "4"))
+SCORING_FRESHNESS_SECONDS = float(os.getenv("SCORING_FRESHNESS_SECONDS", "1200"))
+SCORING_NOTIFY_DEBOUNCE_SECONDS = float(os.getenv("SCORING_NOTIFY_DEBOUNCE_SECONDS", "5"))
+SCORING_MAX_USERS = int(os.getenv("SCORING_MAX_USERS", "10000"))
+# Shared secret expected in the X-Webhook-Secret header of change notifications (unset: not checked)
+SCORING_WEBHOOK_SECRET = os.getenv("SCORING_WEBHOOK_SECRET")
+
+# Admission control (see app/nlp_admission.py): past the NLP queue depth or p90
+# latency thresholds, urgency detection falls back to keywords; past the
+# in-flight limit, /recommend answers 503 with Retry-After
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+NLP_CONCURRENCY = int(os.getenv("NLP_CONCURRENCY", "2"))
+NLP_DEGRADE_QUEUE_DEPTH = int(os.getenv("NLP_DEGRADE_QUEUE_DEPTH", "4"))
+NLP_DEGRADE_LATENCY_MS = float(os.getenv("NLP_DEGRADE_LATENCY_MS", "1500"))
+NLP_LATENCY_WINDOW_SECONDS = float(os.getenv("NLP_LATENCY_WINDOW_SECONDS", "30"))
+
+# Email urgency input: "gmail" classifies only the inbox messages added since the
+# last sync (Integrations /api/v1/data/emails/sync) and keeps a rolling urgency
+# state per user; "calendar" is the old calendar-description keyword scan
+EMAIL_URGENCY_SOURCE = os.getenv("EMAIL_URGENCY_SOURCE", "gmail").lower()
+EMAIL_URGENCY_WINDOW_SECONDS = float(os.getenv("EMAIL_URGENCY_WINDOW_SECONDS", "86400"))
+EMAIL_URGENCY_MAX_USERS = int(os.getenv("EMAIL_URGENCY_MAX_USERS", "10000"))
+
+# Shadow scoring (see app/shadow_scoring.py): comma-separated candidate models,
+# each "path" or "name=path". Empty disables shadow scoring.
+SHADOW_MODEL_PATHS = os.getenv("SHADOW_MODEL_PATHS", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_LOG_PATH = os.getenv("SHADOW_LOG_PATH", "shadow_scoring.jsonl")
+SHADOW_LOG_MAX_BYTES = int(os.getenv("SHADOW_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SHADOW_LOG_BACKUPS = int(os.getenv("SHADOW_LOG_BACKUPS", "5"))
+
 # --- Model Loading ---
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -68,26 +209,131 @@ class _RenameUnpickler(pickle.Unpickler):
             return RuntimeDecisionEngine
         return super().find_class(module, name)
 
+def load_decision_engine(path: str) -> Any:
+    """
+    Unpickles a Decision Engine saved from the training notebook.
+    """
+    with open(path, 'rb') as f:
+        return _RenameUnpickler(f).load()
+
 DECISION_ENGINE = None
 try:
     # Ensure the model directory exists
     os.makedirs(os.path.dirname(MODEL_FILE), exist_ok=True)
 
-    with open(MODEL_FILE, 'rb') as f:
-        DECISION_ENGINE = _RenameUnpickler(f).load()
+    DECISION_ENGINE = load_decision_engine(MODEL_FILE)
     print(f"Successfully loaded Decision Engine via remapped unpickler: {MODEL_FILE}")
 except FileNotFoundError:
     print(f"Model file not found at {MODEL_FILE}. NOT creating fallback. Please ensure the model exists.")
 except Exception as e:
     print(f"Error loading ML model via remapped unpickler: {e}. NOT creating fallback.")
 
+def load_shadow_candidates(spec: str) -> Dict[str, Any]:
+    """
+    Loads the candidate models listed in SHADOW_MODEL_PATHS. Candidates that fail to load are skipped.
+    """
+    candidates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, path = entry.rpartition("=")
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        try:
+            candidates[name] = load_decision_engine(path)
+            print(f"Loaded shadow candidate '{name}': {path}")
+        except Exception as e:
+            print(f"Error loading shadow candidate '{name}' from {path}: {e}. Skipping it.")
+    return candidates
+
+# Request tracing: a trace starts at each incoming request and its context is
+# propagated to the Actions and Integrations services (see app/tracing.py)
+tracer = Tracer("assistant")
+# On-demand CPU/memory profiling and slow-request capture under /admin/profiling (see app/profiling.py)
+profiler = Profiler("assistant")
+# Event-loop lag and the endpoints that block the loop, under /admin/event-loop (see app/loop_monitor.py)
+loop_monitor = EventLoopMonitor(LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS, LOOP_MONITOR_MAX_OFFENDERS)
+
+# Created on startup and closed on shutdown
+action_transport: Optional[ActionTransport] = None
+# Forwards user-scoped requests to the replica that owns the user; its client lives with the app
+shard_router = ShardRouter(
+    ASSISTANT_SHARD_NODES,
+    ASSISTANT_SHARD_SELF,
+    vnodes=ASSISTANT_SHARD_VNODES,
+    forward_timeout=ASSISTANT_SHARD_FORWARD_TIMEOUT_SECONDS,
+    retry_seconds=ASSISTANT_SHARD_RETRY_SECONDS,
+    wrap_transport=lambda transport: TracingTransport(tracer, transport)
+)
+# Opened on startup (after a prefork), flushed on shutdown
+feature_history: Optional[FeatureHistoryStore] = None
+prediction_store: Optional[PredictionStore] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the action transport, feature history and prediction store and runs the background
+    scoring scheduler for the lifetime of the app.
+    """
+    global action_transport, feature_history, prediction_store
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if PREDICTION_STORE_ENABLED:
+        prediction_store = PredictionStore(
+            PREDICTION_LOG_PATH,
+            high_stress_level=PREDICTION_HIGH_STRESS_LEVEL,
+            hourly_buckets=PREDICTION_ROLLUP_HOURS,
+            daily_buckets=PREDICTION_ROLLUP_DAYS
+        )
+    if FEATURE_HISTORY_ENABLED:
+        worker_index = os.getenv("ASSISTANT_WORKER_INDEX")
+        feature_history = FeatureHistoryStore(
+            os.path.join(FEATURE_HISTORY_DIR, f"worker-{worker_index}") if worker_index else FEATURE_HISTORY_DIR,
+            max_users=FEATURE_HISTORY_MAX_USERS
+        )
+    action_transport = create_action_transport(
+        ACTIONS_DISPATCH_MODE,
+        ACTIONS_SERVICE_URL,
+        INTEGRATIONS_SERVICE_URL,
+        integrations_mode=INTEGRATIONS_DISPATCH_MODE,
+        actions_library_path=ACTIONS_LIBRARY_PATH,
+        integrations_service_dir=INTEGRATIONS_SERVICE_DIR,
+        wrap_transport=lambda transport: TracingTransport(tracer, transport)
+    )
+    await action_transport.start()
+    print(f"Action dispatch mode: {action_transport.mode}")
+    await shard_router.start()
+    if shard_router.enabled:
+        print(f"Sharding over {len(shard_router.ring.nodes)} replicas (this one: {shard_router.self_node or 'router only'})")
+    if SCORING_SCHEDULER_ENABLED:
+        await scoring_scheduler.start()
+    try:
+        yield
+    finally:
+        if SCORING_SCHEDULER_ENABLED:
+            await scoring_scheduler.stop()
+        await action_transport.close()
+        action_transport = None
+        await shard_router.close()
+        if feature_history is not None:
+            feature_history.flush()
+        if prediction_store is not None:
+            prediction_store.close()
+            prediction_store = None
+        loop_monitor.stop()
+
 app = FastAPI(
     title="Harmonia Assistant Service",
     description="AI-powered holistic assistant that analyzes user data and provides personalized wellness recommendations",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
+# Innermost, so forwarded requests are traced and keep the caller's deadline header
+app.add_middleware(ShardRoutingMiddleware, router=shard_router)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.include_router(create_profiling_router(profiler))
+app.include_router(create_loop_monitor_router(loop_monitor))
 
 # --- Pydantic Models for Request/Response Validation ---
 
@@ -97,6 +343,8 @@ class RecommendationRequest(BaseModel):
     """
     user_token: str
     user_id: Optional[str] = None
+    # Team the user's predictions are rolled up under (remembered for later requests)
+    team: Optional[str] = None
     context: Optional[Dict[str, Any]] = {}
     
     @validator('user_token')
@@ -139,6 +387,13 @@ class RecommendationResponse(BaseModel):
     action_details: ActionDetails
     features_used: FeatureData
     action_service_response: Dict[str, Any]
+    action_suppressed: bool = False
+    precomputed: bool = False
+    # Rolling 1d/7d/30d per-day averages from the user's feature history
+    feature_trends: Optional[Dict[str, Dict[str, Any]]] = None
+    # none (DistilBERT ran), nlp_unavailable or nlp_shed (keyword fallback under load),
+    # email_sync_failed (the previous urgency state was used)
+    degradation_mode: str = "none"
     timestamp: str
 
 class HealthResponse(BaseModel):
@@ -158,9 +413,30 @@ class ErrorResponse(BaseModel):
     error_code: Optional[str] = None
     timestamp: str
 
+class ScoringRegistrationRequest(BaseModel):
+    """
+    Registers a user for background scoring.
+    """
+    user_token: str
+    user_id: Optional[str] = None
+    team: Optional[str] = None
+    interval_seconds: Optional[float] = Field(None, gt=0)
+
+class ChangeNotification(BaseModel):
+    """
+    Tells the scheduler that a user's calendar or fitness data changed.
+    Identify the user either by user_key (as returned on registration) or user_id.
+    """
+    user_key: Optional[str] = None
+    user_id: Optional[str] = None
+    source: str = "calendar"
+
 # --- Action Mapping ---
 # Maps ML model predictions to valid Actions Service payloads
 # Based on your decision engine's stress level predictions (0-10 scale)
+# cooldown_seconds: the same action type is not re-sent to a user within this window
+# (the previous Actions Service response is returned instead). Higher stress levels
+# use shorter windows so urgent interventions are not held back for long.
 ACTION_MAPPING = {
     # Stress Level 0-2: Low stress, positive reinforcement
     0: {
@@ -169,6 +445,7 @@ ACTION_MAPPING = {
             "message": "🌟 You're in a great flow state! Keep up the excellent work.",
             "channel": "#team-harmonia"
         },
+        "cooldown_seconds": 14400,
     },
     1: {
         "action": "send_slack_notification", 
@@ -176,6 +453,7 @@ ACTION_MAPPING = {
             "message": "💪 Great energy levels! Stay focused and productive.",
             "channel": "#team-harmonia"
         },
+        "cooldown_seconds": 14400,
     },
     2: {
         "action": "send_slack_notification",
@@ -183,6 +461,7 @@ ACTION_MAPPING = {
             "message": "✨ You're doing well! Remember to stay hydrated.",
             "channel": "#team-harmonia"
         },
+        "cooldown_seconds": 14400,
     },
     
     # Stress Level 3-4: Mild stress, gentle suggestions
@@ -193,6 +472,7 @@ ACTION_MAPPING = {
             "duration": 10,
             "description": "AI suggests: Take a short breather to maintain your energy"
         },
+        "cooldown_seconds": 3600,
     },
     4: {
         "action": "create_break_event",
@@ -201,6 +481,7 @@ ACTION_MAPPING = {
             "duration": 15,
             "description": "AI suggests: Time for a quick stretch and some deep breaths"
         },
+        "cooldown_seconds": 3600,
     },
     
     # Stress Level 5-6: Moderate stress, more active interventions
@@ -211,6 +492,7 @@ ACTION_MAPPING = {
             "duration": 20,
             "description": "AI suggests: Take time for meditation or a short walk"
         },
+        "cooldown_seconds": 2700,
     },
     6: {
         "action": "send_slack_notification",
@@ -218,6 +500,7 @@ ACTION_MAPPING = {
             "message": "🧘‍♀️ Consider taking a longer break to recharge. Your wellbeing matters!",
             "channel": "#team-harmonia"
         },
+        "cooldown_seconds": 7200,
     },
     
     # Stress Level 7-8: High stress, strong recommendations
@@ -228,6 +511,7 @@ ACTION_MAPPING = {
             "duration": 30,
             "description": "AI Alert: High stress detected. Time for a proper break and reset."
         },
+        "cooldown_seconds": 1800,
     },
     8: {
         "action": "send_slack_notification",
@@ -235,6 +519,7 @@ ACTION_MAPPING = {
             "message": "⚠️ High stress levels detected. Please prioritize your wellbeing and consider delegating tasks.",
             "channel": "#team-harmonia"
         },
+        "cooldown_seconds": 3600,
     },
     
     # Stress Level 9-10: Very high stress, urgent interventions
@@ -245,6 +530,7 @@ ACTION_MAPPING = {
             "duration": 60,
             "description": "AI ALERT: Critical stress levels. Please step away and focus on self-care."
         },
+        "cooldown_seconds": 900,
     },
     10: {
         "action": "draft_email",
@@ -253,27 +539,88 @@ ACTION_MAPPING = {
             "subject": "Wellness Check - High Stress Alert",
             "body": "AI Health Assistant Alert: High stress levels detected. May need support or workload adjustment. Please prioritize wellbeing."
         },
+        "cooldown_seconds": 3600,
     }
 }
 
+action_cooldowns = ActionCooldownIndex(
+    max_entries=ACTION_COOLDOWN_MAX_ENTRIES,
+    max_age_seconds=max(entry["cooldown_seconds"] for entry in ACTION_MAPPING.values())
+)
+
+async def dispatch_recommended_action(
+    user_key: str,
+    stress_level: int,
+    action_payload: Dict[str, Any],
+    user_token: str,
+    headers: Dict[str, str]
+) -> tuple:
+    """
+    Sends the mapped action through the configured action transport unless the same
+    action type was sent to this user, for the same or a higher stress level, within
+    the entry's cooldown window. A suppressed result carries the details and response
+    of the action that was dispatched.
+    Returns (action_request, action_service_response, suppressed).
+    """
+    action_request = {
+        "action": action_payload["action"],
+        "details": dict(action_payload["details"]),
+        "user_token": user_token
+    }
+    
+    if ACTION_COOLDOWN_ENABLED:
+        previous = action_cooldowns.lookup(
+            user_key, action_request["action"], stress_level, action_payload.get("cooldown_seconds", 0)
+        )
+        if previous is not None:
+            details, response_body = previous
+            return {**action_request, "details": dict(details)}, response_body, True
+    
+    # Dispatch the action (over HTTP to the Actions Service, or in-process)
+    with tracer.span("action.dispatch", kind="client", action=action_request["action"], mode=action_transport.mode):
+        response_body = await action_transport.execute_action(action_request, inject({**headers, **deadline_headers()}))
+    
+    if ACTION_COOLDOWN_ENABLED:
+        action_cooldowns.record(user_key, action_request["action"], stress_level, action_request["details"], response_body)
+    return action_request, response_body, False
+
 # --- Feature Engineering Functions ---
-def extract_features_from_raw_data(raw_user_data: Dict[str, Any], user_token: str) -> Dict[str, float]:
+def extract_features_from_raw_data(
+    raw_user_data: Union[Dict[str, Any], ColumnarPayload],
+    user_token: str,
+    calendar_features: Optional[CalendarFeatureAccumulator] = None,
+    urgent_emails_flag: Optional[float] = None
+) -> Dict[str, float]:
     """
     Transform raw API data into the 5 features required by the ML model:
     Sleep_Duration, Calendar_Busy_Hours, HeartRate_Avg, Steps_Last_24h, Urgent_Emails_Flag
-    """
-    calendar_events = raw_user_data.get('calendar_events', [])
-    heart_rate_data = raw_user_data.get('heart_rate_data', [])
     
+    raw_user_data is either the JSON aggregate payload or a decoded ColumnarPayload.
+    If calendar_features is given (already accumulated from the calendar stream),
+    it is used instead of the calendar events in raw_user_data.
+    If urgent_emails_flag is given, the emails are not fetched and classified again.
+    """
     # Calculate features
-    calendar_busy_hours = calculate_calendar_busy_hours(calendar_events)
-    heart_rate_avg = calculate_heart_rate_average(heart_rate_data)
-    sleep_duration = estimate_sleep_duration(calendar_events)  # Estimate from calendar patterns
-    steps_last_24h = extract_steps_from_fitness_data(heart_rate_data)  # Estimate from available data
+    if isinstance(raw_user_data, ColumnarPayload):
+        heart_rate_avg = columnar_decoding.heart_rate_average(raw_user_data)
+        if calendar_features is None:
+            calendar_busy_hours = columnar_decoding.busy_hours(raw_user_data)
+            sleep_duration = columnar_decoding.sleep_duration(raw_user_data)
+    else:
+        heart_rate_avg = calculate_heart_rate_average(raw_user_data.get('heart_rate_data', []))
+        if calendar_features is None:
+            calendar_events = raw_user_data.get('calendar_events', [])
+            calendar_busy_hours = calculate_calendar_busy_hours(calendar_events)
+            sleep_duration = estimate_sleep_duration(calendar_events)  # Estimate from calendar patterns
+    if calendar_features is not None:
+        calendar_busy_hours = calendar_features.busy_hours()
+        sleep_duration = calendar_features.sleep_duration()
+    steps_last_24h = estimate_steps_from_heart_rate(heart_rate_avg)  # Estimate from available data
     
     # NLP-based urgency detection
-    emails = fetch_emails_for_urgency_analysis(user_token)
-    urgent_emails_flag = analyze_email_urgency(emails)
+    if urgent_emails_flag is None:
+        emails = fetch_emails_for_urgency_analysis(user_token)
+        urgent_emails_flag = analyze_email_urgency(emails)
     
     return {
         "Sleep_Duration": sleep_duration,
@@ -290,36 +637,11 @@ def calculate_calendar_busy_hours(calendar_events: List[Dict]) -> float:
     if not calendar_events:
         return 0.0
     
-    total_busy_minutes = 0
-    now = datetime.now(timezone.utc)
-    yesterday = now - timedelta(hours=24)
-    
+    accumulator = CalendarFeatureAccumulator()
     for event in calendar_events:
-        try:
-            # Parse event times
-            start_time = None
-            end_time = None
-            
-            if 'start' in event:
-                start_str = event['start'].get('dateTime') or event['start'].get('date')
-                if start_str:
-                    start_time = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-            
-            if 'end' in event:
-                end_str = event['end'].get('dateTime') or event['end'].get('date')
-                if end_str:
-                    end_time = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-            
-            # Calculate duration if both times are available and within last 24h
-            if start_time and end_time and start_time >= yesterday:
-                duration_minutes = (end_time - start_time).total_seconds() / 60
-                total_busy_minutes += max(0, duration_minutes)
-                
-        except (ValueError, KeyError) as e:
-            # Skip events with invalid time formats
-            continue
+        accumulator.add(event)
     
-    return round(total_busy_minutes / 60, 2)  # Convert to hours
+    return accumulator.busy_hours()
 
 def calculate_heart_rate_average(heart_rate_data: List[Dict]) -> float:
     """
@@ -356,35 +678,12 @@ def estimate_sleep_duration(calendar_events: List[Dict]) -> float:
         return 7.0  # Default 7 hours
     
     # Look for patterns in calendar events to estimate sleep
-    # Find the longest gap between events during typical sleep hours (10 PM - 8 AM)
-    gaps = []
-    now = datetime.now(timezone.utc)
-    
-    # Sort events by start time
-    sorted_events = []
+    # Find the longest gap between consecutive timed events
+    accumulator = CalendarFeatureAccumulator()
     for event in calendar_events:
-        try:
-            if 'start' in event:
-                start_str = event['start'].get('dateTime')
-                if start_str:
-                    start_time = datetime.fromisoformat(start_str.replace('Z', '+00:00'))
-                    sorted_events.append(start_time)
-        except (ValueError, KeyError):
-            continue
-    
-    sorted_events.sort()
+        accumulator.add(event)
     
-    # Calculate gaps between consecutive events
-    for i in range(1, len(sorted_events)):
-        gap_hours = (sorted_events[i] - sorted_events[i-1]).total_seconds() / 3600
-        # Consider gaps between 6-12 hours as potential sleep periods
-        if 6 <= gap_hours <= 12:
-            gaps.append(gap_hours)
-    
-    if gaps:
-        return round(max(gaps), 1)  # Return the longest reasonable gap
-    else:
-        return 7.0  # Default
+    return accumulator.sleep_duration()
 
 def extract_steps_from_fitness_data(heart_rate_data: List[Dict]) -> float:
     """
@@ -392,9 +691,13 @@ def extract_steps_from_fitness_data(heart_rate_data: List[Dict]) -> float:
     This is a placeholder - ideally we'd have dedicated step data.
     """
     # For now, estimate based on heart rate patterns
-    # Higher average heart rate might indicate more activity
-    avg_hr = calculate_heart_rate_average(heart_rate_data)
-    
+    return estimate_steps_from_heart_rate(calculate_heart_rate_average(heart_rate_data))
+
+def estimate_steps_from_heart_rate(avg_hr: float) -> float:
+    """
+    Map an average heart rate to an estimated daily step count.
+    Higher average heart rate might indicate more activity.
+    """
     # Simple heuristic: map heart rate to estimated steps
     if avg_hr > 80:
         return 8000.0  # Active day
@@ -403,9 +706,23 @@ def extract_steps_from_fitness_data(heart_rate_data: List[Dict]) -> float:
     else:
         return 2000.0  # Low activity
 
+# Pooled, hedged and circuit-broken client for every Integrations Service data call
+integrations_http = ResilientHttpClient(
+    "integrations",
+    INTEGRATIONS_SERVICE_URL,
+    CircuitBreaker(
+        "integrations",
+        failure_threshold=INTEGRATIONS_BREAKER_FAILURES,
+        reset_timeout=INTEGRATIONS_BREAKER_RESET_SECONDS
+    ),
+    hedge_percentile=INTEGRATIONS_HEDGE_PERCENTILE,
+    hedge_max_ratio=INTEGRATIONS_HEDGE_MAX_RATIO
+)
+
 def fetch_emails_for_urgency_analysis(user_token: str) -> List[str]:
     """
-    Fetch recent emails from Gmail API for urgency analysis.
+    Legacy email source (EMAIL_URGENCY_SOURCE=calendar): scans calendar event
+    descriptions for email-like content instead of reading the inbox.
     Returns a list of email text (subject + body) for NLP processing.
     """
     try:
@@ -413,12 +730,14 @@ def fetch_emails_for_urgency_analysis(user_token: str) -> List[str]:
         
         # For now, we'll extract email information from calendar events
         # In a full implementation, you'd call Gmail API directly
-        response = requests.get(
-            f"{INTEGRATIONS_SERVICE_URL}/api/v1/data/calendar",
-            headers=headers,
-            timeout=10
-        )
-        response.raise_for_status()
+        with tracer.span("integrations.calendar", kind="client"):
+            response = integrations_http.get(
+                "/api/v1/data/calendar",
+                headers=inject(headers),
+                timeout=INTEGRATIONS_TIMEOUT_SECONDS,
+                hedge=INTEGRATIONS_HEDGE_ENABLED
+            )
+            response.raise_for_status()
         calendar_data = response.json()
         
         emails = []
@@ -439,6 +758,87 @@ def fetch_emails_for_urgency_analysis(user_token: str) -> List[str]:
         print(f"Error fetching emails: {e}")
         return []
 
+def sync_new_emails(user_token: str, since_history_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Fetches the inbox messages (subject and snippet) added since `since_history_id`,
+    or the most recent ones when there is no history id yet.
+    """
+    params = {"start_history_id": since_history_id} if since_history_id else {"full": "true"}
+    with tracer.span("integrations.emails_sync", kind="client", full_sync=since_history_id is None) as span:
+        # Not hedged: a sync advances the user's watermark in the Integrations Service
+        response = integrations_http.get(
+            "/api/v1/data/emails/sync",
+            params=params,
+            headers=inject({"Authorization": f"Bearer {user_token}"}),
+            timeout=INTEGRATIONS_TIMEOUT_SECONDS,
+            hedge=False
+        )
+        response.raise_for_status()
+        sync = response.json()
+        span.set_attribute("messages", len(sync.get("messages", [])))
+    return sync
+
+email_urgency = EmailUrgencyTracker(
+    window_seconds=EMAIL_URGENCY_WINDOW_SECONDS,
+    max_users=EMAIL_URGENCY_MAX_USERS
+)
+
+# The DistilBERT tokenizer/model pair, loaded once per process (or once in the
+# prefork master, before the workers are forked; see app/prefork.py)
+NLP_MODEL_PATH = os.path.join(SCRIPT_DIR, "ml_models", "nlp_email_model")
+_nlp_model: Optional[Tuple[Any, Any]] = None
+_nlp_model_lock = threading.Lock()
+
+def load_nlp_model() -> Tuple[Any, Any]:
+    """
+    Returns the cached (tokenizer, model) pair, loading it from NLP_MODEL_PATH on first use.
+    """
+    global _nlp_model
+    if _nlp_model is None:
+        with _nlp_model_lock:
+            if _nlp_model is None:
+                with tracer.span("model.nlp_load"):
+                    tokenizer = _AutoTokenizer.from_pretrained(NLP_MODEL_PATH)
+                    model = _AutoModelForSequenceClassification.from_pretrained(NLP_MODEL_PATH)
+                    model.eval()
+                _nlp_model = (tokenizer, model)
+    return _nlp_model
+
+def nlp_model_available() -> bool:
+    return (
+        TRANSFORMERS_AVAILABLE and _torch is not None and _AutoTokenizer is not None
+        and _AutoModelForSequenceClassification is not None and os.path.exists(NLP_MODEL_PATH)
+    )
+
+def preload_models():
+    """
+    Loads every model up front instead of on the first request.
+    The Decision Engine is already loaded at import time; this adds the NLP model if available.
+    """
+    if nlp_model_available():
+        load_nlp_model()
+        print(f"Preloaded NLP model: {NLP_MODEL_PATH}")
+
+def classify_emails_nlp(emails: List[str]) -> List[bool]:
+    """
+    Classifies each email with the trained DistilBERT model in one batched forward pass.
+    Returns True for emails predicted urgent with high confidence.
+    """
+    tokenizer, model = load_nlp_model()
+    with tracer.span("model.nlp_urgency", emails=len(emails)) as span:
+        inputs = tokenizer(emails,
+                           padding=True,
+                           truncation=True,
+                           max_length=512,
+                           return_tensors="pt")
+        with _torch.no_grad():
+            outputs = model(**inputs)
+            predictions = _torch.nn.functional.softmax(outputs.logits, dim=-1)
+        # Assuming label 1 is "urgent" (based on training); high confidence threshold
+        urgent = [probability > 0.7 for probability in predictions[:, 1].tolist()]
+        span.set_attribute("urgent_count", sum(urgent))
+    return urgent
+
 def analyze_email_urgency(emails: List[str]) -> float:
     """
     Use the trained DistilBERT model to analyze email urgency.
@@ -448,63 +848,555 @@ def analyze_email_urgency(emails: List[str]) -> float:
         return analyze_email_urgency_keywords(emails)
     
     try:
-        # Load the trained NLP model
-        model_path = os.path.join(SCRIPT_DIR, "ml_models", "nlp_email_model")
-        
-        # Check if model exists
-        if not os.path.exists(model_path):
-            print(f"Warning: NLP model not found at {model_path}. Using keyword-based urgency detection.")
+        # Check if the trained NLP model exists
+        if not os.path.exists(NLP_MODEL_PATH):
+            print(f"Warning: NLP model not found at {NLP_MODEL_PATH}. Using keyword-based urgency detection.")
             return analyze_email_urgency_keywords(emails)
         
         if _AutoTokenizer is None or _AutoModelForSequenceClassification is None:
             print("Warning: Transformers not available. Using keyword-based urgency detection.")
             return analyze_email_urgency_keywords(emails)
-            
-        tokenizer = _AutoTokenizer.from_pretrained(model_path)
-        model = _AutoModelForSequenceClassification.from_pretrained(model_path)
-        
-        urgent_count = 0
-        total_emails = len(emails)
-        
-        for email_text in emails:
-            # Tokenize and predict
-            inputs = tokenizer(email_text, 
-                             padding=True, 
-                             truncation=True, 
-                             max_length=512,
-                             return_tensors="pt")
-            
-            with _torch.no_grad():
-                outputs = model(**inputs)
-                predictions = _torch.nn.functional.softmax(outputs.logits, dim=-1)
-                
-                # Assuming label 1 is "urgent" (based on training)
-                if predictions[0][1].item() > 0.7:  # High confidence threshold
-                    urgent_count += 1
         
         # Return 1.0 if any urgent emails found, 0.0 otherwise
-        return 1.0 if urgent_count > 0 else 0.0
+        return 1.0 if any(classify_emails_nlp(emails)) else 0.0
         
     except Exception as e:
         print(f"Error in NLP urgency analysis: {e}")
         # Fallback to keyword-based detection
         return analyze_email_urgency_keywords(emails)
 
+nlp_admission = NlpAdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    nlp_concurrency=NLP_CONCURRENCY,
+    degrade_queue_depth=NLP_DEGRADE_QUEUE_DEPTH,
+    degrade_latency_ms=NLP_DEGRADE_LATENCY_MS,
+    latency_window_seconds=NLP_LATENCY_WINDOW_SECONDS,
+    retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS
+)
+
+def classify_email_urgency(emails: List[str]) -> Tuple[List[bool], str]:
+    """
+    Per-email urgency plus the degradation mode used to compute it.
+    The DistilBERT stage only runs when the admission controller grants a slot;
+    under load the keyword fallback is used instead ("nlp_shed").
+    """
+    if not emails:
+        return [], "none"
+    if not nlp_model_available():
+        return classify_emails_keywords(emails), "nlp_unavailable"
+    with nlp_admission.nlp_stage() as admitted:
+        if not admitted:
+            return classify_emails_keywords(emails), "nlp_shed"
+        try:
+            return classify_emails_nlp(emails), "none"
+        except Exception as e:
+            print(f"Error in NLP urgency analysis: {e}")
+            return classify_emails_keywords(emails), "nlp_unavailable"
+
+def assess_email_urgency(emails: List[str]) -> Tuple[float, str]:
+    """
+    Urgent-email flag (1.0 if any email is urgent) plus the degradation mode used to compute it.
+    """
+    urgent, degradation_mode = classify_email_urgency(emails)
+    return (1.0 if any(urgent) else 0.0), degradation_mode
+
+URGENCY_KEYWORDS = [
+    'urgent', 'asap', 'immediately', 'important', 'priority',
+    'deadline', 'critical', 'emergency', 'attention', 'action required'
+]
+
+def classify_emails_keywords(emails: List[str]) -> List[bool]:
+    """
+    Keyword-based urgency per email.
+    """
+    return [any(keyword in email.lower() for keyword in URGENCY_KEYWORDS) for email in emails]
+
 def analyze_email_urgency_keywords(emails: List[str]) -> float:
     """
     Fallback keyword-based urgency detection.
     """
-    urgency_keywords = [
-        'urgent', 'asap', 'immediately', 'important', 'priority',
-        'deadline', 'critical', 'emergency', 'attention', 'action required'
+    return 1.0 if any(classify_emails_keywords(emails)) else 0.0
+
+def update_email_urgency(user_key: str, user_token: str) -> Tuple[float, str]:
+    """
+    Classifies only the messages received since the user's last sync and returns the
+    rolling Urgent_Emails_Flag plus the degradation mode of the classification.
+    """
+    if EMAIL_URGENCY_SOURCE == "calendar":
+        return assess_email_urgency(fetch_emails_for_urgency_analysis(user_token))
+
+    try:
+        sync = sync_new_emails(user_token, email_urgency.history_id(user_key))
+    except requests.exceptions.RequestException as e:
+        print(f"Error syncing emails: {e}")
+        return email_urgency.urgent_flag(user_key), "email_sync_failed"
+
+    messages = sync.get("messages", [])
+    urgent, degradation_mode = classify_email_urgency(
+        [f"SUBJECT: {message['subject']} BODY: {message['snippet']}" for message in messages]
+    )
+    email_urgency.update(
+        user_key,
+        sync["history_id"],
+        [(message["id"], message["internal_date"], flag) for message, flag in zip(messages, urgent)],
+        full_sync=sync.get("full_sync", False)
+    )
+    if feature_history is not None:
+        record_urgent_email_history(user_key, messages, urgent, full_sync=sync.get("full_sync", False))
+    return email_urgency.urgent_flag(user_key), degradation_mode
+
+def heart_rate_series(heart_rate_data: List[Dict]) -> Tuple[List[float], List[float]]:
+    """
+    (sample times in Unix seconds, values) of Google Fit heart-rate points.
+    """
+    times, values = [], []
+    for data_point in heart_rate_data:
+        try:
+            timestamp = int(data_point['startTimeNanos']) / 1e9
+            for value in data_point.get('value', []):
+                if 'fpVal' in value:
+                    times.append(timestamp)
+                    values.append(value['fpVal'])
+                elif 'intVal' in value:
+                    times.append(timestamp)
+                    values.append(float(value['intVal']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return times, values
+
+def record_feature_history(
+    user_key: str,
+    raw_user_data: Optional[Union[Dict[str, Any], ColumnarPayload]],
+    calendar_features: Optional[CalendarFeatureAccumulator]
+):
+    """
+    Writes the hourly aggregates of the data fetched for this scoring to the user's history:
+    heart rate and estimated steps for the last 24 hours, and booked minutes for the hours
+    the calendar fetch covers (from now on; earlier hours keep what was recorded then).
+    raw_user_data is None when the aggregate was unchanged (already recorded); then only
+    the streamed calendar is recorded.
+    """
+    now_hour = hour_of(time.time())
+
+    hourly = {}
+    if raw_user_data is not None:
+        if isinstance(raw_user_data, ColumnarPayload):
+            hr_times = raw_user_data.column("hr_time_ns") / 1e9
+            hr_values = raw_user_data.column("hr_value")
+        else:
+            hr_times, hr_values = heart_rate_series(raw_user_data.get('heart_rate_data', []))
+        hourly = {
+            hour: {
+                "heart_rate": mean,
+                "steps": estimate_steps_from_heart_rate(mean) / 24 if mean is not None else None
+            }
+            for hour, mean in hourly_means(hr_times, hr_values, now_hour - 23, now_hour).items()
+        }
+
+    if calendar_features is not None:
+        intervals = calendar_features.intervals
+        horizon = now_hour + CALENDAR_STREAM_HOURS - 1
+    else:
+        if isinstance(raw_user_data, ColumnarPayload):
+            intervals = list(zip(raw_user_data.column("event_start"), raw_user_data.column("event_end")))
+        else:
+            accumulator = CalendarFeatureAccumulator()
+            for event in raw_user_data.get('calendar_events', []):
+                accumulator.add(event)
+            intervals = accumulator.intervals
+        # The aggregate payload holds only the next few events: cover the hours up to the last one
+        ends = [end for _, end in intervals if end == end]
+        horizon = hour_of(max(ends)) if ends else now_hour
+    # The ring only has room for LOOKAHEAD_HOURS of future hours
+    horizon = min(horizon, now_hour + LOOKAHEAD_HOURS)
+    starts = [start for start, _ in intervals]
+    ends = [end for _, end in intervals]
+    for hour, minutes in hourly_busy_minutes(starts, ends, now_hour, horizon).items():
+        hourly.setdefault(hour, {})["busy_minutes"] = minutes
+
+    feature_history.record(user_key, hourly)
+
+def record_urgent_email_history(user_key: str, messages: List[Dict[str, Any]], urgent: List[bool], full_sync: bool):
+    """
+    Adds newly received urgent messages to the user's hourly history.
+    A full sync re-delivers recent mail, so messages older than the last update are skipped then.
+    """
+    since = feature_history.last_updated(user_key) if full_sync else None
+    hourly: Dict[int, Dict[str, Optional[float]]] = {}
+    for message, is_urgent in zip(messages, urgent):
+        received = message["internal_date"] / 1000
+        if not is_urgent or (since is not None and received <= since):
+            continue
+        counts = hourly.setdefault(hour_of(received), {"urgent_emails": 0.0})
+        counts["urgent_emails"] += 1
+    feature_history.record(user_key, hourly, accumulate=["urgent_emails"])
+
+def predict_stress_level(model_input_data: Dict[str, float], user_token: str, engine: Any = None) -> int:
+    """
+    Runs the Decision Engine (or the given candidate engine) on the extracted features
+    and returns the stress level (0-10 scale).
+    Prefers the model's native predict; otherwise adapts to the notebook engine.
+    Raises HTTPException(503) if prediction fails.
+    """
+    if engine is None:
+        engine = DECISION_ENGINE
+
+    # Required features (matching the order used in training)
+    required_features = [
+        "Sleep_Duration", "Calendar_Busy_Hours", "HeartRate_Avg", 
+        "Steps_Last_24h", "Urgent_Emails_Flag"
     ]
+
+    # Create the DataFrame required by the scikit-learn model
+    features_df = pd.DataFrame([model_input_data], columns=required_features)
+
+    stress_level = None
+    try:
+        if hasattr(engine, 'predict') and callable(getattr(engine, 'predict')):
+            # Use predict if available
+            prediction = engine.predict(features_df)[0]
+            stress_level = int(prediction)
+        elif hasattr(engine, 'stress_model') and getattr(engine, 'stress_model') is not None:
+            # Prefer the model's own expected feature names if available
+            sm = engine.stress_model
+            if hasattr(sm, 'feature_names_in_'):
+                names = [str(n) for n in getattr(sm, 'feature_names_in_')]
+                # Build a flexible mapping from our current pipeline plus reasonable defaults
+                base_map = {
+                    'Sleep_Duration': float(model_input_data.get('Sleep_Duration', 7.0)),
+                    'Calendar_Busy_Hours': float(model_input_data.get('Calendar_Busy_Hours', 0.0)),
+                    'Heart_Rate': float(model_input_data.get('HeartRate_Avg', 70.0)),
+                    'Daily_Steps': float(model_input_data.get('Steps_Last_24h', 3000.0)),
+                    'Urgent_Emails_Flag': float(model_input_data.get('Urgent_Emails_Flag', 0.0)),
+                    # Defaults for likely notebook columns
+                    'BMI_Category': 2.0,
+                    'Systolic_BP': 120.0,
+                    'Age': 35.0,
+                    'Gender': 0.0,
+                    'Occupation': 0.0,
+                }
+                vector = [float(base_map.get(name, 0.0)) for name in names]
+                prediction = sm.predict([vector])[0]
+                stress_level = int(prediction)
+            elif hasattr(engine, 'feature_order'):
+                # Fallback to the engine's feature order if model doesn't expose names
+                feature_order = getattr(engine, 'feature_order')
+                mapped = {
+                    'Sleep_Duration': float(model_input_data.get('Sleep_Duration', 7.0)),
+                    'BMI_Category': 2.0,
+                    'Heart_Rate': float(model_input_data.get('HeartRate_Avg', 70.0)),
+                    'Daily_Steps': float(model_input_data.get('Steps_Last_24h', 3000.0)),
+                    'Systolic_BP': 120.0
+                }
+                vector = [float(mapped.get(k, 0.0)) for k in feature_order]
+                prediction = sm.predict([vector])[0]
+                stress_level = int(prediction)
+            else:
+                raise RuntimeError('stress_model lacks feature metadata')
+        elif callable(engine):
+            # Last resort: call engine(email_text, stress_features)
+            emails = fetch_emails_for_urgency_analysis(user_token)
+            email_text = emails[0] if emails else "SUBJECT: (none) BODY: (none)"
+            stress_features = {
+                'Sleep_Duration': float(model_input_data.get('Sleep_Duration', 7.0)),
+                'BMI_Category': 2.0,
+                'Heart_Rate': float(model_input_data.get('HeartRate_Avg', 70.0)),
+                'Daily_Steps': float(model_input_data.get('Steps_Last_24h', 3000.0)),
+                'Systolic_BP': 120.0
+            }
+            result_obj = engine(email_text, stress_features)
+            # Expect a dict with 'stress_level'
+            if not isinstance(result_obj, dict) or 'stress_level' not in result_obj:
+                raise RuntimeError('Engine returned invalid result payload')
+            stress_level = int(result_obj['stress_level'])
+        else:
+            raise RuntimeError('Loaded engine has no usable predict interface')
+    except Exception as pred_err:
+        raise HTTPException(status_code=503, detail=f"ML prediction failed: {pred_err}")
+    return stress_level
+
+shadow_scorer = ShadowScorer(
+    load_shadow_candidates(SHADOW_MODEL_PATHS),
+    lambda engine, features: predict_stress_level(features, "", engine),
+    sample_rate=SHADOW_SAMPLE_RATE,
+    log_path=SHADOW_LOG_PATH,
+    log_max_bytes=SHADOW_LOG_MAX_BYTES,
+    log_backups=SHADOW_LOG_BACKUPS
+)
+
+payload_cache = PayloadCache(max_users=PAYLOAD_CACHE_MAX_USERS)
+
+def fetch_user_data(
+    user_token: str,
+    user_key: Optional[str] = None
+) -> Tuple[Union[Dict[str, Any], ColumnarPayload], Optional[CalendarFeatureAccumulator]]:
+    """
+    Fetches the user's aggregate data and, when streaming is enabled, accumulates the calendar stream.
+    Returns (raw_user_data, calendar_features). Blocking.
+    With a user_key, the aggregate is fetched conditionally: if it has not changed since the
+    last fetch (304), the payload cached in payload_cache is returned instead.
+    """
+    headers = {"Authorization": f"Bearer {user_token}"}
     
-    for email in emails:
-        email_lower = email.lower()
-        if any(keyword in email_lower for keyword in urgency_keywords):
-            return 1.0
+    # Call the aggregate endpoint for all user data
+    data_headers = dict(headers)
+    if INTEGRATIONS_WIRE_FORMAT == "columnar":
+        data_headers["Accept"] = f"{COLUMNAR_MEDIA_TYPE}, application/json;q=0.5"
+    cached = payload_cache.get(user_key) if user_key and payload_cache.enabled else None
+    if cached is not None:
+        data_headers["If-None-Match"] = cached.etag
+    with tracer.span("integrations.aggregate", kind="client", wire_format=INTEGRATIONS_WIRE_FORMAT):
+        data_response = integrations_http.get(
+            "/api/v1/data/aggregate",
+            params={"include_calendar": "false"} if CALENDAR_STREAMING_ENABLED else None,
+            headers=inject(data_headers),
+            timeout=INTEGRATIONS_TIMEOUT_SECONDS,
+            hedge=INTEGRATIONS_HEDGE_ENABLED
+        )
+        data_response.raise_for_status()
+        if data_response.status_code == 304 and cached is not None:
+            payload_cache.not_modified()
+            raw_user_data = cached.raw_user_data
+        else:
+            if data_response.headers.get("content-type", "").startswith(COLUMNAR_MEDIA_TYPE):
+                raw_user_data = decode_columnar(data_response.content)
+            else:
+                raw_user_data = data_response.json()
+            if user_key and payload_cache.enabled:
+                payload_cache.store(user_key, data_response.headers.get("ETag"), raw_user_data)
+
+    # Calendar events are consumed page by page from the NDJSON stream
+    calendar_features = None
+    if CALENDAR_STREAMING_ENABLED:
+        with tracer.span("integrations.calendar_stream", kind="client"):
+            calendar_features = integrations_http.call(
+                lambda timeout: stream_calendar_features(
+                    INTEGRATIONS_SERVICE_URL, inject({**headers, **deadline_headers()}),
+                    timeout=timeout, hours=CALENDAR_STREAM_HOURS
+                ),
+                timeout=INTEGRATIONS_TIMEOUT_SECONDS
+            )
+    return raw_user_data, calendar_features
+
+def compute_features(
+    user_key: str,
+    user_token: str,
+    raw_user_data: Union[Dict[str, Any], ColumnarPayload],
+    calendar_features: Optional[CalendarFeatureAccumulator]
+) -> Tuple[Dict[str, float], str]:
+    """
+    Classifies new email, extracts the model features and records the feature history.
+    Returns (features, degradation_mode of the urgency stage). Blocking.
+    """
+    with tracer.span("features.extract") as span:
+        urgent_emails_flag, degradation_mode = update_email_urgency(user_key, user_token)
+        span.set_attribute("degradation_mode", degradation_mode)
+        # An unchanged payload (304) keeps the features extracted from it last time
+        model_input_data = payload_cache.features_for(user_key, raw_user_data)
+        span.set_attribute("payload_not_modified", model_input_data is not None)
+        if model_input_data is None:
+            model_input_data = extract_features_from_raw_data(
+                raw_user_data, user_token, calendar_features, urgent_emails_flag=urgent_emails_flag
+            )
+            payload_cache.set_features(user_key, raw_user_data, model_input_data)
+            if feature_history is not None:
+                record_feature_history(user_key, raw_user_data, calendar_features)
+        else:
+            model_input_data["Urgent_Emails_Flag"] = urgent_emails_flag
+            if calendar_features is not None:
+                model_input_data["Calendar_Busy_Hours"] = calendar_features.busy_hours()
+                model_input_data["Sleep_Duration"] = calendar_features.sleep_duration()
+                if feature_history is not None:
+                    record_feature_history(user_key, None, calendar_features)
+    return model_input_data, degradation_mode
+
+def run_prediction(model_input_data: Dict[str, float], user_token: str) -> int:
+    """
+    Predicts the stress level with the live Decision Engine and offers the sample to shadow scoring.
+    """
+    with tracer.span("model.predict") as span:
+        started = time.perf_counter()
+        stress_level = predict_stress_level(model_input_data, user_token)
+        live_latency_ms = (time.perf_counter() - started) * 1000
+        span.set_attribute("stress_level", stress_level)
+
+    # Candidate models score a sample of the same features in the background
+    if shadow_scorer.enabled:
+        span = current_span()
+        shadow_scorer.submit(model_input_data, stress_level, live_latency_ms, span.trace_id if span else None)
+    return stress_level
+
+def select_action_payload(stress_level: int) -> Dict[str, Any]:
+    """
+    Maps a stress level (0-10 scale from the trained model) to its ACTION_MAPPING entry.
+    """
+    action_payload = ACTION_MAPPING.get(stress_level)
     
-    return 0.0
+    if not action_payload:
+        # Default action for unexpected predictions
+        if stress_level <= 3:
+            action_payload = ACTION_MAPPING[0]  # Low stress default
+        elif stress_level <= 6:
+            action_payload = ACTION_MAPPING[5]  # Medium stress default  
+        else:
+            action_payload = ACTION_MAPPING[7]  # High stress default
+    return action_payload
+
+def assign_team(user_key: str, team: Optional[str], user_token: str):
+    """
+    Records the team a request names for the user, so their predictions roll up under it.
+    Only the token that first set the user's team can change it (403 otherwise).
+    """
+    if team and prediction_store is not None:
+        if not prediction_store.assign_team(user_key, team.strip(), token_digest(user_token)):
+            raise HTTPException(status_code=403, detail="The user's team was set with a different token.")
+
+async def score_user(user_token: str, user_id: Optional[str] = None) -> RecommendationResponse:
+    """
+    Runs the full scoring chain for one user: fetch -> features -> NLP -> predict -> dispatch.
+    Used by /recommend on a cache miss and by the background scoring scheduler.
+    Raises HTTPException(503) with Retry-After when the in-flight limit is reached.
+    """
+    if not DECISION_ENGINE:
+        raise HTTPException(status_code=503, detail="ML Model not loaded.")
+
+    try:
+        with nlp_admission.scoring(), deadline_scope(REQUEST_DEADLINE_SECONDS):
+            return await _score_admitted_user(user_token, user_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{e}; retry later",
+            headers={"Retry-After": str(e.retry_after_seconds)}
+        )
+
+def summarize_user_data(
+    raw_user_data: Union[Dict[str, Any], ColumnarPayload],
+    calendar_features: Optional[CalendarFeatureAccumulator]
+) -> Dict[str, Any]:
+    """
+    Sizes of the fetched data, for the data_fetched stage event.
+    """
+    if isinstance(raw_user_data, ColumnarPayload):
+        heart_rate_points = int(raw_user_data.column("hr_value").size)
+        calendar_events = int(raw_user_data.column("event_start").size)
+    else:
+        heart_rate_points = len(raw_user_data.get("heart_rate_data", []))
+        calendar_events = len(raw_user_data.get("calendar_events", []))
+    if calendar_features is not None:
+        calendar_events = calendar_features.event_count
+    return {
+        "wire_format": "columnar" if isinstance(raw_user_data, ColumnarPayload) else "json",
+        "calendar_source": "stream" if calendar_features is not None else "aggregate",
+        "calendar_events": calendar_events,
+        "heart_rate_points": heart_rate_points,
+    }
+
+async def scoring_stages(
+    user_token: str,
+    user_key: str,
+    to_thread: Callable[..., Awaitable[Any]] = asyncio.to_thread
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    The scoring chain as a sequence of (stage, result) pairs: data_fetched, features,
+    prediction, action and finally complete with the RecommendationResponse.
+    Each stage runs once, when the consumer asks for it; closing the iterator early
+    skips the remaining stages (in particular, no action is dispatched).
+    The blocking stages run through `to_thread`.
+    """
+    # 1. FETCH DATA from INTEGRATIONS SERVICE
+    raw_user_data, calendar_features = await to_thread(fetch_user_data, user_token, user_key)
+    yield "data_fetched", summarize_user_data(raw_user_data, calendar_features)
+
+    # 2. FEATURE ENGINEERING
+    model_input_data, degradation_mode = await to_thread(
+        compute_features, user_key, user_token, raw_user_data, calendar_features
+    )
+    feature_trends = feature_history.rolling_stats(user_key) if feature_history is not None else None
+    nlp_admission.record_mode(degradation_mode)
+    yield "features", {
+        "features_used": model_input_data,
+        "degradation_mode": degradation_mode,
+        "feature_trends": feature_trends,
+    }
+
+    # 3. MAKE PREDICTION
+    stress_level = await to_thread(run_prediction, model_input_data, user_token)
+    if prediction_store is not None:
+        await to_thread(prediction_store.record, user_key, stress_level, degradation_mode)
+    yield "prediction", {"stress_level": stress_level}
+
+    # 4. MAP PREDICTION TO ACTION AND EXECUTE
+    action_payload = select_action_payload(stress_level)
+
+    # Dispatch (or suppress, if still in cooldown for this user)
+    action_request, action_service_response, suppressed = await dispatch_recommended_action(
+        user_key, stress_level, action_payload, user_token, {"Authorization": f"Bearer {user_token}"}
+    )
+    yield "action", {
+        "action_taken": action_request['action'],
+        "action_details": action_request['details'],
+        "action_service_response": action_service_response,
+        "action_suppressed": suppressed,
+    }
+
+    yield "complete", RecommendationResponse(
+            status="success",
+            recommendation=(
+                f"Action recently dispatched: {action_request['action']}" if suppressed
+                else f"Action dispatched: {action_request['action']}"
+            ),
+            stress_level=stress_level,
+            action_taken=action_request['action'],
+            action_details=ActionDetails(**action_request['details']),
+            features_used=FeatureData(**model_input_data),
+            action_service_response=action_service_response,
+            action_suppressed=suppressed,
+            degradation_mode=degradation_mode,
+            feature_trends=feature_trends,
+            timestamp=datetime.now(timezone.utc).isoformat()
+        )
+
+def scoring_error(e: Exception) -> HTTPException:
+    """
+    Maps a failure of the scoring chain to the HTTP error returned to the client.
+    """
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail=f"Upstream service unavailable: {str(e)}",
+            headers={"Retry-After": str(max(1, int(round(e.retry_after))))}
+        )
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail=str(e))
+    if isinstance(e, requests.exceptions.RequestException):
+        return HTTPException(status_code=502, detail=f"Error communicating with upstream service: {str(e)}")
+    return HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+async def _score_admitted_user(user_token: str, user_id: Optional[str]) -> RecommendationResponse:
+    try:
+        async for stage, result in scoring_stages(user_token, user_key_for(user_id, user_token)):
+            if stage == "complete":
+                return result
+    except Exception as e:
+        raise scoring_error(e)
+
+async def score_registered_user(registration: ScoringRegistration) -> RecommendationResponse:
+    """
+    Scoring callback for the background scheduler (each run starts its own trace).
+    """
+    with tracer.span("scoring.background"):
+        return await score_user(registration.user_token, registration.user_id)
+
+scoring_scheduler = ScoringScheduler(
+    score_registered_user,
+    interval_seconds=SCORING_INTERVAL_SECONDS,
+    jitter_fraction=SCORING_JITTER_FRACTION,
+    workers=SCORING_WORKERS,
+    freshness_seconds=SCORING_FRESHNESS_SECONDS,
+    notify_debounce_seconds=SCORING_NOTIFY_DEBOUNCE_SECONDS,
+    max_users=SCORING_MAX_USERS
+)
 
 # --- Endpoint for Recommendation ---
 @app.post(
@@ -512,7 +1404,7 @@ def analyze_email_urgency_keywords(emails: List[str]) -> float:
     response_model=RecommendationResponse,
     responses={
         401: {"model": ErrorResponse, "description": "Authentication failed"},
-        503: {"model": ErrorResponse, "description": "ML Model not available"},
+        503: {"model": ErrorResponse, "description": "ML Model not available, or scoring capacity exhausted (see Retry-After)"},
         502: {"model": ErrorResponse, "description": "Upstream service error"}
     },
     summary="Get AI Wellness Recommendation",
@@ -520,150 +1412,295 @@ def analyze_email_urgency_keywords(emails: List[str]) -> float:
 )
 async def get_recommendation(request: RecommendationRequest):
     """
+    Returns the user's precomputed recommendation when the background scheduler
+    has a fresh one; otherwise scores the user synchronously:
     1. Fetches real-time data from the Integrations Service.
     2. Runs the Decision Engine (ML Model) to get a prediction.
     3. Dispatches the resulting action to the Actions Service.
     """
+    user_key = user_key_for(request.user_id, request.user_token)
+    assign_team(user_key, request.team, request.user_token)
+    if SCORING_SCHEDULER_ENABLED:
+        precomputed = scoring_scheduler.fresh_result(user_key, request.user_token)
+        if precomputed is not None:
+            return RecommendationResponse(**{**precomputed.dict(), "precomputed": True})
+
+    response = await score_user(request.user_token, request.user_id)
+    if SCORING_SCHEDULER_ENABLED:
+        scoring_scheduler.record_result(user_key, request.user_token, response)
+    return response
+
+# Outcomes of /api/v1/recommend/stream, for /metrics
+stream_stats = {"started": 0, "completed": 0, "errors": 0, "client_disconnects": 0}
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    One server-sent event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def recommendation_events(
+    request: RecommendationRequest,
+    user_key: str,
+    precomputed: Optional[RecommendationResponse],
+    admission: SharedSlot,
+    release_pending: Callable[[], None]
+):
+    """
+    Yields the server-sent events of /api/v1/recommend/stream.
+
+    The stages run in their own task, under the request deadline and a cancellation
+    scope. If the client disconnects, this generator is closed. The task is then
+    cancelled and the scope's event is set, so the stages still pending never run
+    (no action is dispatched) and integrations calls not yet started are skipped.
+    The admission slot is held by the task and by any stage still running in a
+    worker thread, so it is only freed once that thread has finished too.
+    """
+    if precomputed is not None:
+        yield sse_event("features", {
+            "features_used": precomputed.features_used,
+            "degradation_mode": precomputed.degradation_mode,
+            "feature_trends": precomputed.feature_trends,
+        })
+        yield sse_event("prediction", {"stress_level": precomputed.stress_level})
+        yield sse_event("action", {
+            "action_taken": precomputed.action_taken,
+            "action_details": precomputed.action_details,
+            "action_service_response": precomputed.action_service_response,
+            "action_suppressed": precomputed.action_suppressed,
+        })
+        yield sse_event("complete", RecommendationResponse(**{**precomputed.dict(), "precomputed": True}))
+        return
+
+    events: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    async def run_stages(release: Callable[[], None]):
+        try:
+            with deadline_scope(REQUEST_DEADLINE_SECONDS), cancellation_scope(cancelled):
+                async for stage, result in scoring_stages(request.user_token, user_key, admission.to_thread):
+                    if stage == "complete":
+                        stream_stats["completed"] += 1
+                        if SCORING_SCHEDULER_ENABLED:
+                            scoring_scheduler.record_result(user_key, request.user_token, result)
+                    events.put_nowait((stage, result))
+        except Exception as e:
+            stream_stats["errors"] += 1
+            error = scoring_error(e)
+            events.put_nowait(("error", {"status_code": error.status_code, "detail": error.detail}))
+        finally:
+            events.put_nowait(None)
+            release()
+
+    stream_stats["started"] += 1
+    task = asyncio.create_task(run_stages(admission.hold()))
+    release_pending()
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                return
+            yield sse_event(*item)
+    finally:
+        if not task.done():
+            cancelled.set()
+            task.cancel()
+            stream_stats["client_disconnects"] += 1
+
+@app.post(
+    "/api/v1/recommend/stream",
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "Stage events, then complete (or error)"},
+        503: {"model": ErrorResponse, "description": "ML Model not available, or scoring capacity exhausted (see Retry-After)"}
+    },
+    summary="Stream AI Wellness Recommendation",
+    description="Server-sent events variant of /api/v1/recommend that reports each stage of the scoring as it completes."
+)
+async def stream_recommendation(request: RecommendationRequest):
+    """
+    Emits one event per stage as soon as it completes:
+    data_fetched (sizes of the fetched data), features (FeatureData and degradation mode),
+    prediction (stress level), action (the dispatched action and its result), and finally
+    complete (the full RecommendationResponse) or error (status_code and detail).
+    A fresh precomputed result is replayed from features onwards.
+    """
     if not DECISION_ENGINE:
         raise HTTPException(status_code=503, detail="ML Model not loaded.")
 
+    user_key = user_key_for(request.user_id, request.user_token)
+    assign_team(user_key, request.team, request.user_token)
+    precomputed = scoring_scheduler.fresh_result(user_key, request.user_token) if SCORING_SCHEDULER_ENABLED else None
+
+    # Admission is decided before the stream starts, so a rejection is still a 503 with Retry-After
+    slot = ExitStack()
+    if precomputed is None:
+        try:
+            slot.enter_context(nlp_admission.scoring())
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"{e}; retry later",
+                headers={"Retry-After": str(e.retry_after_seconds)}
+            )
+    admission = SharedSlot(slot.close)
+    # Held until the stages task takes over, or the stream ends before it started
+    release_pending = admission.hold()
+
+    return StreamingResponse(
+        recommendation_events(request, user_key, precomputed, admission, release_pending),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_pending)
+    )
+
+def require_prediction_store() -> PredictionStore:
+    if prediction_store is None:
+        raise HTTPException(status_code=404, detail="The prediction store is disabled.")
+    return prediction_store
+
+@app.get(
+    "/api/v1/teams",
+    summary="List Teams",
+    description="Teams with stress rollups, and how many users are assigned to each."
+)
+async def list_teams():
+    """
+    Team name -> number of users assigned to it.
+    """
+    return {"teams": require_prediction_store().teams()}
+
+@app.get(
+    "/api/v1/teams/stress",
+    summary="Team Stress Rollup",
+    description=(
+        "Stress-level histogram, mean and number of high-stress users per hour or day for one team "
+        "(or all teams), read from aggregates maintained as predictions are made."
+    )
+)
+async def team_stress_rollup(team: str = ALL_TEAMS, granularity: str = "hour", buckets: int = 24):
+    """
+    The last `buckets` hourly or daily buckets for `team`, oldest first. No scoring is run.
+    """
+    store = require_prediction_store()
     try:
-        # 1. FETCH DATA from INTEGRATIONS SERVICE
-        # Extract validated data from request model
-        user_token = request.user_token
+        rollup = store.rollup(team, granularity, buckets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "team": team,
+        "granularity": granularity,
+        "high_stress_level": store.high_stress_level,
+        "buckets": rollup
+    }
 
-        headers = {"Authorization": f"Bearer {user_token}"}
-        
-        # Call the aggregate endpoint for all user data
-        data_response = requests.get(
-            f"{INTEGRATIONS_SERVICE_URL}/api/v1/data/aggregate",
-            headers=headers
-        )
-        data_response.raise_for_status()
-        raw_user_data = data_response.json()
+@app.get(
+    "/api/v1/sharding/owner",
+    summary="Shard Owner Lookup",
+    description="The replica that owns a user under user-affinity sharding, for routers and load balancers."
+)
+async def shard_owner(user_key: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    Owner of the user identified by user_key (or user_id).
+    """
+    if not shard_router.enabled:
+        raise HTTPException(status_code=404, detail="Sharding is disabled.")
+    if not user_key and not user_id:
+        raise HTTPException(status_code=400, detail="Pass user_key or user_id.")
+    user_key = user_key or f"id:{user_id}"
+    owner = shard_router.owner(user_key)
+    return {"user_key": user_key, "owner": owner, "is_self": owner == shard_router.self_node}
 
-        # 2. FEATURE ENGINEERING
-        # Transform raw API data into ML model features
-        model_input_data = extract_features_from_raw_data(raw_user_data, user_token)
-        
-        # Required features (matching the order used in training)
-        required_features = [
-            "Sleep_Duration", "Calendar_Busy_Hours", "HeartRate_Avg", 
-            "Steps_Last_24h", "Urgent_Emails_Flag"
-        ]
-
-        # Create the DataFrame required by the scikit-learn model
-        features_df = pd.DataFrame([model_input_data], columns=required_features)
-
-        # 3. MAKE PREDICTION
-        # Prefer the model's native predict; otherwise adapt to the notebook engine
-        stress_level = None
-        try:
-            if hasattr(DECISION_ENGINE, 'predict') and callable(getattr(DECISION_ENGINE, 'predict')):
-                # Use predict if available
-                prediction = DECISION_ENGINE.predict(features_df)[0]
-                stress_level = int(prediction)
-            elif hasattr(DECISION_ENGINE, 'stress_model') and getattr(DECISION_ENGINE, 'stress_model') is not None:
-                # Prefer the model's own expected feature names if available
-                sm = DECISION_ENGINE.stress_model
-                if hasattr(sm, 'feature_names_in_'):
-                    names = [str(n) for n in getattr(sm, 'feature_names_in_')]
-                    # Build a flexible mapping from our current pipeline plus reasonable defaults
-                    base_map = {
-                        'Sleep_Duration': float(model_input_data.get('Sleep_Duration', 7.0)),
-                        'Calendar_Busy_Hours': float(model_input_data.get('Calendar_Busy_Hours', 0.0)),
-                        'Heart_Rate': float(model_input_data.get('HeartRate_Avg', 70.0)),
-                        'Daily_Steps': float(model_input_data.get('Steps_Last_24h', 3000.0)),
-                        'Urgent_Emails_Flag': float(model_input_data.get('Urgent_Emails_Flag', 0.0)),
-                        # Defaults for likely notebook columns
-                        'BMI_Category': 2.0,
-                        'Systolic_BP': 120.0,
-                        'Age': 35.0,
-                        'Gender': 0.0,
-                        'Occupation': 0.0,
-                    }
-                    vector = [float(base_map.get(name, 0.0)) for name in names]
-                    prediction = sm.predict([vector])[0]
-                    stress_level = int(prediction)
-                elif hasattr(DECISION_ENGINE, 'feature_order'):
-                    # Fallback to the engine's feature order if model doesn't expose names
-                    feature_order = getattr(DECISION_ENGINE, 'feature_order')
-                    mapped = {
-                        'Sleep_Duration': float(model_input_data.get('Sleep_Duration', 7.0)),
-                        'BMI_Category': 2.0,
-                        'Heart_Rate': float(model_input_data.get('HeartRate_Avg', 70.0)),
-                        'Daily_Steps': float(model_input_data.get('Steps_Last_24h', 3000.0)),
-                        'Systolic_BP': 120.0
-                    }
-                    vector = [float(mapped.get(k, 0.0)) for k in feature_order]
-                    prediction = sm.predict([vector])[0]
-                    stress_level = int(prediction)
-                else:
-                    raise RuntimeError('stress_model lacks feature metadata')
-            elif callable(DECISION_ENGINE):
-                # Last resort: call engine(email_text, stress_features)
-                emails = fetch_emails_for_urgency_analysis(user_token)
-                email_text = emails[0] if emails else "SUBJECT: (none) BODY: (none)"
-                stress_features = {
-                    'Sleep_Duration': float(model_input_data.get('Sleep_Duration', 7.0)),
-                    'BMI_Category': 2.0,
-                    'Heart_Rate': float(model_input_data.get('HeartRate_Avg', 70.0)),
-                    'Daily_Steps': float(model_input_data.get('Steps_Last_24h', 3000.0)),
-                    'Systolic_BP': 120.0
-                }
-                result_obj = DECISION_ENGINE(email_text, stress_features)
-                # Expect a dict with 'stress_level'
-                if not isinstance(result_obj, dict) or 'stress_level' not in result_obj:
-                    raise RuntimeError('Engine returned invalid result payload')
-                stress_level = int(result_obj['stress_level'])
-            else:
-                raise RuntimeError('Loaded engine has no usable predict interface')
-        except Exception as pred_err:
-            raise HTTPException(status_code=503, detail=f"ML prediction failed: {pred_err}")
-        
-        # 4. MAP PREDICTION TO ACTION AND EXECUTE
-        # Handle stress level prediction (0-10 scale from your trained model)
-        
-        # Get action payload based on stress level
-        action_payload = ACTION_MAPPING.get(stress_level)
-        
-        if not action_payload:
-            # Default action for unexpected predictions
-            if stress_level <= 3:
-                action_payload = ACTION_MAPPING[0]  # Low stress default
-            elif stress_level <= 6:
-                action_payload = ACTION_MAPPING[5]  # Medium stress default  
-            else:
-                action_payload = ACTION_MAPPING[7]  # High stress default
-
-        # Create a copy to avoid modifying the original mapping
-        action_request = action_payload.copy()
-        action_request["user_token"] = user_token
-
-        # Dispatch the action to the Actions Service
-        action_response = requests.post(
-            f"{ACTIONS_SERVICE_URL}/api/v1/execute_action",
-            json=action_request,
-            headers=headers,
-            timeout=30
-        )
-        action_response.raise_for_status()
-        
-        return RecommendationResponse(
-            status="success",
-            recommendation=f"Action dispatched: {action_request['action']}",
-            stress_level=stress_level,
-            action_taken=action_request['action'],
-            action_details=ActionDetails(**action_request['details']),
-            features_used=FeatureData(**model_input_data),
-            action_service_response=action_response.json(),
-            timestamp=datetime.now(timezone.utc).isoformat()
+def require_scoring_scheduler():
+    if not SCORING_SCHEDULER_ENABLED:
+        raise HTTPException(status_code=404, detail="Background scoring is disabled.")
+
+@app.post(
+    "/api/v1/scoring/users",
+    status_code=201,
+    summary="Register User for Background Scoring",
+    description="Scores the user on a fixed cadence so /recommend can answer from the precomputed result."
+)
+async def register_scoring_user(registration: ScoringRegistrationRequest):
+    """
+    Adds a user to the background scoring scheduler.
+    """
+    require_scoring_scheduler()
+    user_key = user_key_for(registration.user_id, registration.user_token)
+    try:
+        entry = scoring_scheduler.register(
+            user_key, registration.user_token, registration.user_id, registration.interval_seconds
         )
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    assign_team(user_key, registration.team, registration.user_token)
+    return {
+        "status": "registered",
+        "user_key": user_key,
+        "interval_seconds": entry.interval_seconds,
+        "next_run_in_seconds": scoring_scheduler.next_run_in(user_key)
+    }
 
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=502, detail=f"Error communicating with upstream service: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+@app.delete("/api/v1/scoring/users/{user_key}", summary="Unregister User from Background Scoring")
+async def unregister_scoring_user(user_key: str, authorization: Optional[str] = Header(None)):
+    """
+    Stops background scoring for a user and drops their precomputed result.
+    Requires the token the user registered with, as "Authorization: Bearer <user_token>".
+    """
+    require_scoring_scheduler()
+    scheme, _, user_token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not user_token.strip():
+        raise HTTPException(status_code=401, detail="Pass the registered user token as a Bearer token.")
+    try:
+        unregistered = scoring_scheduler.unregister(user_key, user_token.strip())
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if not unregistered:
+        raise HTTPException(status_code=404, detail="User is not registered for background scoring.")
+    return {"status": "unregistered", "user_key": user_key}
+
+@app.post(
+    "/api/v1/scoring/notify",
+    status_code=202,
+    summary="Data Change Notification",
+    description=(
+        "Webhook for calendar/fitness change notifications. Accepts a JSON body "
+        "(user_key or user_id, source) or a Google push notification whose channel token is the user_key."
+    )
+)
+async def notify_data_change(
+    notification: Optional[ChangeNotification] = Body(None),
+    x_goog_channel_token: Optional[str] = Header(None),
+    x_goog_resource_state: Optional[str] = Header(None),
+    x_webhook_secret: Optional[str] = Header(None)
+):
+    """
+    Triggers an early rescoring of the notified user.
+    """
+    require_scoring_scheduler()
+    if SCORING_WEBHOOK_SECRET and not hmac.compare_digest(x_webhook_secret or "", SCORING_WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret.")
+
+    if x_goog_channel_token:
+        # Google sends a "sync" message when a watch channel is created; it carries no change
+        if x_goog_resource_state == "sync":
+            return {"status": "ignored", "reason": "sync"}
+        user_key, source = x_goog_channel_token, "calendar"
+    elif notification is not None and (notification.user_key or notification.user_id):
+        user_key = notification.user_key or f"id:{notification.user_id}"
+        source = notification.source
+    else:
+        raise HTTPException(status_code=400, detail="Notification does not identify a user.")
+
+    if not scoring_scheduler.notify_change(user_key, source):
+        raise HTTPException(status_code=404, detail="User is not registered for background scoring.")
+    return {
+        "status": "accepted",
+        "user_key": user_key,
+        "source": source,
+        "next_run_in_seconds": scoring_scheduler.next_run_in(user_key)
+    }
 
 @app.get(
     "/health",
@@ -722,7 +1759,8 @@ async def health_check():
     
     # Check 3: Integrations Service Connectivity
     try:
-        response = requests.get(f"{INTEGRATIONS_SERVICE_URL}/health", timeout=5)
+        # In a thread: a slow dependency must not stall the event loop (found by app/loop_monitor.py)
+        response = await asyncio.to_thread(requests.get, f"{INTEGRATIONS_SERVICE_URL}/health", timeout=5)
         if response.status_code == 200:
             health_status["checks"]["integrations_service"] = {
                 "status": "healthy",
@@ -743,26 +1781,32 @@ async def health_check():
         overall_healthy = False
     
     # Check 4: Actions Service Connectivity  
-    try:
-        response = requests.get(f"{ACTIONS_SERVICE_URL}/health", timeout=5)
-        if response.status_code == 200:
-            health_status["checks"]["actions_service"] = {
-                "status": "healthy", 
-                "message": "Actions service is reachable",
-                "response_time_ms": round(response.elapsed.total_seconds() * 1000, 2)
-            }
-        else:
+    if ACTIONS_DISPATCH_MODE == "inprocess":
+        health_status["checks"]["actions_service"] = {
+            "status": "healthy",
+            "message": f"Actions are dispatched in-process ({action_transport.mode if action_transport else 'not started'})"
+        }
+    else:
+        try:
+            response = await asyncio.to_thread(requests.get, f"{ACTIONS_SERVICE_URL}/health", timeout=5)
+            if response.status_code == 200:
+                health_status["checks"]["actions_service"] = {
+                    "status": "healthy", 
+                    "message": "Actions service is reachable",
+                    "response_time_ms": round(response.elapsed.total_seconds() * 1000, 2)
+                }
+            else:
+                health_status["checks"]["actions_service"] = {
+                    "status": "unhealthy",
+                    "message": f"Actions service returned status {response.status_code}"
+                }
+                overall_healthy = False
+        except requests.exceptions.RequestException as e:
             health_status["checks"]["actions_service"] = {
                 "status": "unhealthy",
-                "message": f"Actions service returned status {response.status_code}"
+                "message": f"Cannot reach actions service: {str(e)}"
             }
             overall_healthy = False
-    except requests.exceptions.RequestException as e:
-        health_status["checks"]["actions_service"] = {
-            "status": "unhealthy",
-            "message": f"Cannot reach actions service: {str(e)}"
-        }
-        overall_healthy = False
     
     # Set overall status
     if not overall_healthy:
@@ -781,4 +1825,34 @@ async def health_check():
             ).dict()
         )
     else:
-        return HealthResponse(**health_status)
\ No newline at end of file
+        return HealthResponse(**health_status)
+
+@app.get(
+    "/metrics",
+    summary="Runtime Metrics",
+    description="Counters for capacity monitoring, such as suppressed duplicate actions."
+)
+async def metrics():
+    """
+    Runtime metrics for the Assistant Service.
+    """
+    return {
+        "service": "assistant",
+        "action_cooldown": action_cooldowns.snapshot(),
+        "action_transport": action_transport.snapshot() if action_transport else None,
+        "integrations_client": integrations_http.snapshot(),
+        "deadlines": dict(deadline_stats),
+        "recommend_stream": dict(stream_stats),
+        "scoring_scheduler": scoring_scheduler.snapshot() if SCORING_SCHEDULER_ENABLED else None,
+        "admission": nlp_admission.snapshot(),
+        "shadow_scoring": shadow_scorer.snapshot(),
+        "feature_history": feature_history.snapshot() if feature_history is not None else None,
+        "payload_cache": payload_cache.snapshot(),
+        "sharding": shard_router.snapshot() if shard_router.enabled else None,
+        "prediction_store": prediction_store.snapshot() if prediction_store is not None else None,
+        "email_urgency": email_urgency.snapshot() if EMAIL_URGENCY_SOURCE == "gmail" else {"source": EMAIL_URGENCY_SOURCE},
+        "tracing": tracer.snapshot(),
+        "profiling": profiler.snapshot(),
+        "event_loop": loop_monitor.snapshot(),
+        "process": {"pid": os.getpid(), "memory": memory_usage()}
+    }
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+Admission control for the scoring path and its DistilBERT stage.
+
+Two limits protect /recommend when many calls arrive together:
+
+- At most `nlp_concurrency` NLP inferences run at once; other requests queue for
+  a slot. When the queue is `degrade_queue_depth` deep, or the p90 NLP latency
+  over the last `latency_window_seconds` exceeds `degrade_latency_ms`, new
+  requests skip the model and use the keyword classifier instead ("shed").
+  Latency samples age out of the window, so the NLP path is retried once the
+  slow samples are older than the window.
+- At most `max_in_flight` scorings run at once. Past that, requests are
+  rejected with AdmissionRejected, which the service turns into a 503 with a
+  Retry-After header.
+
+NLP slots are taken from worker threads (scoring runs via asyncio.to_thread),
+so all state is guarded by a threading lock.
+
+A scoring slot must outlive the threads its stages run in: cancelling the task
+that awaits asyncio.to_thread does not stop the thread. SharedSlot keeps the
+slot until the last of them has finished.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when the service is past its hard in-flight limit.
+    """
+    def __init__(self, in_flight: int, retry_after_seconds: int):
+        super().__init__(f"Scoring capacity exhausted ({in_flight} requests in flight)")
+        self.in_flight = in_flight
+        self.retry_after_seconds = retry_after_seconds
+
+
+class NlpAdmissionController:
+    """
+    Queue-depth and latency based degradation of the NLP stage, plus a hard in-flight limit.
+    """
+    def __init__(
+        self,
+        max_in_flight: int = 64,
+        nlp_concurrency: int = 2,
+        degrade_queue_depth: int = 4,
+        degrade_latency_ms: float = 1500.0,
+        latency_window_seconds: float = 30.0,
+        retry_after_seconds: int = 2,
+    ):
+        self.max_in_flight = max_in_flight
+        self.nlp_concurrency = nlp_concurrency
+        self.degrade_queue_depth = degrade_queue_depth
+        self.degrade_latency_ms = degrade_latency_ms
+        self.latency_window_seconds = latency_window_seconds
+        self.retry_after_seconds = retry_after_seconds
+
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(nlp_concurrency)
+        self._in_flight = 0
+        self._nlp_waiting = 0
+        self._nlp_running = 0
+        # (finished at, stage latency in ms incl. queueing), oldest first
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=1000)
+        self.stats: Dict[str, Any] = {
+            "admitted": 0, "rejected": 0, "nlp": 0, "shed": Counter(), "degradation_modes": Counter(),
+        }
+
+    # --- Hard limit ---
+
+    @contextmanager
+    def scoring(self) -> Iterator[None]:
+        """
+        Holds one in-flight scoring slot. Raises AdmissionRejected when all are taken.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_in_flight:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(self._in_flight, self._retry_after())
+            self._in_flight += 1
+            self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _retry_after(self) -> int:
+        # Roughly the time to drain the NLP queue at the recently observed latency
+        p90 = self._latency_p90(time.monotonic())
+        if p90 is None:
+            return self.retry_after_seconds
+        drain = (self._nlp_waiting + self._nlp_running) * p90 / 1000 / max(1, self.nlp_concurrency)
+        return max(self.retry_after_seconds, math.ceil(drain))
+
+    # --- NLP stage ---
+
+    def _latency_p90(self, now: float) -> Optional[float]:
+        while self._latencies and now - self._latencies[0][0] > self.latency_window_seconds:
+            self._latencies.popleft()
+        if not self._latencies:
+            return None
+        ordered = sorted(latency for _, latency in self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    def _shed_reason(self) -> Optional[str]:
+        if self._nlp_waiting >= self.degrade_queue_depth:
+            return "queue_depth"
+        p90 = self._latency_p90(time.monotonic())
+        if p90 is not None and p90 > self.degrade_latency_ms:
+            return "latency"
+        return None
+
+    @contextmanager
+    def nlp_stage(self) -> Iterator[bool]:
+        """
+        Yields True once an NLP slot is held, or False (without waiting) when the
+        request should use the keyword fallback instead.
+        """
+        with self._lock:
+            reason = self._shed_reason()
+            if reason is not None:
+                self.stats["shed"][reason] += 1
+            else:
+                self._nlp_waiting += 1
+        if reason is not None:
+            yield False
+            return
+
+        started = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            self._nlp_waiting -= 1
+            self._nlp_running += 1
+        try:
+            yield True
+        finally:
+            self._slots.release()
+            finished = time.monotonic()
+            with self._lock:
+                self._nlp_running -= 1
+                self._latencies.append((finished, (finished - started) * 1000))
+                self.stats["nlp"] += 1
+
+    def record_mode(self, mode: str):
+        """
+        Counts the degradation mode a scoring ended up using.
+        """
+        with self._lock:
+            self.stats["degradation_modes"][mode] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            p90 = self._latency_p90(time.monotonic())
+            return {
+                **self.stats,
+                "shed": dict(self.stats["shed"]),
+                "degradation_modes": dict(self.stats["degradation_modes"]),
+                "in_flight": self._in_flight,
+                "nlp_waiting": self._nlp_waiting,
+                "nlp_running": self._nlp_running,
+                "nlp_latency_p90_ms": round(p90, 1) if p90 is not None else None,
+                "degraded": self._shed_reason() is not None,
+                "limits": {
+                    "max_in_flight": self.max_in_flight,
+                    "nlp_concurrency": self.nlp_concurrency,
+                    "degrade_queue_depth": self.degrade_queue_depth,
+                    "degrade_latency_ms": self.degrade_latency_ms,
+                },
+            }
+
+
+class SharedSlot:
+    """
+    A scoring slot shared by a request and the worker threads its stages start.
+    `release` (which frees the slot) is called once the last holder has let go.
+    """
+    def __init__(self, release: Callable[[], None]):
+        self._release = release
+        self._holders = 0
+        self._lock = threading.Lock()
+
+    def hold(self) -> Callable[[], None]:
+        """
+        Takes a reference. Returns the function that drops it; calling that again does nothing.
+        """
+        with self._lock:
+            self._holders += 1
+        dropped = threading.Event()
+
+        def drop():
+            with self._lock:
+                if dropped.is_set():
+                    return
+                dropped.set()
+                self._holders -= 1
+                last = self._holders == 0
+            if last:
+                self._release()
+        return drop
+
+    async def to_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        asyncio.to_thread that holds the slot until the thread returns, even if the caller is cancelled.
+        """
+        drop = self.hold()
+        work = asyncio.ensure_future(asyncio.to_thread(func, *args))
+
+        def finished(future: "asyncio.Future[T]"):
+            # Nobody awaits the result after a cancellation, so retrieve a failure here
+            if not future.cancelled():
+                future.exception()
+            drop()
+        work.add_done_callback(finished)
+        return await asyncio.shield(work)
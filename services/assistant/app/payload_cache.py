@@ -0,0 +1,95 @@
+"""
+The last aggregate payload fetched per user, with its ETag and the features derived from it.
+
+fetch_user_data sends the cached ETag as If-None-Match. On a 304 it reuses the
+cached payload object, and compute_features finds that payload's features here
+and skips extraction (and the feature-history write for it). Only features that
+do not depend on the payload are recomputed: the urgent-email flag, and the
+calendar features when the calendar comes from the stream.
+
+Bounded to `max_users` (least recently used are evicted). Thread-safe.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class CachedPayload:
+    """
+    One user's last payload, its ETag and (once extracted) its features.
+    """
+    __slots__ = ("etag", "raw_user_data", "features")
+
+    def __init__(self, etag: str, raw_user_data: Any):
+        self.etag = etag
+        self.raw_user_data = raw_user_data
+        self.features: Optional[Dict[str, float]] = None
+
+
+class PayloadCache:
+    """
+    Per-user LRU of CachedPayload.
+    """
+    def __init__(self, max_users: int = 2000):
+        self.max_users = max_users
+        self._entries: "OrderedDict[str, CachedPayload]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"not_modified": 0, "modified": 0, "features_reused": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_users > 0
+
+    def get(self, user_key: str) -> Optional[CachedPayload]:
+        with self._lock:
+            entry = self._entries.get(user_key)
+            if entry is not None:
+                self._entries.move_to_end(user_key)
+            return entry
+
+    def store(self, user_key: str, etag: Optional[str], raw_user_data: Any):
+        """
+        Remembers a freshly downloaded payload (a payload without an ETag drops the user's entry).
+        """
+        with self._lock:
+            self.stats["modified"] += 1
+            self._entries.pop(user_key, None)
+            if not etag or not self.enabled:
+                return
+            self._entries[user_key] = CachedPayload(etag, raw_user_data)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def features_for(self, user_key: str, raw_user_data: Any) -> Optional[Dict[str, float]]:
+        """
+        The features already extracted from this very payload object, if any.
+        """
+        with self._lock:
+            entry = self._entries.get(user_key)
+            if entry is None or entry.raw_user_data is not raw_user_data or entry.features is None:
+                return None
+            self.stats["features_reused"] += 1
+            return dict(entry.features)
+
+    def set_features(self, user_key: str, raw_user_data: Any, features: Dict[str, float]):
+        with self._lock:
+            entry = self._entries.get(user_key)
+            # Another scoring may have stored a newer payload meanwhile
+            if entry is not None and entry.raw_user_data is raw_user_data:
+                entry.features = dict(features)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            fetches = self.stats["not_modified"] + self.stats["modified"]
+            return {
+                **self.stats,
+                "not_modified_rate": round(self.stats["not_modified"] / fetches, 4) if fetches else None,
+                "users": len(self._entries),
+                "max_users": self.max_users,
+            }
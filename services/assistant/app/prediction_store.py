@@ -0,0 +1,249 @@
+"""
+Append-only prediction log with team stress rollups maintained as predictions arrive.
+
+Every scoring appends one JSON line to the log:
+    {"type": "prediction", "ts": ..., "user_key": ..., "team": ..., "stress_level": ..., "degradation_mode": ...}
+and a user's team membership is appended whenever it is set or changes:
+    {"type": "team", "ts": ..., "user_key": ..., "team": ..., "owner": ...}
+
+`owner` is the digest of the token that first set the user's team. Only that
+token can move the user to another team later, so a request naming someone
+else's user_id cannot reassign them. Records that conflict with the owner are
+ignored on replay, so every worker resolves concurrent claims the same way.
+
+Rollups are kept per (team, bucket) for hourly and daily buckets, and for all
+teams together (team "*"). Each one holds the stress-level histogram, the
+prediction count and sum (for the mean), and the users seen and the users with
+at least one high-stress prediction in the bucket. Adding a prediction updates
+two buckets per granularity. Reading a rollup looks up the requested buckets
+and never scans the log, so it costs the same however many predictions are
+stored.
+
+The log is the source of truth and can be shared by preforked workers. Lines
+go out in single O_APPEND writes, and each store tails the file from the
+offset it has applied up to (before every read and after every write). That
+way every worker's rollups include the other workers' predictions, and a
+restart rebuilds them by replaying the log once. Buckets older than the
+retention (hourly_buckets hours, daily_buckets days) are dropped from memory.
+Their lines stay in the log.
+"""
+
+import hmac
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Set, Tuple
+
+ALL_TEAMS = "*"
+DEFAULT_TEAM = "unassigned"
+GRANULARITIES = {"hour": 3600, "day": 86400}
+# Replaying a long log on startup reads it this much at a time
+_READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class StressBucket:
+    """
+    Running aggregates of the predictions in one (team, time bucket).
+    """
+    __slots__ = ("histogram", "count", "total", "users", "high_stress_users")
+
+    def __init__(self):
+        self.histogram: Counter = Counter()
+        self.count = 0
+        self.total = 0
+        self.users: Set[str] = set()
+        self.high_stress_users: Set[str] = set()
+
+    def add(self, user_key: str, stress_level: int, high_stress: bool):
+        self.histogram[stress_level] += 1
+        self.count += 1
+        self.total += stress_level
+        self.users.add(user_key)
+        if high_stress:
+            self.high_stress_users.add(user_key)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "predictions": self.count,
+            "mean_stress_level": round(self.total / self.count, 2) if self.count else None,
+            "histogram": {str(level): n for level, n in sorted(self.histogram.items())},
+            "users": len(self.users),
+            "high_stress_users": len(self.high_stress_users),
+        }
+
+
+_EMPTY = StressBucket()
+
+
+class PredictionStore:
+    """
+    Appends predictions to the log and keeps the team rollups up to date with it. Thread-safe.
+    """
+    def __init__(self, path: str, high_stress_level: int = 7, hourly_buckets: int = 168, daily_buckets: int = 90):
+        self.path = path
+        self.high_stress_level = high_stress_level
+        self.retention = {"hour": hourly_buckets, "day": daily_buckets}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._reader = open(path, "rb")
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._teams: Dict[str, str] = {}
+        # user_key -> digest of the token that owns the user's team membership
+        self._team_owners: Dict[str, str] = {}
+        # granularity -> (team, bucket start) -> aggregates
+        self._rollups: Dict[str, Dict[Tuple[str, int], StressBucket]] = {g: {} for g in GRANULARITIES}
+        # granularity -> bucket start -> teams with a rollup in it (for dropping expired buckets)
+        self._bucket_teams: Dict[str, Dict[int, Set[str]]] = {g: {} for g in GRANULARITIES}
+        self.stats = {"recorded": 0, "applied": 0, "malformed": 0, "outside_retention": 0, "team_changes_refused": 0}
+        with self._lock:
+            self._catch_up()
+
+    def _append(self, record: Dict[str, Any]):
+        os.write(self._fd, (json.dumps(record, separators=(",", ":")) + "\n").encode())
+
+    def _catch_up(self):
+        size = os.fstat(self._reader.fileno()).st_size
+        while size > self._offset:
+            self._reader.seek(self._offset)
+            data = self._reader.read(min(size - self._offset, _READ_CHUNK_BYTES))
+            # A line still being written by another worker is picked up next time
+            end = data.rfind(b"\n")
+            if end < 0:
+                return
+            for line in data[:end].split(b"\n"):
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    self.stats["malformed"] += 1
+            self._offset += end + 1
+
+    def _apply(self, record: Dict[str, Any]):
+        if record["type"] == "team":
+            user_key, owner = record["user_key"], record.get("owner")
+            current_owner = self._team_owners.get(user_key)
+            if current_owner is not None and current_owner != owner:
+                return
+            self._teams[user_key] = record["team"]
+            if owner is not None:
+                self._team_owners[user_key] = owner
+            return
+        if record["type"] != "prediction":
+            return
+        self.stats["applied"] += 1
+        stress_level = int(record["stress_level"])
+        high_stress = stress_level >= self.high_stress_level
+        for granularity, width in GRANULARITIES.items():
+            start = int(record["ts"] // width * width)
+            starts = self._bucket_teams[granularity]
+            cutoff = self._cutoff(granularity)
+            if start < cutoff:
+                self.stats["outside_retention"] += 1
+                continue
+            rollups = self._rollups[granularity]
+            for team in (record["team"], ALL_TEAMS):
+                bucket = rollups.get((team, start))
+                if bucket is None:
+                    bucket = rollups[(team, start)] = StressBucket()
+                    starts.setdefault(start, set()).add(team)
+                bucket.add(record["user_key"], stress_level, high_stress)
+            self._expire(granularity, cutoff)
+
+    def _cutoff(self, granularity: str) -> int:
+        width = GRANULARITIES[granularity]
+        return int(time.time() // width * width) - (self.retention[granularity] - 1) * width
+
+    def _expire(self, granularity: str, cutoff: int):
+        starts = self._bucket_teams[granularity]
+        # Buckets are created in (nearly) time order, so expired ones are at the front
+        while starts:
+            start = next(iter(starts))
+            if start >= cutoff:
+                break
+            for team in starts.pop(start):
+                del self._rollups[granularity][(team, start)]
+
+    def assign_team(self, user_key: str, team: str, owner: str) -> bool:
+        """
+        Puts the user's future predictions in `team` (logged, so every worker and restart sees it).
+        `owner` is the digest of the requesting token. Returns False, changing nothing, when
+        the user's team is owned by another token.
+        """
+        with self._lock:
+            self._catch_up()
+            current_owner = self._team_owners.get(user_key)
+            if current_owner is not None and not hmac.compare_digest(current_owner, owner):
+                self.stats["team_changes_refused"] += 1
+                return False
+            if self._teams.get(user_key) == team and current_owner is not None:
+                return True
+            self._append({"type": "team", "ts": time.time(), "user_key": user_key, "team": team, "owner": owner})
+            self._catch_up()
+            # Another worker may have claimed the user first
+            return self._team_owners.get(user_key) == owner
+
+    def record(self, user_key: str, stress_level: int, degradation_mode: str = "none"):
+        """
+        Appends a prediction and folds it into the rollups of the user's team.
+        """
+        with self._lock:
+            self._catch_up()
+            self._append({
+                "type": "prediction",
+                "ts": time.time(),
+                "user_key": user_key,
+                "team": self._teams.get(user_key, DEFAULT_TEAM),
+                "stress_level": stress_level,
+                "degradation_mode": degradation_mode,
+            })
+            self.stats["recorded"] += 1
+            self._catch_up()
+
+    def rollup(self, team: str = ALL_TEAMS, granularity: str = "hour", buckets: int = 24) -> List[Dict[str, Any]]:
+        """
+        The last `buckets` buckets (oldest first, ending with the current one) for `team`.
+        Raises ValueError for an unknown granularity.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        width = GRANULARITIES[granularity]
+        buckets = max(1, min(buckets, self.retention[granularity]))
+        current = int(time.time() // width * width)
+        with self._lock:
+            self._catch_up()
+            rollups = self._rollups[granularity]
+            return [
+                {
+                    "bucket_start": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                    **rollups.get((team, start), _EMPTY).summary(),
+                }
+                for start in range(current - (buckets - 1) * width, current + 1, width)
+            ]
+
+    def teams(self) -> Dict[str, int]:
+        """
+        Team name -> number of assigned users.
+        """
+        with self._lock:
+            self._catch_up()
+            return dict(Counter(self._teams.values()))
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
+            self._reader.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "log_bytes": self._offset,
+                "teams": len(set(self._teams.values())),
+                "hourly_buckets": len(self._rollups["hour"]),
+                "daily_buckets": len(self._rollups["day"]),
+            }
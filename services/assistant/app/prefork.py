@@ -0,0 +1,180 @@
+"""
+Preforking server for the Assistant Service.
+
+`uvicorn --workers N` starts N fresh interpreters, and each one unpickles the
+Decision Engine and loads torch/DistilBERT again, so memory grows linearly
+with the worker count. Here the master process loads everything once instead:
+
+1. It imports app.main, which loads the Decision Engine, and preloads the NLP
+   model.
+2. It runs a full collection and then gc.freeze(). This moves every object
+   that exists at that point into the permanent generation, so the workers'
+   cyclic GC never touches them. Without it, the GC would write to each
+   object's header and force its page to be copied.
+3. It binds the listening socket and forks the workers. Each worker serves the
+   socket with its own uvicorn event loop and shares the model pages with the
+   master copy-on-write.
+
+Pages that a worker writes to (reference counts of objects it touches, its
+own request state) still become private. Large buffers such as tensor
+storage and numpy arrays are not Python objects and stay shared.
+
+The master restarts workers that exit unexpectedly, forwards SIGINT/SIGTERM
+to them, and can log per-worker RSS/PSS/USS every --report-interval seconds.
+Each worker also reports its own memory under "process" in /metrics.
+
+    cd services/assistant && python -m app.prefork --workers 4 --port 8002
+
+Linux only (fork, /proc).
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("app.prefork")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Preforking server for the Assistant Service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ASSISTANT_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument(
+        "--torch-threads", type=int, default=1,
+        help="intra-op threads per worker; keeps N workers from oversubscribing the cores"
+    )
+    parser.add_argument("--report-interval", type=float, default=0, help="seconds between memory reports (0: off)")
+    parser.add_argument("--no-freeze", action="store_true", help="skip gc.freeze() (for comparison)")
+    return parser.parse_args(argv)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    # The forked child inherits the master's RNG state; re-seed so jitter differs per worker
+    random.seed()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def memory_report(workers: dict) -> str:
+    from app.process_memory import memory_usage
+
+    lines = [f"{'process':<16}{'rss MiB':>10}{'pss MiB':>10}{'uss MiB':>10}{'shared MiB':>12}"]
+    totals = {"rss_mb": 0.0, "pss_mb": 0.0, "uss_mb": 0.0}
+    for name, pid in [("master", os.getpid())] + [(f"worker {pid}", pid) for pid in workers]:
+        usage = memory_usage(pid)
+        if usage is None:
+            continue
+        for key in totals:
+            totals[key] += usage[key]
+        lines.append(f"{name:<16}{usage['rss_mb']:>10.1f}{usage['pss_mb']:>10.1f}{usage['uss_mb']:>10.1f}{usage['shared_mb']:>12.1f}")
+    lines.append(f"{'total':<16}{totals['rss_mb']:>10.1f}{totals['pss_mb']:>10.1f}{totals['uss_mb']:>10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not hasattr(os, "fork"):
+        sys.exit("The prefork server requires os.fork (Linux/macOS).")
+    # uvicorn's "trace" level has no logging equivalent
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.INFO), format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+    # Must be set before torch is imported by app.main
+    os.environ.setdefault("OMP_NUM_THREADS", str(args.torch_threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(args.torch_threads))
+
+    from app import main as service
+
+    service.preload_models()
+    gc.collect()
+    if not args.no_freeze:
+        gc.freeze()
+        logger.info("Froze %d objects before forking %d workers", gc.get_freeze_count(), args.workers)
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    workers = {}
+    # pid -> worker index; a restarted worker takes over its predecessor's index
+    slots = {}
+    stopping = False
+
+    def spawn(index: int):
+        # Per-worker state on disk (the feature history, the shadow log) is keyed by this index.
+        # Set before the fork so that at-fork hooks in the child already see it.
+        os.environ["ASSISTANT_WORKER_INDEX"] = str(index)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(service.app, sock, args.log_level)
+            finally:
+                os._exit(0)
+        workers[pid] = time.monotonic()
+        slots[pid] = index
+        return pid
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for index in range(args.workers):
+        spawn(index)
+    logger.info("Assistant Service master %d serving http://%s:%d with workers %s", os.getpid(), args.host, args.port, sorted(workers))
+
+    next_report = time.monotonic() + args.report_interval
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if args.report_interval and time.monotonic() >= next_report:
+                logger.info("%s", memory_report(workers))
+                next_report = time.monotonic() + args.report_interval
+            time.sleep(0.2)
+            continue
+
+        started = workers.pop(pid, None)
+        index = slots.pop(pid, None)
+        if stopping or started is None:
+            continue
+        logger.warning("Worker %d exited with status %d; restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < 1.0:
+            # Crashing on startup: avoid a tight fork loop
+            time.sleep(1.0)
+        spawn(index)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Per-process memory figures from /proc (Linux).
+
+- RSS counts every resident page, including pages shared with other processes,
+  so summing RSS across preforked workers overstates their real footprint.
+- USS (unique set size) counts only the process's private pages. It is the
+  memory that would be freed if the process exited.
+- PSS splits each shared page evenly between the processes that map it, so
+  summing PSS across processes gives the total physical memory they use.
+"""
+
+import os
+from typing import Dict, Optional, Union
+
+
+def memory_usage(pid: Union[int, str] = "self") -> Optional[Dict[str, float]]:
+    """
+    RSS, PSS, USS and shared memory of a process in MiB, or None where /proc is unavailable.
+    """
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        return None
+
+    fields: Dict[str, int] = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+
+    def mib(kb: int) -> float:
+        return round(kb / 1024, 1)
+
+    return {
+        "rss_mb": mib(fields.get("Rss", 0)),
+        "pss_mb": mib(fields.get("Pss", 0)),
+        "uss_mb": mib(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+        "shared_mb": mib(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+    }
@@ -0,0 +1,446 @@
+"""
+Resilience for the Assistant Service's calls to the Integrations Service.
+
+Three mechanisms, all in ResilientHttpClient (plus cancellation, below):
+
+- Deadlines. A scoring runs under a deadline (`deadline_scope`, which also
+  honours a caller's X-Request-Deadline-Ms header via DeadlineMiddleware; a
+  request that arrives with no budget left gets a 504 straight away).
+  Every outbound timeout is capped by the time left, and the time left is
+  sent downstream in the same header so the callee stops working on requests
+  nobody is waiting for. The deadline lives in a context variable, which
+  asyncio.to_thread copies into the worker thread running the scoring chain.
+- Hedging. An idempotent GET that has not answered within the dependency's
+  recent latency percentile (default p95) gets a second, identical attempt.
+  The first good response wins. Hedges are capped at a fraction of calls, so
+  a slow dependency cannot double the load on it, and are only sent when a
+  pool thread is idle. The wait for a pool thread counts against the call's
+  deadline, and the hedge delay only starts once the first attempt is sent.
+- Circuit breaking. After `failure_threshold` consecutive failures (transport
+  errors and 5xx), calls fail immediately with CircuitOpenError for
+  `reset_timeout` seconds. Then a single probe call is let through
+  (half-open): success closes the circuit, failure opens it again.
+
+Work done for a client that has gone away (a closed event stream) runs under a
+`cancellation_scope`: once its event is set, no further call is started and
+RequestCancelled is raised instead. A call already on the wire runs out its
+timeout.
+
+The deadline functions, DeadlineMiddleware and CircuitBreaker are the same in
+every service's resilience.py, so a budget means the same thing at each hop.
+"""
+
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Mapping, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Absolute deadline (time.monotonic()) of the request being served, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+deadline_stats = {"with_deadline": 0, "expired_on_arrival": 0}
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Runs the block under a deadline `seconds` from now, or the enclosing one if that is sooner.
+    """
+    current = _deadline.get()
+    deadline = current
+    if seconds is not None and seconds > 0:
+        deadline = time.monotonic() + seconds
+        if current is not None:
+            deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """
+    Seconds left before the current request's deadline (may be negative), or None without one.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_headers() -> Dict[str, str]:
+    """
+    The header telling a downstream service how long the caller will still wait.
+    """
+    remaining = remaining_seconds()
+    return {} if remaining is None else {DEADLINE_HEADER: str(max(0, int(remaining * 1000)))}
+
+
+def deadline_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    The caller's remaining budget in seconds from an X-Request-Deadline-Ms header
+    (0 or less once it has passed), or None without a valid header.
+    """
+    for key, value in headers.items():
+        if key.lower() == DEADLINE_HEADER.lower():
+            try:
+                return int(value) / 1000
+            except ValueError:
+                return None
+    return None
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: runs each request under the deadline its caller sent (if any).
+    A request that arrives with no budget left is answered 504 without running it.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = deadline_from_headers(
+            {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        )
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline_stats["with_deadline"] += 1
+        if budget <= 0:
+            deadline_stats["expired_on_arrival"] += 1
+            body = json.dumps({"detail": "Request deadline already passed"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        with deadline_scope(budget):
+            await self.app(scope, receive, send)
+
+
+# Set when nobody is waiting for the current request's result any more
+_cancelled: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("request_cancelled", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """
+    Raised instead of starting a call when the request's deadline has already passed,
+    or when a hedged call has not answered by then.
+    """
+
+
+class RequestCancelled(requests.exceptions.RequestException):
+    """
+    Raised instead of starting a call once the request it serves was cancelled.
+    """
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised without calling the dependency while its circuit is open.
+    """
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open; failing fast for {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+@contextmanager
+def cancellation_scope(event: threading.Event):
+    """
+    Runs the block so that setting `event` (from any thread) stops further outbound calls.
+    """
+    token = _cancelled.set(event)
+    try:
+        yield event
+    finally:
+        _cancelled.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a single half-open probe. Thread-safe.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"rejected": 0, "opened": 0, "probes": 0}
+
+    def allow(self) -> Optional[float]:
+        """
+        None if the call may proceed (it must then report record_success/record_failure),
+        else the seconds until the next probe.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return None
+            waited = time.monotonic() - self._opened_at
+            if self.state == "open" and waited >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                self.stats["probes"] += 1
+                return None
+            self.stats["rejected"] += 1
+            return max(self.reset_timeout - waited, 0.1)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                **self.stats,
+            }
+
+
+def _is_failure(response: Optional[requests.Response]) -> bool:
+    return response is None or response.status_code >= 500
+
+
+class ResilientHttpClient:
+    """
+    Pooled HTTP client for one dependency: deadline-capped timeouts, hedged GETs and a circuit breaker.
+    """
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        breaker: CircuitBreaker,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.05,
+        hedge_max_ratio: float = 0.1,
+        pool_size: int = 32,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.breaker = breaker
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Hedged GETs run their attempts here (two per call at most)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f"{name}-hedge")
+        self._pool_size = pool_size
+        self._busy = 0
+        self._latencies: Deque[float] = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0, "failures": 0, "deadline_exceeded": 0, "cancelled": 0,
+            "hedged": 0, "hedge_wins": 0, "hedges_skipped_busy": 0,
+        }
+
+    def _timeout(self, timeout: float) -> float:
+        cancelled = _cancelled.get()
+        if cancelled is not None and cancelled.is_set():
+            self.stats["cancelled"] += 1
+            raise RequestCancelled(f"Request was cancelled before calling {self.name}")
+        remaining = remaining_seconds()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            self.stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"Request deadline passed before calling {self.name}")
+        return min(timeout, remaining)
+
+    def _admit(self):
+        retry_after = self.breaker.allow()
+        if retry_after is not None:
+            raise CircuitOpenError(self.name, retry_after)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging: the recent latency percentile (None until there are enough samples).
+        """
+        with self._lock:
+            if len(self._latencies) < 20:
+                return None
+            ordered = sorted(self._latencies)
+        return max(self.hedge_min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))])
+
+    def _may_hedge(self) -> bool:
+        return self.stats["hedged"] < self.hedge_max_ratio * self.stats["calls"]
+
+    def _send(self, url: str, params: Optional[Dict[str, Any]], headers: Dict[str, str], timeout: float) -> requests.Response:
+        started = time.monotonic()
+        response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        if not _is_failure(response):
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+        return response
+
+    def _attempt(self, url, params, headers, deadline: float, started: threading.Event) -> requests.Response:
+        started.set()
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            self.stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"Request deadline passed while waiting to call {self.name}")
+        return self._send(url, params, headers, timeout)
+
+    def _submit(self, url, params, headers, deadline: float, started: threading.Event) -> Future:
+        with self._lock:
+            self._busy += 1
+        attempt = self._executor.submit(self._attempt, url, params, headers, deadline, started)
+        attempt.add_done_callback(self._attempt_done)
+        return attempt
+
+    def _attempt_done(self, attempt: Future):
+        with self._lock:
+            self._busy -= 1
+
+    def _has_idle_thread(self) -> bool:
+        with self._lock:
+            return self._busy < self._pool_size
+
+    def _hedged_get(self, url, params, headers, timeout) -> requests.Response:
+        # One absolute deadline covers the wait for a pool thread as well as the time on the wire
+        deadline = time.monotonic() + timeout
+        started = threading.Event()
+        attempts = [self._submit(url, params, headers, deadline, started)]
+        delay = self.hedge_delay()
+        # The hedge delay counts from when the first attempt is sent, not from when it was queued
+        if delay is not None and started.wait(deadline - time.monotonic()) and time.monotonic() + delay < deadline:
+            done, _ = wait(attempts, timeout=delay)
+            if not done and self._may_hedge():
+                if self._has_idle_thread():
+                    self.stats["hedged"] += 1
+                    attempts.append(self._submit(url, params, headers, deadline, threading.Event()))
+                else:
+                    self.stats["hedges_skipped_busy"] += 1
+
+        # First good response wins; the loser finishes in the background and is dropped
+        pending = set(attempts)
+        fallback: Optional[requests.Response] = None
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                # Drops attempts still waiting for a thread; one on the wire runs out its timeout
+                for attempt in pending:
+                    attempt.cancel()
+                self.stats["deadline_exceeded"] += 1
+                raise DeadlineExceeded(f"{self.name} did not answer before the request deadline")
+            for attempt in done:
+                try:
+                    response = attempt.result()
+                except requests.exceptions.RequestException as e:
+                    error = e
+                    continue
+                if _is_failure(response):
+                    fallback = response
+                    continue
+                if attempt is not attempts[0]:
+                    self.stats["hedge_wins"] += 1
+                return response
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def call(self, send: Callable[[float], Any], timeout: float) -> Any:
+        """
+        Runs `send(timeout)` (any request to this dependency, e.g. a streamed read) under
+        the circuit breaker, with `timeout` capped by the deadline. No hedging.
+        """
+        timeout = self._timeout(timeout)
+        self._admit()
+        self.stats["calls"] += 1
+        try:
+            result = send(timeout)
+        except requests.exceptions.HTTPError as e:
+            self._record(e.response)
+            raise
+        except requests.exceptions.RequestException:
+            self._record(None)
+            raise
+        except BaseException:
+            # Not the dependency's fault (e.g. a parse error): release a half-open probe
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _record(self, response: Optional[requests.Response]):
+        if _is_failure(response):
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        hedge: bool = True,
+    ) -> requests.Response:
+        """
+        GET `path`, hedged unless `hedge` is False (use that for calls with side effects on the callee).
+        Returns the response (the caller checks its status); raises on transport errors.
+        """
+        timeout = self._timeout(timeout)
+        self._admit()
+        self.stats["calls"] += 1
+        headers = {**(headers or {}), **deadline_headers()}
+        url = f"{self.base_url}{path}"
+        response = None
+        try:
+            if hedge:
+                response = self._hedged_get(url, params, headers, timeout)
+            else:
+                response = self._send(url, params, headers, timeout)
+        finally:
+            self._record(response)
+        return response
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            **self.stats,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+            "circuit": self.breaker.snapshot(),
+        }
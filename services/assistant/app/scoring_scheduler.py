@@ -0,0 +1,288 @@
+"""
+Background scoring of registered users.
+
+Registered users are rescored on a fixed cadence. Each run is jittered so that
+users registered together do not all score at the same moment. A fixed pool of
+asyncio workers runs the scoring, so at most `workers` scorings are in flight.
+A change notification (calendar or fitness data changed) moves the user's next
+run forward to "now", after a short debounce that merges bursts of
+notifications into one rescoring. A user is never scored twice concurrently;
+a change that arrives mid-run triggers one more run right after it.
+
+/recommend reads the latest result through `fresh_result()`. It only scores
+synchronously when there is no result younger than `freshness_seconds`.
+
+A user_key can be derived from a self-asserted user_id, so the token the user
+registered with is the proof of ownership. Each result keeps the digest of the
+token it was scored with and is only served to a request carrying that token.
+Re-registering with another token and unregistering require the registered
+token too.
+
+Registrations (including the user's token) are kept in memory only and are
+lost on restart.
+"""
+
+import asyncio
+import heapq
+import hmac
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.action_cooldown import token_digest
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ScoringRegistration:
+    user_key: str
+    user_token: str
+    user_id: Optional[str]
+    interval_seconds: float
+    token_digest: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.token_digest = token_digest(self.user_token)
+
+    def token_matches(self, user_token: str) -> bool:
+        return hmac.compare_digest(self.token_digest, token_digest(user_token))
+
+
+class ScoringScheduler:
+    """
+    Cadence + jitter scheduler with a bounded worker pool and early rescoring on change notifications.
+    """
+    def __init__(
+        self,
+        score: Callable[[ScoringRegistration], Awaitable[Any]],
+        interval_seconds: float = 900.0,
+        jitter_fraction: float = 0.1,
+        workers: int = 4,
+        freshness_seconds: float = 1200.0,
+        notify_debounce_seconds: float = 5.0,
+        max_users: int = 10000,
+    ):
+        self.score = score
+        self.interval_seconds = interval_seconds
+        self.jitter_fraction = jitter_fraction
+        self.workers = workers
+        self.freshness_seconds = freshness_seconds
+        self.notify_debounce_seconds = notify_debounce_seconds
+        self.max_users = max_users
+
+        self._users: Dict[str, ScoringRegistration] = {}
+        # user_key -> (scored_at wall time, digest of the token it was scored with, result)
+        self._results: Dict[str, Tuple[float, str, Any]] = {}
+        # Min-heap of (due, seq, user_key); entries whose due no longer matches _due are stale
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._queue: Optional["asyncio.Queue[str]"] = None
+        self._queued: Set[str] = set()
+        self._running: Set[str] = set()
+        self._rerun: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._durations: List[float] = []
+        self.stats: Dict[str, Any] = {
+            "scored": 0, "failed": 0, "cache_hits": 0, "cache_misses": 0, "token_mismatches": 0,
+            "notifications": Counter(), "early_rescores": 0,
+        }
+
+    # --- Registration ---
+
+    def register(self, user_key: str, user_token: str, user_id: Optional[str] = None,
+                 interval_seconds: Optional[float] = None) -> ScoringRegistration:
+        """
+        Adds (or updates) a user. New users get their first scoring within one jitter window.
+        Raises ValueError once max_users is reached, and PermissionError when the user is
+        already registered with another token.
+        """
+        existing = self._users.get(user_key)
+        if existing is None and len(self._users) >= self.max_users:
+            raise ValueError(f"Scoring registration limit reached ({self.max_users} users)")
+        if existing is not None and not existing.token_matches(user_token):
+            self.stats["token_mismatches"] += 1
+            raise PermissionError("User is registered with a different token")
+        registration = ScoringRegistration(user_key, user_token, user_id, interval_seconds or self.interval_seconds)
+        is_new = existing is None
+        self._users[user_key] = registration
+        if is_new:
+            spread = registration.interval_seconds * self.jitter_fraction
+            self._schedule(user_key, time.monotonic() + random.uniform(0, spread))
+        return registration
+
+    def unregister(self, user_key: str, user_token: str) -> bool:
+        """
+        Removes a user and their result. Returns False for unknown users and raises
+        PermissionError when `user_token` is not the registered one.
+        """
+        registration = self._users.get(user_key)
+        if registration is None:
+            return False
+        if not registration.token_matches(user_token):
+            self.stats["token_mismatches"] += 1
+            raise PermissionError("User is registered with a different token")
+        self._due.pop(user_key, None)
+        self._results.pop(user_key, None)
+        self._rerun.discard(user_key)
+        return self._users.pop(user_key, None) is not None
+
+    def is_registered(self, user_key: str) -> bool:
+        return user_key in self._users
+
+    def next_run_in(self, user_key: str) -> Optional[float]:
+        due = self._due.get(user_key)
+        return max(0.0, due - time.monotonic()) if due is not None else None
+
+    # --- Change notifications ---
+
+    def notify_change(self, user_key: str, source: str) -> bool:
+        """
+        Moves the user's next scoring forward (after the debounce). Returns False for unknown users.
+        """
+        self.stats["notifications"][source] += 1
+        if user_key not in self._users:
+            return False
+        if user_key in self._running:
+            self._rerun.add(user_key)
+        else:
+            self._schedule(user_key, time.monotonic() + self.notify_debounce_seconds, earliest=True)
+        self.stats["early_rescores"] += 1
+        return True
+
+    # --- Results ---
+
+    def fresh_result(self, user_key: str, user_token: str) -> Optional[Any]:
+        """
+        The latest result if it is younger than freshness_seconds and was scored with
+        `user_token`, else None (counted as a miss).
+        """
+        entry = self._results.get(user_key)
+        if entry is not None and time.time() - entry[0] <= self.freshness_seconds:
+            if hmac.compare_digest(entry[1], token_digest(user_token)):
+                self.stats["cache_hits"] += 1
+                return entry[2]
+            self.stats["token_mismatches"] += 1
+        self.stats["cache_misses"] += 1
+        return None
+
+    def record_result(self, user_key: str, user_token: str, result: Any):
+        """
+        Stores a result scored outside the scheduler (a synchronous /recommend) for a
+        registered user, if it was scored with the registered token.
+        """
+        registration = self._users.get(user_key)
+        if registration is not None and registration.token_matches(user_token):
+            self._results[user_key] = (time.time(), registration.token_digest, result)
+
+    # --- Scheduling internals ---
+
+    def _jittered_interval(self, registration: ScoringRegistration) -> float:
+        jitter = registration.interval_seconds * self.jitter_fraction
+        return registration.interval_seconds + random.uniform(-jitter, jitter)
+
+    def _schedule(self, user_key: str, due: float, earliest: bool = False):
+        current = self._due.get(user_key)
+        if earliest and current is not None and current <= due:
+            return
+        self._due[user_key] = due
+        heapq.heappush(self._heap, (due, next(self._seq), user_key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _enqueue(self, user_key: str):
+        if user_key in self._running:
+            self._rerun.add(user_key)
+        elif user_key not in self._queued:
+            self._queued.add(user_key)
+            self._queue.put_nowait(user_key)
+
+    async def _dispatch_due(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, user_key = heapq.heappop(self._heap)
+                if self._due.get(user_key) != due:
+                    continue
+                del self._due[user_key]
+                self._enqueue(user_key)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self):
+        while True:
+            user_key = await self._queue.get()
+            self._queued.discard(user_key)
+            registration = self._users.get(user_key)
+            if registration is None:
+                continue
+
+            self._running.add(user_key)
+            started = time.perf_counter()
+            try:
+                result = await self.score(registration)
+                if self._users.get(user_key) is registration:
+                    self._results[user_key] = (time.time(), registration.token_digest, result)
+                self.stats["scored"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning("Background scoring failed for %s: %s", user_key, e)
+            finally:
+                self._running.discard(user_key)
+                self._durations.append(time.perf_counter() - started)
+                del self._durations[:-1000]
+
+            if user_key in self._users:
+                if user_key in self._rerun:
+                    self._rerun.discard(user_key)
+                    self._schedule(user_key, time.monotonic())
+                else:
+                    self._schedule(user_key, time.monotonic() + self._jittered_interval(registration))
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._queued.clear()
+        self._tasks = [asyncio.create_task(self._dispatch_due())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        durations = sorted(self._durations)
+        now = time.time()
+        fresh = sum(1 for scored_at, _, _ in self._results.values() if now - scored_at <= self.freshness_seconds)
+        lookups = self.stats["cache_hits"] + self.stats["cache_misses"]
+        return {
+            **self.stats,
+            "notifications": dict(self.stats["notifications"]),
+            "registered_users": len(self._users),
+            "fresh_results": fresh,
+            "queued": len(self._queued),
+            "running": len(self._running),
+            "workers": self.workers,
+            "interval_seconds": self.interval_seconds,
+            "freshness_seconds": self.freshness_seconds,
+            "hit_ratio": round(self.stats["cache_hits"] / lookups, 3) if lookups else 0.0,
+            "scoring_seconds": {
+                "p50": round(durations[len(durations) // 2], 3) if durations else 0.0,
+                "max": round(durations[-1], 3) if durations else 0.0,
+            },
+        }
@@ -0,0 +1,208 @@
+"""
+Shadow scoring: compares candidate Decision Engines against the live one on real traffic.
+
+After the live model has scored a request, a sampled fraction of feature
+vectors is handed to `submit()`, which only enqueues them. A background thread
+runs every candidate on the vector, so the response never waits for it. The
+queue is bounded; when the candidates cannot keep up, samples are dropped and
+counted instead of growing memory.
+
+For each candidate the scorer keeps:
+- the agreement rate with the live stress level,
+- the distribution of the stress-level delta (candidate - live),
+- inference latency, next to the live model's latency on the same samples.
+
+Every comparison is also appended as one JSON line to a size-rotated local log
+(`path`, `path.1`, ... `path.N`) for offline analysis with tools/shadow_report.py.
+A rotating log must have a single writer, so each preforked worker reopens its
+own log after the fork, named after ASSISTANT_WORKER_INDEX
+(shadow_scoring.worker-1.jsonl, ...).
+Records carry the features, levels and latencies and the trace id, but no user
+identifiers or tokens.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter, deque
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Deque, Dict, Optional
+
+
+def _percentile(samples, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+
+class _ModelComparison:
+    """
+    Running comparison of one candidate with the live model.
+    """
+    def __init__(self):
+        self.compared = 0
+        self.agreed = 0
+        self.errors = 0
+        self.delta_sum = 0
+        self.abs_delta_sum = 0
+        self.deltas: Counter = Counter()
+        self.latencies_ms: Deque[float] = deque(maxlen=1000)
+
+    def record(self, delta: int, latency_ms: float):
+        self.compared += 1
+        self.agreed += delta == 0
+        self.delta_sum += delta
+        self.abs_delta_sum += abs(delta)
+        self.deltas[delta] += 1
+        self.latencies_ms.append(latency_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        n = self.compared
+        return {
+            "compared": n,
+            "errors": self.errors,
+            "agreement_rate": round(self.agreed / n, 4) if n else None,
+            "mean_delta": round(self.delta_sum / n, 3) if n else None,
+            "mean_abs_delta": round(self.abs_delta_sum / n, 3) if n else None,
+            "delta_histogram": {str(delta): count for delta, count in sorted(self.deltas.items())},
+            "latency_ms": {"p50": _percentile(self.latencies_ms, 0.5), "p95": _percentile(self.latencies_ms, 0.95)},
+        }
+
+
+class ShadowScorer:
+    """
+    Mirrors a sample of scored feature vectors to candidate models off the request path.
+    """
+    def __init__(
+        self,
+        candidates: Dict[str, Any],
+        predict: Callable[[Any, Dict[str, float]], int],
+        sample_rate: float = 0.1,
+        log_path: Optional[str] = "shadow_scoring.jsonl",
+        log_max_bytes: int = 10 * 1024 * 1024,
+        log_backups: int = 5,
+        max_queue: int = 1000,
+    ):
+        self.candidates = candidates
+        self.predict = predict
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._comparisons = {name: _ModelComparison() for name in candidates}
+        self._live_latencies_ms: Deque[float] = deque(maxlen=1000)
+        self.stats = {"offered": 0, "sampled": 0, "dropped": 0, "log_errors": 0}
+
+        self.log_max_bytes = log_max_bytes
+        self.log_backups = log_backups
+        self._log: Optional[logging.Logger] = None
+        if candidates and log_path:
+            self._log = logging.getLogger(f"shadow_scoring.{id(self)}")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            self._open_log()
+
+        self._thread: Optional[threading.Thread] = None
+        if candidates:
+            self._start_thread()
+            # Preforked workers (app/prefork.py) need their own thread and log file
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.candidates)
+
+    def _open_log(self):
+        worker_index = os.getenv("ASSISTANT_WORKER_INDEX")
+        if worker_index:
+            root, ext = os.path.splitext(self.log_path)
+            self.log_path = f"{root}.worker-{worker_index}{ext}"
+        handler = RotatingFileHandler(
+            self.log_path, maxBytes=self.log_max_bytes, backupCount=self.log_backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._log.addHandler(handler)
+
+    def _after_fork(self):
+        if self._log is not None:
+            # The inherited handler shares the master's file; rotating it from several workers loses records
+            for handler in list(self._log.handlers):
+                self._log.removeHandler(handler)
+                handler.close()
+            self._open_log()
+        self._start_thread()
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+        self._thread.start()
+
+    def submit(self, features: Dict[str, float], live_level: int, live_latency_ms: float,
+               trace_id: Optional[str] = None) -> bool:
+        """
+        Offers one live scoring for comparison. Never blocks; returns True if it was sampled and queued.
+        """
+        if not self.candidates:
+            return False
+        self.stats["offered"] += 1
+        if random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait({
+                "features": dict(features),
+                "live_level": live_level,
+                "live_latency_ms": live_latency_ms,
+                "trace_id": trace_id,
+                "timestamp": time.time(),
+            })
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["sampled"] += 1
+        return True
+
+    def _compare(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        record = {**sample, "live_latency_ms": round(sample["live_latency_ms"], 3), "candidates": {}}
+        self._live_latencies_ms.append(sample["live_latency_ms"])
+        for name, engine in self.candidates.items():
+            comparison = self._comparisons[name]
+            started = time.perf_counter()
+            try:
+                level = int(self.predict(engine, sample["features"]))
+            except Exception as e:
+                comparison.errors += 1
+                record["candidates"][name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            latency_ms = (time.perf_counter() - started) * 1000
+            delta = level - sample["live_level"]
+            comparison.record(delta, latency_ms)
+            record["candidates"][name] = {"level": level, "delta": delta, "latency_ms": round(latency_ms, 3)}
+        return record
+
+    def _run(self):
+        while True:
+            record = self._compare(self._queue.get())
+            if self._log is not None:
+                try:
+                    self._log.info(json.dumps(record))
+                except Exception:
+                    self.stats["log_errors"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.candidates:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "sample_rate": self.sample_rate,
+            "log_path": self.log_path,
+            "backlog": self._queue.qsize(),
+            **self.stats,
+            "live_latency_ms": {
+                "p50": _percentile(self._live_latencies_ms, 0.5), "p95": _percentile(self._live_latencies_ms, 0.95)
+            },
+            "models": {name: comparison.snapshot() for name, comparison in self._comparisons.items()},
+        }
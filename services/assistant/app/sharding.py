@@ -0,0 +1,312 @@
+"""
+User-affinity sharding across Assistant replicas.
+
+Per-user state lives in each replica's memory: the payload and feature cache,
+email urgency watermarks, action cooldowns, precomputed scoring results.
+Round-robin load balancing spreads a user's requests over every replica, so
+each replica builds up (and misses on) its own copy of that state. With
+sharding, every request for a user is served by one owner replica:
+
+- HashRing maps a user key to a node by consistent hashing. Each node owns
+  `vnodes` points on a 64-bit ring, and a key belongs to the first point at or
+  after its hash. When one of N nodes joins or leaves, only about 1/N of the
+  users change owner.
+- ShardRoutingMiddleware runs in every replica (library mode). It reads the
+  user from user-scoped requests and forwards the ones this replica does not
+  own to the owner, streaming the owner's response back (server-sent events
+  included). A replica that is not in the node list itself forwards every
+  user-scoped request, and can be deployed as a plain routing layer in front
+  of the others.
+
+Forwarded requests carry X-Shard-Forwarded-By and are served wherever they
+land, so replicas whose node lists disagree cannot bounce a request between
+them. If the owner cannot be reached, the request is served locally and the
+owner is skipped for `retry_seconds`.
+
+Closing a forwarded stream closes the forwarded request, so the owner stops
+scoring for a client that has gone.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import unquote
+
+import httpx
+
+from app.action_cooldown import user_key_for
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_HEADER = "X-Shard-Forwarded-By"
+OWNER_HEADER = "X-Shard-Owner"
+
+# Endpoints that act on one user's state, by (method, path)
+SHARDED_ROUTES = {
+    ("POST", "/api/v1/recommend"),
+    ("POST", "/api/v1/recommend/stream"),
+    ("POST", "/api/v1/scoring/users"),
+    ("POST", "/api/v1/scoring/notify"),
+}
+SCORING_USER_PREFIX = "/api/v1/scoring/users/"
+
+_HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade",
+}
+# Set again by the forwarding client for the owner
+_NOT_FORWARDED = _HOP_BY_HOP | {"host", "content-length"}
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring of nodes with virtual nodes.
+    """
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 160):
+        self.vnodes = vnodes
+        self._nodes = set()
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self._nodes.add(node)
+        self._rebuild()
+
+    def _rebuild(self):
+        points = sorted((_ring_hash(f"{node}#{i}"), node) for node in self._nodes for i in range(self.vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str):
+        if node not in self._nodes:
+            self._nodes.add(node)
+            self._rebuild()
+
+    def remove(self, node: str):
+        if node in self._nodes:
+            self._nodes.discard(node)
+            self._rebuild()
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        The node that owns `key`, or None for an empty ring.
+        """
+        if not self._points:
+            return None
+        index = bisect.bisect_left(self._points, _ring_hash(key))
+        return self._owners[index % len(self._owners)]
+
+
+def shard_key(method: str, path: str, headers: Dict[str, str], body: bytes) -> Optional[str]:
+    """
+    The user key a user-scoped request acts on (as user_key_for derives it), or None.
+    `headers` has lower-case names.
+    """
+    if method == "DELETE" and path.startswith(SCORING_USER_PREFIX):
+        return unquote(path[len(SCORING_USER_PREFIX):]) or None
+    # Google push notifications name the user in their channel token
+    if headers.get("x-goog-channel-token"):
+        return headers["x-goog-channel-token"]
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if payload.get("user_key"):
+        return str(payload["user_key"])
+    user_token = payload.get("user_token")
+    # Not stripped: the endpoints derive the key from the token as sent
+    if isinstance(user_token, str) and user_token.strip():
+        return user_key_for(payload.get("user_id"), user_token)
+    if payload.get("user_id"):
+        return f"id:{payload['user_id']}"
+    return None
+
+
+class ShardRouter:
+    """
+    The ring, this replica's place in it, and the client that forwards to the other replicas.
+    """
+    def __init__(
+        self,
+        nodes: Iterable[str],
+        self_node: Optional[str],
+        vnodes: int = 160,
+        forward_timeout: float = 30.0,
+        connect_timeout: float = 1.0,
+        retry_seconds: float = 5.0,
+        wrap_transport: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None
+    ):
+        self.ring = HashRing([node.rstrip("/") for node in nodes], vnodes=vnodes)
+        self.self_node = self_node.rstrip("/") if self_node else None
+        self.forward_timeout = forward_timeout
+        self.connect_timeout = connect_timeout
+        self.retry_seconds = retry_seconds
+        self._wrap_transport = wrap_transport
+        self._client: Optional[httpx.AsyncClient] = None
+        # Owner -> time.monotonic() until which it is not tried again
+        self._down_until: Dict[str, float] = {}
+        self.stats = {
+            "served_local": 0, "served_forwarded": 0, "forwarded": 0,
+            "owner_unreachable": 0, "owner_skipped": 0, "forward_errors": 0, "client_disconnects": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.ring.nodes)
+
+    def is_sharded(self, method: str, path: str) -> bool:
+        return (method, path) in SHARDED_ROUTES or (method == "DELETE" and path.startswith(SCORING_USER_PREFIX))
+
+    def owner(self, user_key: str) -> Optional[str]:
+        return self.ring.owner(user_key)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        transport = httpx.AsyncHTTPTransport()
+        if self._wrap_transport is not None:
+            transport = self._wrap_transport(transport)
+        self._client = httpx.AsyncClient(
+            transport=transport, timeout=httpx.Timeout(self.forward_timeout, connect=self.connect_timeout)
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def forward(self, owner: str, scope, headers: Dict[str, str], body: bytes, receive, send) -> bool:
+        """
+        Relays the request to `owner` and its response to the client.
+        Returns False (nothing sent) if the owner could not be reached.
+        """
+        if self._client is None or self._down_until.get(owner, 0) > time.monotonic():
+            self.stats["owner_skipped"] += 1
+            return False
+        query = scope.get("query_string", b"").decode("latin-1")
+        request = self._client.build_request(
+            scope["method"],
+            f"{owner}{scope['path']}" + (f"?{query}" if query else ""),
+            headers={
+                **{name: value for name, value in headers.items() if name not in _NOT_FORWARDED},
+                FORWARDED_HEADER: self.self_node or "router",
+            },
+            content=body
+        )
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.TransportError as e:
+            self.stats["owner_unreachable"] += 1
+            self._down_until[owner] = time.monotonic() + self.retry_seconds
+            logger.warning("Shard owner %s unreachable (%r); serving locally for %ss", owner, e, self.retry_seconds)
+            return False
+        self._down_until.pop(owner, None)
+        self.stats["forwarded"] += 1
+
+        async def relay():
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in response.headers.multi_items()
+                    if name.lower() not in _HOP_BY_HOP
+                ] + [(OWNER_HEADER.lower().encode("latin-1"), owner.encode("latin-1"))],
+            })
+            try:
+                async for chunk in response.aiter_raw():
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            except httpx.HTTPError as e:
+                # Too late to serve locally: end the response where the owner left off
+                self.stats["forward_errors"] += 1
+                logger.warning("Forwarded response from %s broke off: %r", owner, e)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+        async def client_disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        relaying = asyncio.ensure_future(relay())
+        disconnect = asyncio.ensure_future(client_disconnected())
+        try:
+            await asyncio.wait({relaying, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if not relaying.done():
+                self.stats["client_disconnects"] += 1
+                relaying.cancel()
+            else:
+                relaying.result()
+        finally:
+            disconnect.cancel()
+            relaying.cancel()
+            await response.aclose()
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "nodes": self.ring.nodes,
+            "self": self.self_node,
+            "vnodes": self.ring.vnodes,
+            "owners_down": sorted(owner for owner, until in self._down_until.items() if until > now),
+        }
+
+
+class ShardRoutingMiddleware:
+    """
+    ASGI middleware: serves user-scoped requests this replica owns and forwards the rest to their owner.
+    """
+    def __init__(self, app, router: ShardRouter):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        router = self.router
+        if scope["type"] != "http" or not router.enabled or not router.is_sharded(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        if FORWARDED_HEADER.lower() in headers:
+            router.stats["served_forwarded"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        user_key = shard_key(scope["method"], scope["path"], headers, body)
+        owner = router.owner(user_key) if user_key else None
+        if owner is not None and owner != router.self_node:
+            if await router.forward(owner, scope, headers, body, receive, send):
+                return
+        router.stats["served_local"] += 1
+        await self.app(scope, replay, send)
@@ -0,0 +1,339 @@
+"""
+Lightweight request tracing with W3C trace context propagation.
+
+Every incoming request gets a server span. If the request has a `traceparent`
+header, the span continues that trace; otherwise it starts a new one. Code
+opens child spans with `tracer.span(name)`. Outbound calls carry the current
+span in their own `traceparent` header: use `inject(headers)` for requests and
+TracingTransport for httpx clients. Together the Assistant, Actions and
+Integrations spans of one /recommend call share a single trace id.
+
+Finished spans are exported from a background thread. Configuration:
+    TRACE_EXPORTER       none (default) | jsonl | collector
+    TRACE_JSONL_PATH     output file for the jsonl exporter (default traces.jsonl)
+    TRACE_COLLECTOR_URL  collector endpoint that accepts POSTed JSON arrays of spans
+                         (default http://localhost:4319/v1/spans, see tools/trace_waterfall.py)
+    TRACE_SAMPLE_RATE    fraction of new traces that are recorded (default 1.0)
+
+When the exporter is "none", no spans are created and nothing is propagated.
+tools/trace_waterfall.py rebuilds per-request waterfalls from the exported spans.
+
+Every service has an identical copy of this file in its app package; change
+all three together (services/assistant/tests/test_shared_modules.py checks).
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "http://localhost:4319/v1/spans")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Parses a W3C traceparent header into (trace_id, parent_span_id, sampled).
+    """
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class Span:
+    """
+    One timed operation. Only sampled spans are exported.
+    """
+    __slots__ = ("name", "service", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "attributes", "status", "start_time", "_started")
+
+    def __init__(self, name: str, service: str, kind: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.name = name
+        self.service = service
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_record(self, duration: float) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": self.service,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": round(duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """
+    Stand-in yielded when tracing is off, so callers never need to check.
+    """
+    sampled = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """
+    Writes finished spans to a JSONL file or POSTs them to a collector, in batches, off the request path.
+    Spans are dropped (and counted) if the buffer is full.
+    """
+    def __init__(self, mode: str, path: str, collector_url: str, max_queue: int = 10000, batch_size: int = 256):
+        self.mode = mode
+        self.path = path
+        self.collector_url = collector_url
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self.stats = {"exported": 0, "dropped": 0, "export_errors": 0}
+        self._start_thread()
+        atexit.register(self.flush)
+        # Threads do not survive fork(); preforked workers need their own exporter thread
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start_thread)
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, record: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _drain(self, block: bool) -> list:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=1.0) if block else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch: list):
+        if not batch:
+            return
+        try:
+            if self.mode == "jsonl":
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(record) + "\n" for record in batch))
+            else:
+                request = urllib.request.Request(
+                    self.collector_url,
+                    data=json.dumps(batch).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST"
+                )
+                urllib.request.urlopen(request, timeout=2).close()
+            self.stats["exported"] += len(batch)
+        except Exception as e:
+            self.stats["export_errors"] += 1
+            logger.warning("Span export failed (%d spans dropped): %s", len(batch), e)
+
+    def _run(self):
+        while True:
+            self._write(self._drain(block=True))
+
+    def flush(self):
+        """
+        Exports everything still buffered (called at interpreter exit).
+        """
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+
+class Tracer:
+    """
+    Creates spans for one service and hands finished, sampled spans to the exporter.
+    """
+    def __init__(self, service: str, exporter: Optional[str] = None, sample_rate: Optional[float] = None):
+        self.service = service
+        mode = (exporter or TRACE_EXPORTER).lower()
+        self.sample_rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.exporter = SpanExporter(mode, TRACE_JSONL_PATH, TRACE_COLLECTOR_URL) if mode in ("jsonl", "collector") else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: str = "internal",
+        remote_parent: Optional[Tuple[str, str, bool]] = None,
+        **attributes: Any
+    ) -> Iterator[Any]:
+        """
+        Times the enclosed block as a child of the current span, of `remote_parent`
+        (from an incoming traceparent), or as the root of a new trace.
+        Exceptions are recorded on the span and re-raised.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        if remote_parent is not None:
+            trace_id, parent_id, sampled = remote_parent
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id, sampled = secrets.token_hex(16), None, random.random() < self.sample_rate
+
+        span = Span(name, self.service, kind, trace_id, parent_id, sampled)
+        span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            if span.sampled:
+                self.exporter.export(span.to_record(time.perf_counter() - span._started))
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"exporter": "none"}
+        return {
+            "exporter": self.exporter.mode,
+            "sample_rate": self.sample_rate,
+            "buffered": self.exporter._queue.qsize(),
+            **self.exporter.stats,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def inject(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Returns a copy of `headers` carrying the current span's traceparent, if any.
+    """
+    headers = dict(headers or {})
+    span = _current_span.get()
+    if span is not None:
+        headers["traceparent"] = span.traceparent()
+    return headers
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: wraps each HTTP request in a server span continued from its
+    traceparent header, and echoes the span's traceparent on the response.
+    """
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers", []):
+            if key == b"traceparent":
+                incoming = parse_traceparent(value.decode("latin-1"))
+                break
+
+        with self.tracer.span(f"{scope['method']} {scope['path']}", kind="server", remote_parent=incoming) as span:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.status = "error"
+                    message = {
+                        **message,
+                        "headers": list(message.get("headers", [])) + [(b"traceparent", span.traceparent().encode("latin-1"))],
+                    }
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+
+
+if httpx is not None:
+    class TracingTransport(httpx.AsyncBaseTransport):
+        """
+        httpx transport wrapper: records a client span per request and propagates it downstream.
+        """
+        def __init__(self, tracer: Tracer, transport: httpx.AsyncBaseTransport):
+            self.tracer = tracer
+            self.transport = transport
+
+        async def handle_async_request(self, request):
+            with self.tracer.span(f"{request.method} {request.url.path}", kind="client", peer=request.url.host) as span:
+                if span is not NOOP_SPAN:
+                    request.headers["traceparent"] = span.traceparent()
+                response = await self.transport.handle_async_request(request)
+                span.set_attribute("http.status_code", response.status_code)
+                return response
+
+        async def aclose(self):
+            await self.transport.aclose()
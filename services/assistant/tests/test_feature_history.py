@@ -0,0 +1,165 @@
+"""
+Ring arithmetic of the memory-mapped feature history.
+"""
+
+import numpy as np
+import pytest
+
+from app.feature_history import (
+    FEATURES,
+    LOOKAHEAD_HOURS,
+    RING_HOURS,
+    FeatureHistoryStore,
+    hour_of,
+    hourly_busy_minutes,
+    hourly_means,
+)
+
+BUSY = FEATURES.index("busy_minutes")
+HEART_RATE = FEATURES.index("heart_rate")
+NOW = 500_000 * 3600.0
+NOW_HOUR = hour_of(NOW)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.feature_history.time.time", lambda: NOW)
+    history = FeatureHistoryStore(str(tmp_path), max_users=4)
+    yield history
+    history.flush()
+
+
+def busy_sum(store, hours, now=NOW):
+    sums, _, _ = store.window("u", hours, now)
+    return sums[BUSY]
+
+
+def test_window_sums_recorded_hours(store):
+    store.record("u", {NOW_HOUR - h: {"busy_minutes": 10.0} for h in range(48)})
+
+    assert busy_sum(store, 24) == 240.0
+    assert busy_sum(store, 48) == 480.0
+    sums, counts, covered = store.window("u", 7 * 24, NOW)
+    assert sums[BUSY] == 480.0
+    assert counts[BUSY] == 48
+    assert covered == 48
+
+
+def test_rewriting_an_hour_replaces_its_value(store):
+    store.record("u", {NOW_HOUR - 2: {"busy_minutes": 30.0}, NOW_HOUR: {"busy_minutes": 5.0}})
+    store.record("u", {NOW_HOUR - 2: {"busy_minutes": 45.0}})
+
+    assert busy_sum(store, 24) == 50.0
+    assert busy_sum(store, 2) == 5.0
+
+
+def test_accumulated_features_add_up(store):
+    store.record("u", {NOW_HOUR: {"urgent_emails": 2.0}}, accumulate=["urgent_emails"])
+    store.record("u", {NOW_HOUR: {"urgent_emails": 1.0}}, accumulate=["urgent_emails"])
+
+    sums, counts, _ = store.window("u", 24, NOW)
+    assert sums[FEATURES.index("urgent_emails")] == 3.0
+    assert counts[FEATURES.index("urgent_emails")] == 1
+
+
+def test_none_marks_an_hour_without_data(store):
+    store.record("u", {NOW_HOUR - 1: {"heart_rate": 60.0}, NOW_HOUR: {"heart_rate": 80.0}})
+    store.record("u", {NOW_HOUR: {"heart_rate": None}})
+
+    sums, counts, _ = store.window("u", 24, NOW)
+    assert sums[HEART_RATE] == 60.0
+    assert counts[HEART_RATE] == 1
+
+
+def test_hours_before_the_first_one_are_prepended(store):
+    store.record("u", {NOW_HOUR: {"busy_minutes": 10.0}})
+    store.record("u", {NOW_HOUR - 5: {"busy_minutes": 20.0}})
+
+    assert busy_sum(store, 24) == 30.0
+    assert store.window("u", 24, NOW)[2] == 6
+
+
+def test_hours_beyond_the_lookahead_are_dropped(store):
+    store.record("u", {
+        NOW_HOUR: {"busy_minutes": 10.0},
+        NOW_HOUR + LOOKAHEAD_HOURS: {"busy_minutes": 20.0},
+        NOW_HOUR + LOOKAHEAD_HOURS + 1: {"busy_minutes": 40.0},
+    })
+
+    assert store.stats["future_hours_dropped"] == 1
+    assert busy_sum(store, 24) == 10.0
+    # The 30-day window ending now is still inside the ring
+    assert busy_sum(store, 30 * 24) == 10.0
+    assert busy_sum(store, 24, now=(NOW_HOUR + LOOKAHEAD_HOURS) * 3600.0) == 20.0
+
+
+def test_advancing_past_the_ring_carries_the_total_forward(store):
+    store.record("u", {NOW_HOUR - RING_HOURS - 10: {"busy_minutes": 15.0}})
+    store.record("u", {NOW_HOUR: {"busy_minutes": 5.0}})
+
+    # The old hour is outside every window but still part of the cumulative total
+    assert busy_sum(store, 30 * 24) == 5.0
+    assert busy_sum(store, 24) == 5.0
+
+
+def test_hours_that_left_the_ring_are_dropped(store):
+    store.record("u", {NOW_HOUR: {"busy_minutes": 5.0}})
+    oldest = NOW_HOUR - RING_HOURS + 1
+
+    store.record("u", {oldest: {"busy_minutes": 1.0}, oldest + 1: {"busy_minutes": 2.0}})
+
+    assert store.stats["stale_hours_dropped"] == 1
+    assert busy_sum(store, 30 * 24) == 5.0
+
+
+def test_cumulative_refuses_hours_older_than_the_ring(store):
+    store.record("u", {NOW_HOUR - RING_HOURS - 10: {"busy_minutes": 15.0}})
+    store.record("u", {NOW_HOUR: {"busy_minutes": 5.0}})
+    row = store._rows["u"]
+
+    store._cumulative(row, NOW_HOUR - RING_HOURS + 1)
+    with pytest.raises(ValueError):
+        store._cumulative(row, NOW_HOUR - RING_HOURS)
+
+
+def test_window_in_the_past_is_shortened_to_the_ring(store):
+    store.record("u", {NOW_HOUR - h: {"busy_minutes": 1.0} for h in range(RING_HOURS + 100)})
+    past = (NOW_HOUR - 100) * 3600.0
+
+    sums, _, covered = store.window("u", 30 * 24, past)
+    assert covered == RING_HOURS - 101
+    assert sums[BUSY] == RING_HOURS - 101
+    assert store.window("u", 24, (NOW_HOUR - RING_HOURS) * 3600.0) is None
+
+
+def test_history_survives_reopening(store, tmp_path):
+    store.record("u", {NOW_HOUR: {"busy_minutes": 25.0}})
+    store.flush()
+
+    reopened = FeatureHistoryStore(str(tmp_path), max_users=4)
+    assert reopened.window("u", 24, NOW)[0][BUSY] == 25.0
+
+
+def test_least_recently_updated_user_is_evicted(store, monkeypatch):
+    for i in range(4):
+        monkeypatch.setattr("app.feature_history.time.time", lambda i=i: NOW + i)
+        store.record(f"user-{i}", {NOW_HOUR: {"busy_minutes": 1.0}})
+    store.record("user-4", {NOW_HOUR: {"busy_minutes": 1.0}})
+
+    assert store.stats["evicted_users"] == 1
+    assert store.window("user-0", 24, NOW) is None
+    assert store.window("user-4", 24, NOW) is not None
+
+
+def test_hourly_busy_minutes_splits_events_across_hours():
+    start = NOW_HOUR * 3600.0 + 30 * 60
+    minutes = hourly_busy_minutes(np.array([start]), np.array([start + 90 * 60]), NOW_HOUR, NOW_HOUR + 2)
+
+    assert minutes == {NOW_HOUR: 30.0, NOW_HOUR + 1: 60.0, NOW_HOUR + 2: 0.0}
+
+
+def test_hourly_means_skips_hours_without_samples():
+    times = np.array([NOW, NOW + 60, NOW + 2 * 3600])
+    means = hourly_means(times, np.array([60.0, 80.0, 90.0]), NOW_HOUR, NOW_HOUR + 2)
+
+    assert means == {NOW_HOUR: 70.0, NOW_HOUR + 1: None, NOW_HOUR + 2: 90.0}
@@ -0,0 +1,150 @@
+"""
+Prediction log replay, team ownership and incremental rollups.
+"""
+
+import json
+
+import pytest
+
+from app.prediction_store import ALL_TEAMS, DEFAULT_TEAM, PredictionStore
+
+NOW = 1_800_000_000.0
+OWNER_A = "a" * 32
+OWNER_B = "b" * 32
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr("app.prediction_store.time.time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "predictions.jsonl")
+
+
+@pytest.fixture
+def store(log_path, clock):
+    prediction_store = PredictionStore(log_path, high_stress_level=7)
+    yield prediction_store
+    prediction_store.close()
+
+
+def current(store, team=ALL_TEAMS, granularity="hour"):
+    return store.rollup(team, granularity, buckets=1)[0]
+
+
+def test_rollup_aggregates_predictions_in_the_bucket(store):
+    store.record("u1", 3)
+    store.record("u1", 8)
+    store.record("u2", 4)
+
+    bucket = current(store)
+    assert bucket["predictions"] == 3
+    assert bucket["mean_stress_level"] == 5.0
+    assert bucket["histogram"] == {"3": 1, "4": 1, "8": 1}
+    assert bucket["users"] == 2
+    assert bucket["high_stress_users"] == 1
+
+
+def test_predictions_roll_up_under_the_users_team(store):
+    assert store.assign_team("u1", "platform", OWNER_A)
+    store.record("u1", 6)
+    store.record("u2", 2)
+
+    assert current(store, "platform")["predictions"] == 1
+    assert current(store, DEFAULT_TEAM)["predictions"] == 1
+    assert current(store)["predictions"] == 2
+    assert store.teams() == {"platform": 1}
+
+
+def test_rollup_returns_empty_buckets_oldest_first(store, clock):
+    store.record("u1", 5)
+    clock[0] += 2 * 3600
+    store.record("u1", 7)
+
+    buckets = store.rollup(ALL_TEAMS, "hour", buckets=3)
+    assert [bucket["predictions"] for bucket in buckets] == [1, 0, 1]
+    assert buckets[1]["mean_stress_level"] is None
+    assert current(store, granularity="day")["predictions"] == 2
+
+
+def test_unknown_granularity_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.rollup(ALL_TEAMS, "week")
+
+
+def test_buckets_outside_the_retention_are_dropped(log_path, clock):
+    store = PredictionStore(log_path, hourly_buckets=2)
+    store.record("u1", 5)
+    clock[0] += 3 * 3600
+    store.record("u1", 6)
+
+    assert store.snapshot()["hourly_buckets"] == 2
+    assert [bucket["predictions"] for bucket in store.rollup(ALL_TEAMS, "hour", buckets=2)] == [0, 1]
+    store.close()
+
+
+def test_team_can_only_be_changed_by_its_owner(store):
+    assert store.assign_team("u1", "platform", OWNER_A)
+
+    assert not store.assign_team("u1", "sales", OWNER_B)
+    assert store.assign_team("u1", "mobile", OWNER_A)
+    store.record("u1", 5)
+
+    assert current(store, "mobile")["predictions"] == 1
+    assert store.snapshot()["team_changes_refused"] == 1
+
+
+def test_restart_rebuilds_rollups_and_owners_from_the_log(store, log_path, clock):
+    store.assign_team("u1", "platform", OWNER_A)
+    store.record("u1", 9)
+    store.record("u2", 1)
+
+    restarted = PredictionStore(log_path)
+    assert current(restarted, "platform") == current(store, "platform")
+    assert current(restarted) == current(store)
+    assert not restarted.assign_team("u1", "sales", OWNER_B)
+    restarted.close()
+
+
+def test_workers_sharing_a_log_see_each_others_predictions(store, log_path):
+    other_worker = PredictionStore(log_path)
+    store.record("u1", 4)
+    other_worker.record("u2", 8)
+
+    assert current(store)["predictions"] == 2
+    assert current(other_worker)["predictions"] == 2
+    # The first claim in the log wins on every worker
+    assert store.assign_team("u3", "platform", OWNER_A)
+    assert not other_worker.assign_team("u3", "sales", OWNER_B)
+    other_worker.close()
+
+
+def test_replay_ignores_team_records_of_another_owner(log_path, clock):
+    records = [
+        {"type": "team", "ts": NOW, "user_key": "u1", "team": "platform", "owner": OWNER_A},
+        {"type": "team", "ts": NOW, "user_key": "u1", "team": "sales", "owner": OWNER_B},
+        {"type": "prediction", "ts": NOW, "user_key": "u1", "team": "platform", "stress_level": 5},
+    ]
+    with open(log_path, "w") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+
+    store = PredictionStore(log_path)
+    assert store.teams() == {"platform": 1}
+    store.close()
+
+
+def test_malformed_and_partial_lines_are_skipped(log_path, clock):
+    with open(log_path, "w") as f:
+        f.write('{"type": "prediction"}\nnot json\n')
+        f.write(json.dumps({"type": "prediction", "ts": NOW, "user_key": "u1", "team": "t", "stress_level": 2}) + "\n")
+        # A line another worker has not finished writing yet
+        f.write('{"type": "predic')
+
+    store = PredictionStore(log_path)
+    assert store.snapshot()["malformed"] == 2
+    assert current(store)["predictions"] == 1
+    store.close()
@@ -0,0 +1,240 @@
+"""
+Circuit breaking, deadlines and hedged GETs of the Integrations Service client.
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from app.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    ResilientHttpClient,
+    deadline_scope,
+    remaining_seconds,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.resilience.time.monotonic", lambda: now[0])
+    return now
+
+
+def response(status_code: int, body: str = "") -> requests.Response:
+    result = requests.Response()
+    result.status_code = status_code
+    result._content = body.encode()
+    return result
+
+
+class Upstream:
+    """
+    Stands in for the session: each GET sleeps for the next delay and answers with the next status.
+    """
+    def __init__(self, delays=(0.0,), statuses=(200,)):
+        self.delays = list(delays)
+        self.statuses = list(statuses)
+        self.calls = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+            self.timeouts.append(timeout)
+        time.sleep(self.delays[min(call, len(self.delays) - 1)])
+        return response(self.statuses[min(call, len(self.statuses) - 1)], f"attempt {call}")
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make(upstream, pool_size=4, latency=0.02, **options):
+        client = ResilientHttpClient(
+            "integrations", "http://integrations", CircuitBreaker("integrations", failure_threshold=2, reset_timeout=10),
+            pool_size=pool_size, hedge_max_ratio=1.0, **options
+        )
+        client.session.get = upstream.get
+        # Enough samples that the hedge delay stays at `latency` during a test
+        client._latencies.extend([latency] * 400)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+# --- CircuitBreaker ---
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("integrations", failure_threshold=3, reset_timeout=10)
+
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow() is None
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    clock[0] += 4
+    assert breaker.allow() == pytest.approx(6)
+    assert breaker.stats["rejected"] == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("integrations", failure_threshold=2)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == "closed"
+
+
+def test_half_open_breaker_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("integrations", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock[0] += 10
+
+    assert breaker.allow() is None
+    assert breaker.allow() is not None
+    assert breaker.state == "half_open"
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is None
+
+
+def test_failed_probe_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker("integrations", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.allow() == pytest.approx(10)
+    assert breaker.stats["opened"] == 2
+
+
+# --- Deadlines ---
+
+def test_deadline_scope_keeps_the_sooner_deadline(clock):
+    with deadline_scope(5):
+        with deadline_scope(30):
+            assert remaining_seconds() == 5
+        with deadline_scope(2):
+            assert remaining_seconds() == 2
+    assert remaining_seconds() is None
+
+
+def test_calls_are_not_started_after_the_deadline(make_client):
+    upstream = Upstream()
+    client = make_client(upstream)
+
+    with deadline_scope(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            client.get("/api/v1/data/aggregate")
+
+    assert upstream.calls == 0
+
+
+def test_timeouts_are_capped_by_the_deadline(make_client):
+    upstream = Upstream()
+    client = make_client(upstream)
+
+    with deadline_scope(0.5):
+        client.get("/api/v1/data/aggregate", timeout=10, hedge=False)
+
+    assert upstream.timeouts[0] <= 0.5
+
+
+# --- Circuit breaking of calls ---
+
+def test_server_errors_open_the_circuit(make_client):
+    upstream = Upstream(statuses=(503,))
+    client = make_client(upstream)
+
+    for _ in range(2):
+        assert client.get("/api/v1/data/aggregate", hedge=False).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        client.get("/api/v1/data/aggregate", hedge=False)
+
+    assert upstream.calls == 2
+    assert client.stats["failures"] == 2
+
+
+# --- Hedging ---
+
+def test_slow_attempt_is_hedged_and_the_hedge_wins(make_client):
+    upstream = Upstream(delays=(0.5, 0.0))
+    client = make_client(upstream)
+
+    result = client.get("/api/v1/data/aggregate")
+
+    assert result.text == "attempt 1"
+    assert client.stats["hedged"] == 1
+    assert client.stats["hedge_wins"] == 1
+
+
+def test_fast_attempt_is_not_hedged(make_client):
+    upstream = Upstream(delays=(0.0,))
+    client = make_client(upstream, latency=0.2)
+
+    assert client.get("/api/v1/data/aggregate").text == "attempt 0"
+    assert client.stats["hedged"] == 0
+
+
+def test_failed_first_attempt_falls_back_to_the_hedge(make_client):
+    upstream = Upstream(delays=(0.1, 0.0), statuses=(503, 200))
+    client = make_client(upstream)
+
+    assert client.get("/api/v1/data/aggregate").status_code == 200
+
+
+def test_hedges_are_capped_at_a_fraction_of_calls(make_client):
+    upstream = Upstream(delays=(0.1,))
+    client = make_client(upstream)
+    client.hedge_max_ratio = 0.5
+
+    for _ in range(4):
+        client.get("/api/v1/data/aggregate")
+
+    assert client.stats["hedged"] == 2
+
+
+def test_no_hedge_without_an_idle_thread(make_client):
+    upstream = Upstream(delays=(0.1,))
+    client = make_client(upstream, pool_size=1)
+
+    assert client.get("/api/v1/data/aggregate").text == "attempt 0"
+    assert client.stats["hedged"] == 0
+    assert client.stats["hedges_skipped_busy"] == 1
+
+
+def test_waiting_for_a_busy_pool_is_bounded_by_the_deadline(make_client):
+    upstream = Upstream()
+    client = make_client(upstream, pool_size=1)
+    release = threading.Event()
+    # Holds the only pool thread, like a slow call or a hedge loser
+    client._executor.submit(release.wait, 5)
+
+    started = time.monotonic()
+    with deadline_scope(0.2):
+        with pytest.raises(DeadlineExceeded):
+            client.get("/api/v1/data/aggregate")
+    elapsed = time.monotonic() - started
+    release.set()
+
+    assert elapsed < 1.0
+    assert upstream.calls == 0
+    assert client.stats["hedged"] == 0
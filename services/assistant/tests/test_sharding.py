@@ -0,0 +1,215 @@
+"""
+Consistent hashing, shard keys and forwarding between Assistant replicas.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.action_cooldown import user_key_for
+from app.sharding import (
+    FORWARDED_HEADER,
+    OWNER_HEADER,
+    HashRing,
+    ShardRouter,
+    ShardRoutingMiddleware,
+    shard_key,
+)
+
+SELF = "http://assistant-0:8002"
+OTHER = "http://assistant-1:8002"
+KEYS = [f"token:{i:08x}" for i in range(5000)]
+
+
+def owners(ring):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+# --- HashRing ---
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().owner("token:abc") is None
+
+
+def test_keys_spread_over_every_node():
+    ring = HashRing([f"node-{i}" for i in range(4)])
+
+    counts = {}
+    for owner in owners(ring).values():
+        counts[owner] = counts.get(owner, 0) + 1
+    assert set(counts) == set(ring.nodes)
+    # 160 vnodes per node keep every share within a few percent of 1/4
+    assert all(0.18 < count / len(KEYS) < 0.32 for count in counts.values())
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing([f"node-{i}" for i in range(4)])
+    before = owners(ring)
+
+    ring.add("node-4")
+    after = owners(ring)
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "node-4" for key in moved)
+    assert 0.12 < len(moved) / len(KEYS) < 0.28
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing([f"node-{i}" for i in range(5)])
+    before = owners(ring)
+
+    ring.remove("node-2")
+    after = owners(ring)
+
+    assert all(before[key] == "node-2" for key in KEYS if before[key] != after[key])
+    assert "node-2" not in after.values()
+
+
+def test_owner_does_not_depend_on_insertion_order():
+    nodes = [f"node-{i}" for i in range(4)]
+
+    assert owners(HashRing(nodes)) == owners(HashRing(reversed(nodes)))
+
+
+# --- shard_key ---
+
+@pytest.mark.parametrize("payload", [
+    {"user_token": "token-a"},
+    {"user_token": "token-a", "user_id": "alice"},
+    {"user_token": " token-a ", "team": "platform"},
+    {"user_token": "token-a", "user_id": ""},
+])
+def test_shard_key_matches_user_key_for(payload):
+    body = json.dumps(payload).encode()
+
+    expected = user_key_for(payload.get("user_id"), payload["user_token"])
+    assert shard_key("POST", "/api/v1/recommend", {}, body) == expected
+
+
+def test_shard_key_of_other_requests():
+    assert shard_key("DELETE", "/api/v1/scoring/users/id%3Aalice", {}, b"") == "id:alice"
+    assert shard_key("POST", "/api/v1/scoring/notify", {}, b'{"user_key": "token:ab"}') == "token:ab"
+    assert shard_key("POST", "/api/v1/scoring/notify", {"x-goog-channel-token": "id:bob"}, b"") == "id:bob"
+    assert shard_key("POST", "/api/v1/recommend", {}, b"not json") is None
+    assert shard_key("POST", "/api/v1/recommend", {}, b'{"user_token": "  "}') is None
+
+
+# --- Forwarding ---
+
+async def local_app(scope, receive, send):
+    while (await receive()).get("more_body"):
+        pass
+    headers = dict(scope["headers"])
+    body = json.dumps({
+        "served_by": "local",
+        "forwarded_by": headers.get(FORWARDED_HEADER.lower().encode(), b"").decode() or None,
+    }).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def token_owned_by(router, node):
+    for i in range(1000):
+        token = f"token-{i}"
+        if router.owner(user_key_for(None, token)) == node:
+            return token
+    raise AssertionError(f"no token maps to {node}")
+
+
+def run_requests(owner_handler, requests, **router_options):
+    """
+    Sends `requests` (method, path, json, headers) through ShardRoutingMiddleware on SELF,
+    with OTHER answered by `owner_handler`. Returns the responses and the router.
+    """
+    router = ShardRouter([SELF, OTHER], SELF, wrap_transport=lambda _: httpx.MockTransport(owner_handler), **router_options)
+
+    async def send_all():
+        await router.start()
+        app = ShardRoutingMiddleware(local_app, router)
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=SELF) as client:
+                return [
+                    await client.request(method, path, json=payload, headers=headers or {})
+                    for method, path, payload, headers in requests
+                ]
+        finally:
+            await router.close()
+
+    return asyncio.run(send_all()), router
+
+
+def owner_answers(request: httpx.Request) -> httpx.Response:
+    body = json.dumps({
+        "served_by": "owner",
+        "url": str(request.url),
+        "forwarded_by": request.headers.get(FORWARDED_HEADER),
+        "body": json.loads(request.content),
+    }).encode()
+    # Streamed, as from a real connection: the router relays the raw chunks
+    return httpx.Response(200, headers={"content-type": "application/json"}, stream=httpx.ByteStream(body))
+
+
+def owner_is_down(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def test_requests_for_other_owners_are_forwarded():
+    router = ShardRouter([SELF, OTHER], SELF)
+    remote, local = token_owned_by(router, OTHER), token_owned_by(router, SELF)
+
+    (forwarded, served), router = run_requests(owner_answers, [
+        ("POST", "/api/v1/recommend", {"user_token": remote}, None),
+        ("POST", "/api/v1/recommend", {"user_token": local}, None),
+    ])
+
+    assert forwarded.json() == {
+        "served_by": "owner",
+        "url": f"{OTHER}/api/v1/recommend",
+        "forwarded_by": SELF,
+        "body": {"user_token": remote},
+    }
+    assert forwarded.headers[OWNER_HEADER] == OTHER
+    assert served.json()["served_by"] == "local"
+    assert router.stats["forwarded"] == 1
+    assert router.stats["served_local"] == 1
+
+
+def test_forwarded_requests_are_served_where_they_land():
+    router = ShardRouter([SELF, OTHER], SELF)
+    remote = token_owned_by(router, OTHER)
+
+    (response,), router = run_requests(owner_answers, [
+        ("POST", "/api/v1/recommend", {"user_token": remote}, {FORWARDED_HEADER: OTHER}),
+    ])
+
+    assert response.json() == {"served_by": "local", "forwarded_by": OTHER}
+    assert router.stats["served_forwarded"] == 1
+    assert router.stats["forwarded"] == 0
+
+
+def test_unsharded_routes_are_not_forwarded():
+    router = ShardRouter([SELF, OTHER], SELF)
+    remote = token_owned_by(router, OTHER)
+
+    (response,), router = run_requests(owner_answers, [
+        ("POST", "/api/v1/recommend/batch", {"user_token": remote}, None),
+    ])
+
+    assert response.json()["served_by"] == "local"
+    assert router.stats["forwarded"] == router.stats["served_local"] == 0
+
+
+def test_unreachable_owner_falls_back_to_local_and_is_skipped():
+    router = ShardRouter([SELF, OTHER], SELF)
+    remote = token_owned_by(router, OTHER)
+    request = ("POST", "/api/v1/recommend", {"user_token": remote}, None)
+
+    (first, second), router = run_requests(owner_is_down, [request, request], retry_seconds=60)
+
+    assert first.json()["served_by"] == "local"
+    assert second.json()["served_by"] == "local"
+    assert router.stats["owner_unreachable"] == 1
+    assert router.stats["owner_skipped"] == 1
+    assert router.snapshot()["owners_down"] == [OTHER]
@@ -0,0 +1,61 @@
+"""
+Modules that every service carries as identical copies.
+
+Each service is built into its own image from its own directory (and mounted
+alone at /app in docker-compose), so code shared between services is copied
+into each app package instead of being installed from a common package.
+These tests catch a copy that was changed on its own. The deadline and
+circuit-breaker code in each service's resilience.py is checked the same way.
+"""
+
+import importlib.util
+import inspect
+import os
+import sys
+
+import pytest
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SERVICES = ("assistant", "actions", "integrations")
+SHARED_MODULES = ("profiling.py", "loop_monitor.py", "tracing.py")
+# resilience.py name -> services whose copy defines it
+SHARED_RESILIENCE = {
+    "deadline_scope": SERVICES,
+    "remaining_seconds": SERVICES,
+    "deadline_headers": SERVICES,
+    "deadline_from_headers": SERVICES,
+    "DeadlineMiddleware": SERVICES,
+    "CircuitBreaker": ("assistant", "actions"),
+}
+
+
+def read(service: str, module: str) -> bytes:
+    with open(os.path.join(SERVICES_DIR, service, "app", module), "rb") as f:
+        return f.read()
+
+
+def load_resilience(service: str):
+    path = os.path.join(SERVICES_DIR, service, "app", "resilience.py")
+    spec = importlib.util.spec_from_file_location(f"{service}_resilience", path)
+    module = importlib.util.module_from_spec(spec)
+    # inspect.getsource looks classes up through sys.modules
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("module", SHARED_MODULES)
+def test_copies_are_identical(module):
+    copies = {service: read(service, module) for service in SERVICES}
+
+    differing = [service for service in SERVICES if copies[service] != copies["assistant"]]
+    assert not differing, f"{module} differs from the assistant's copy in: {', '.join(differing)}"
+
+
+def test_resilience_deadlines_and_breaker_are_identical():
+    modules = {service: load_resilience(service) for service in SERVICES}
+
+    for name, services in SHARED_RESILIENCE.items():
+        sources = {service: inspect.getsource(getattr(modules[service], name)) for service in services}
+        differing = [service for service in services if sources[service] != sources[services[0]]]
+        assert not differing, f"resilience.{name} differs from the {services[0]} copy in: {', '.join(differing)}"
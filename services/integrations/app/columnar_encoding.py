@@ -0,0 +1,161 @@
+"""
+Compact columnar binary encoding of the data endpoints' payloads.
+
+Served instead of JSON when the client sends `Accept: application/vnd.harmonia.columnar`.
+
+Layout (all integers little-endian):
+
+    b"HCOL" | version:u16 | reserved:u16 | header_len:u32 | header (UTF-8 JSON) | padding
+    column blobs, each starting on an 8-byte boundary
+
+The header is {"meta": {...}, "columns": [{"name", "dtype", "offset", "count"}, ...]}
+where dtype is a NumPy type string ("<i8", "<f8", "<u4", "|u1") and offset is
+relative to the start of the buffer, so the reader can wrap every column
+without copying.
+
+Columns:
+    hr_time_ns            <i8  start time of each heart-rate value (ns since epoch)
+    hr_value              <f8  heart-rate value (fpVal or intVal)
+    event_start           <f8  event start (s since epoch, NaN for all-day/missing)
+    event_end             <f8  event end   (s since epoch, NaN for all-day/missing)
+    event_summary_offsets <u4  n+1 offsets into event_summary_data
+    event_summary_data    |u1  concatenated UTF-8 summaries
+    event_description_offsets / event_description_data  likewise
+"""
+
+import datetime
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Optional
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.harmonia.columnar"
+MAGIC = b"HCOL"
+VERSION = 1
+_ALIGNMENT = 8
+
+_ARRAY_DTYPES = {
+    "q": "<i8",
+    "d": "<f8",
+    "I": "<u4",
+    "B": "|u1",
+}
+
+
+def wants_columnar(accept: Optional[str]) -> bool:
+    """
+    True if the client's Accept header asks for the columnar encoding.
+    """
+    return bool(accept) and COLUMNAR_MEDIA_TYPE in accept
+
+
+def _event_timestamp(event: Dict[str, Any], key: str) -> float:
+    value = (event.get(key) or {}).get('dateTime')
+    if not value:
+        return float('nan')
+    try:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return float('nan')
+
+
+def _text_column(values: List[str]):
+    offsets = array('I', [0])
+    data = bytearray()
+    for value in values:
+        data += (value or "").encode("utf-8")
+        offsets.append(len(data))
+    return offsets, array('B', data)
+
+
+def event_columns(events: List[Dict[str, Any]]) -> Dict[str, array]:
+    """
+    Parallel start/end/text columns for a list of Google Calendar events.
+    """
+    summary_offsets, summary_data = _text_column([e.get('summary', '') for e in events])
+    description_offsets, description_data = _text_column([e.get('description', '') for e in events])
+    return {
+        "event_start": array('d', (_event_timestamp(e, 'start') for e in events)),
+        "event_end": array('d', (_event_timestamp(e, 'end') for e in events)),
+        "event_summary_offsets": summary_offsets,
+        "event_summary_data": summary_data,
+        "event_description_offsets": description_offsets,
+        "event_description_data": description_data,
+    }
+
+
+def heart_rate_columns(points: List[Dict[str, Any]]) -> Dict[str, array]:
+    """
+    Flattened time/value columns for Google Fit heart-rate data points.
+    """
+    times = array('q')
+    values = array('d')
+    for point in points:
+        start_ns = int(point.get('startTimeNanos', 0) or 0)
+        for value in point.get('value', []):
+            if 'fpVal' in value:
+                values.append(float(value['fpVal']))
+            elif 'intVal' in value:
+                values.append(float(value['intVal']))
+            else:
+                continue
+            times.append(start_ns)
+    return {"hr_time_ns": times, "hr_value": values}
+
+
+def _pad(length: int) -> int:
+    return (-length) % _ALIGNMENT
+
+
+def encode_columns(columns: Dict[str, array], meta: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Serializes named typed arrays (plus a small JSON meta dict) into one buffer.
+    """
+    blobs = []
+    for name, values in columns.items():
+        if sys.byteorder != "little" and values.itemsize > 1:
+            values = array(values.typecode, values)
+            values.byteswap()
+        blobs.append((name, _ARRAY_DTYPES[values.typecode], len(values), values.tobytes()))
+
+    # The header holds the column offsets, and its length shifts them, so lay out the
+    # columns with a provisional header length and grow it until the header fits
+    # (a shorter header is padded with spaces, which JSON ignores).
+    header_len = 0
+    while True:
+        offset = 12 + header_len + _pad(12 + header_len)
+        descriptors = []
+        for name, dtype, count, blob in blobs:
+            descriptors.append({"name": name, "dtype": dtype, "offset": offset, "count": count})
+            offset += len(blob) + _pad(len(blob))
+        header = json.dumps({"meta": meta or {}, "columns": descriptors}, separators=(",", ":")).encode("utf-8")
+        if len(header) <= header_len:
+            header = header.ljust(header_len)
+            break
+        header_len = len(header)
+
+    out = bytearray(MAGIC)
+    out += struct.pack("<HHI", VERSION, 0, len(header))
+    out += header
+    out += b"\0" * _pad(len(out))
+    for _, _, _, blob in blobs:
+        out += blob
+        out += b"\0" * _pad(len(blob))
+    return bytes(out)
+
+
+def encode_user_data(
+    calendar_events: Optional[List[Dict[str, Any]]] = None,
+    heart_rate_data: Optional[List[Dict[str, Any]]] = None,
+    meta: Optional[Dict[str, Any]] = None,
+) -> bytes:
+    """
+    Encodes any combination of calendar events and heart-rate points.
+    """
+    columns: Dict[str, array] = {}
+    if heart_rate_data is not None:
+        columns.update(heart_rate_columns(heart_rate_data))
+    if calendar_events is not None:
+        columns.update(event_columns(calendar_events))
+    return encode_columns(columns, meta)
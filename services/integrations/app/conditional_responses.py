@@ -0,0 +1,110 @@
+"""
+Content ETags, conditional GETs and gzip for the data endpoints.
+
+Every data response carries a weak ETag: a hash of the data it holds and of
+its representation (JSON or columnar). It is weak because the aggregate
+payload carries its own generation timestamp, which is left out of the hash.
+A request whose If-None-Match lists the current ETag gets a bodiless 304, so a
+caller that already holds the data neither downloads nor parses it again.
+
+Bodies of at least GZIP_MIN_BYTES are gzip-compressed for clients that accept
+gzip. Responses vary on Accept and Accept-Encoding, and are marked
+`private, no-cache`: they may be stored but must be revalidated on every use.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.responses import Response
+
+GZIP_LEVEL = 5
+
+
+def json_bytes(content: Any) -> bytes:
+    """
+    The content serialized the way JSONResponse renders it.
+    """
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def content_etag(representation: str, data: bytes) -> str:
+    """
+    Weak ETag for `data` served as `representation` (e.g. "json" or "columnar").
+    """
+    digest = hashlib.blake2b(data, digest_size=16, person=representation.encode("utf-8")[:16])
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    True if the If-None-Match header lists `etag` (weak comparison) or is "*".
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """
+    True if the Accept-Encoding header allows gzip.
+    """
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+class ConditionalResponder:
+    """
+    Builds the 304 or (possibly gzip-compressed) 200 response for an ETagged payload.
+    """
+    def __init__(self, gzip_min_bytes: int = 1024):
+        self.gzip_min_bytes = gzip_min_bytes
+        self.stats = {"responses": 0, "not_modified": 0, "gzipped": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def respond(
+        self,
+        etag: str,
+        render: Callable[[], bytes],
+        media_type: str,
+        if_none_match: Optional[str],
+        accept_encoding: Optional[str]
+    ) -> Response:
+        """
+        304 if the client holds `etag`; otherwise the body from `render()` (only called then).
+        """
+        self.stats["responses"] += 1
+        headers: Dict[str, str] = {"ETag": etag, "Vary": "Accept, Accept-Encoding", "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        body = render()
+        self.stats["bytes_in"] += len(body)
+        if self.gzip_min_bytes > 0 and len(body) >= self.gzip_min_bytes and accepts_gzip(accept_encoding):
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+            self.stats["gzipped"] += 1
+        self.stats["bytes_out"] += len(body)
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "gzip_min_bytes": self.gzip_min_bytes,
+            "compression_ratio": round(self.stats["bytes_out"] / self.stats["bytes_in"], 3) if self.stats["bytes_in"] else None,
+        }
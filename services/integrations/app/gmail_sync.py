@@ -0,0 +1,168 @@
+"""
+Incremental Gmail sync driven by the per-user history id.
+
+The first sync for a user (or one whose watermark Google no longer accepts)
+lists the most recent inbox messages and records the mailbox's current
+historyId. Later syncs ask users.history.list for the messages added to the
+inbox since that watermark, so only new mail is fetched. Each message is read
+with format=metadata and a partial-response field mask: just the id, date,
+Subject header and snippet, never the body. The reads go out as Google batch
+requests.
+
+Watermarks are kept in memory (like the credentials store) and are lost on
+restart; the next sync then starts over with a full sync. A caller can also
+pass its own last processed history id (`start_history_id`) so that messages
+it failed to process are delivered again.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.google_batch import GoogleBatchRunner
+from app.google_quota import GoogleRequestScheduler
+
+MESSAGE_FIELDS = "id,internalDate,snippet,payload/headers"
+HISTORY_FIELDS = "history(messagesAdded(message(id))),nextPageToken,historyId"
+
+
+def _status(error: Exception) -> Optional[int]:
+    resp = getattr(error, "resp", None)
+    return int(resp.status) if resp is not None else None
+
+
+class GmailHistorySync:
+    """
+    Per-user historyId watermarks and the incremental fetch of new inbox messages.
+    """
+    def __init__(
+        self,
+        scheduler: GoogleRequestScheduler,
+        batch_runner: GoogleBatchRunner,
+        bootstrap_messages: int = 20,
+        bootstrap_query: str = "newer_than:1d",
+        max_messages: int = 100,
+        max_tracked_users: int = 10000,
+    ):
+        self.scheduler = scheduler
+        self.batch_runner = batch_runner
+        self.bootstrap_messages = bootstrap_messages
+        self.bootstrap_query = bootstrap_query
+        self.max_messages = max_messages
+        self.max_tracked_users = max_tracked_users
+        # user_id -> historyId, least recently synced first
+        self._watermarks: "OrderedDict[str, str]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {
+            "syncs": 0, "full_syncs": 0, "watermark_resets": 0,
+            "messages_returned": 0, "messages_skipped": 0, "truncated": 0,
+        }
+
+    def _lock_for(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _set_watermark(self, user_id: str, history_id: str):
+        self._watermarks.pop(user_id, None)
+        self._watermarks[user_id] = history_id
+        while len(self._watermarks) > self.max_tracked_users:
+            old_user, _ = self._watermarks.popitem(last=False)
+            self._locks.pop(old_user, None)
+
+    async def _bootstrap_ids(self, service: Any, user_id: str) -> Tuple[List[str], str]:
+        # Read the history id first: anything arriving after it shows up in the next sync
+        profile = await self.scheduler.execute(
+            "gmail", user_id, service.users().getProfile(userId="me", fields="historyId")
+        )
+        listing = await self.scheduler.execute("gmail", user_id, service.users().messages().list(
+            userId="me", labelIds=["INBOX"], q=self.bootstrap_query,
+            maxResults=self.bootstrap_messages, fields="messages(id)"
+        ))
+        return [message["id"] for message in listing.get("messages", [])], str(profile["historyId"])
+
+    async def _history_ids(self, service: Any, user_id: str, start_history_id: str) -> Tuple[List[str], str]:
+        message_ids: List[str] = []
+        page_token = None
+        while True:
+            page = await self.scheduler.execute("gmail", user_id, service.users().history().list(
+                userId="me", startHistoryId=start_history_id, historyTypes="messageAdded",
+                labelId="INBOX", maxResults=500, pageToken=page_token, fields=HISTORY_FIELDS
+            ))
+            for record in page.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    message_ids.append(added["message"]["id"])
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return message_ids, str(page.get("historyId", start_history_id))
+
+    async def _read_messages(self, service: Any, user_id: str, message_ids: List[str]) -> List[Dict[str, Any]]:
+        factories = [
+            (lambda message_id=message_id: service.users().messages().get(
+                userId="me", id=message_id, format="metadata", metadataHeaders=["Subject"], fields=MESSAGE_FIELDS
+            ))
+            for message_id in message_ids
+        ]
+        outcomes = await self.batch_runner.run("gmail", user_id, service, factories)
+        messages = []
+        for outcome in outcomes:
+            if not outcome["ok"]:
+                # Typically 404: deleted between the history listing and the read
+                self.stats["messages_skipped"] += 1
+                continue
+            message = outcome["response"]
+            headers = message.get("payload", {}).get("headers", [])
+            messages.append({
+                "id": message["id"],
+                "subject": next((h["value"] for h in headers if h.get("name", "").lower() == "subject"), ""),
+                "snippet": message.get("snippet", ""),
+                "internal_date": int(message.get("internalDate", 0)),
+            })
+        return messages
+
+    async def sync(self, service: Any, user_id: str, start_history_id: Optional[str] = None,
+                   full: bool = False) -> Dict[str, Any]:
+        """
+        Returns the inbox messages added since `start_history_id` (default: the stored
+        watermark), oldest first, and advances the watermark. `full` forces a full sync.
+        """
+        async with self._lock_for(user_id):
+            self.stats["syncs"] += 1
+            previous = None if full else (start_history_id or self._watermarks.get(user_id))
+            full_sync = previous is None
+            reset = False
+            if not full_sync:
+                try:
+                    message_ids, history_id = await self._history_ids(service, user_id, previous)
+                except Exception as e:
+                    # 404: the watermark is older than the history Google retains
+                    if _status(e) != 404:
+                        raise
+                    full_sync = reset = True
+                    self.stats["watermark_resets"] += 1
+            if full_sync:
+                self.stats["full_syncs"] += 1
+                message_ids, history_id = await self._bootstrap_ids(service, user_id)
+
+            message_ids = list(dict.fromkeys(message_ids))
+            truncated = len(message_ids) > self.max_messages
+            if truncated:
+                self.stats["truncated"] += 1
+                message_ids = message_ids[-self.max_messages:] if not full_sync else message_ids[:self.max_messages]
+            messages = await self._read_messages(service, user_id, message_ids) if message_ids else []
+            messages.sort(key=lambda message: message["internal_date"])
+
+            self._set_watermark(user_id, history_id)
+            self.stats["messages_returned"] += len(messages)
+            return {
+                "messages": messages,
+                "history_id": history_id,
+                "previous_history_id": previous,
+                "full_sync": full_sync,
+                "watermark_reset": reset,
+                "truncated": truncated,
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "tracked_users": len(self._watermarks)}
@@ -0,0 +1,108 @@
+"""
+Bulk execution of Google API requests over the multipart batch endpoint.
+
+A list of requests is packed into BatchHttpRequests. Each batch is admitted
+through the GoogleRequestScheduler and costs one token per inner request, so a
+batch holds at most the API's batch limit and at most what the scheduler's
+buckets admit at once (their burst). Larger lists become more batches, paced
+by the buckets. Only the inner requests that fail with a retryable
+error (429, 5xx, 403 rate limit) are re-sent on the next round.
+"""
+
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from app.google_quota import GoogleRequestScheduler, GoogleUpstreamError, QuotaDeadlineExceeded
+
+# Maximum number of calls Google accepts in a single batch request, per API.
+BATCH_LIMITS = {
+    "calendar": 1000,
+    "gmail": 100,
+}
+
+
+def _error_status(error: Exception) -> Optional[int]:
+    if isinstance(error, QuotaDeadlineExceeded):
+        return 429
+    if isinstance(error, GoogleUpstreamError):
+        return error.status
+    resp = getattr(error, "resp", None)
+    return int(resp.status) if resp is not None else None
+
+
+class GoogleBatchRunner:
+    """
+    Runs many googleapiclient requests as Google batch requests and reports per-item results.
+    """
+    def __init__(self, scheduler: GoogleRequestScheduler, max_retries: Optional[int] = None):
+        self.scheduler = scheduler
+        self.max_retries = max_retries if max_retries is not None else scheduler.max_retries
+        self.batch_limits = {
+            api: int(os.getenv(f"GOOGLE_BATCH_MAX_SIZE_{api.upper()}", limit))
+            for api, limit in BATCH_LIMITS.items()
+        }
+
+    async def run(
+        self,
+        api: str,
+        user_id: str,
+        service: Any,
+        request_factories: List[Callable[[], Any]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute every request produced by `request_factories` (called again on retry).
+
+        Returns one dict per request, in input order:
+        {"ok": True, "response": ..., "attempts": n} or
+        {"ok": False, "error": "...", "status_code": int | None, "attempts": n}
+        """
+        batch_size = max(1, min(self.batch_limits.get(api, 50), int(self.scheduler.max_cost(api))))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(request_factories)
+        pending = list(range(len(request_factories)))
+        attempt = 0
+
+        while pending:
+            attempt += 1
+            retry: List[int] = []
+
+            for offset in range(0, len(pending), batch_size):
+                chunk = pending[offset:offset + batch_size]
+                outcomes: Dict[int, tuple] = {}
+
+                def callback(request_id, response, exception):
+                    outcomes[int(request_id)] = (response, exception)
+
+                batch = service.new_batch_http_request(callback=callback)
+                for index in chunk:
+                    batch.add(request_factories[index](), request_id=str(index))
+
+                try:
+                    await self.scheduler.execute(api, user_id, batch, cost=len(chunk))
+                except QuotaDeadlineExceeded as e:
+                    for index in chunk:
+                        outcomes.setdefault(index, (None, e))
+                except Exception as e:
+                    # The batch envelope itself failed; every item shares that error
+                    for index in chunk:
+                        outcomes.setdefault(index, (None, e))
+
+                for index in chunk:
+                    response, exception = outcomes.get(index, (None, RuntimeError("No response in batch")))
+                    if exception is None:
+                        results[index] = {"ok": True, "response": response, "attempts": attempt}
+                    elif self.scheduler.is_retryable(exception) and attempt <= self.max_retries:
+                        retry.append(index)
+                    else:
+                        results[index] = {
+                            "ok": False,
+                            "error": str(exception),
+                            "status_code": _error_status(exception),
+                            "attempts": attempt,
+                        }
+
+            pending = retry
+            if pending:
+                await asyncio.sleep(self.scheduler.backoff_delay(attempt))
+
+        return results  # type: ignore[return-value]
@@ -0,0 +1,293 @@
+"""
+Quota-aware scheduler for outbound Google API calls.
+
+Every Calendar, Fitness and Gmail request made by the Integrations Service goes
+through a single GoogleRequestScheduler. Requests wait (FIFO) on a token bucket
+for the API and another for the user, up to a deadline. Requests that Google
+rejects with 429, a 403 rate limit reason or a 5xx are retried with jittered
+exponential backoff. Once the retries or the deadline run out, a rate limit is
+raised as QuotaDeadlineExceeded (the caller should back off) and a server error
+as GoogleUpstreamError (Google is failing, not throttling).
+
+Rates are configured through environment variables, for example:
+
+    GOOGLE_QUOTA_CALENDAR_RPS=10     GOOGLE_QUOTA_CALENDAR_BURST=20
+    GOOGLE_QUOTA_USER_RPS=5          GOOGLE_QUOTA_USER_BURST=10
+    GOOGLE_QUOTA_DEADLINE_SECONDS=10 GOOGLE_QUOTA_MAX_RETRIES=4
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from googleapiclient.errors import HttpError
+
+from app.resilience import remaining_seconds
+from app.tracing import Tracer
+
+# Reasons Google uses on 403 responses when the request is only being throttled.
+# "quotaExceeded" / "dailyLimitExceeded" are left out on purpose: retrying them is pointless.
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+DEFAULT_API_RATES = {
+    # api: (requests per second, burst)
+    "calendar": (10.0, 20),
+    "fitness": (10.0, 20),
+    "gmail": (25.0, 50),
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+class QuotaDeadlineExceeded(Exception):
+    """
+    Raised when a request cannot be scheduled (or retried) before its deadline.
+    """
+    def __init__(self, api: str, retry_after: float):
+        super().__init__(f"Google {api} quota exhausted; retry after {retry_after:.1f}s")
+        self.api = api
+        self.retry_after = retry_after
+
+
+class GoogleUpstreamError(Exception):
+    """
+    Raised when Google keeps answering with a server error until the retries run out.
+    """
+    def __init__(self, api: str, status: int):
+        super().__init__(f"Google {api} unavailable (HTTP {status})")
+        self.api = api
+        self.status = status
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second.
+    Waiters are served in arrival order because the lock is held while sleeping.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.last_used = self.updated
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, deadline: float, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens, waiting until they are available. A cost above the
+        capacity is taken in capacity-sized installments, so it is paid in full.
+        Returns the number of seconds spent waiting.
+        """
+        started = time.monotonic()
+        async with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, cost - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise QuotaDeadlineExceeded("bucket", wait)
+            remaining = cost
+            while remaining > 0:
+                installment = min(remaining, self.capacity)
+                if self.tokens < installment:
+                    await asyncio.sleep((installment - self.tokens) / self.rate)
+                    self._refill(time.monotonic())
+                self.tokens -= installment
+                remaining -= installment
+            self.last_used = time.monotonic()
+        return self.last_used - started
+
+
+class GoogleRequestScheduler:
+    """
+    Schedules googleapiclient requests against per-API and per-user token buckets.
+    """
+    def __init__(
+        self,
+        api_rates: Optional[Dict[str, tuple]] = None,
+        user_rate: Optional[float] = None,
+        user_burst: Optional[float] = None,
+        deadline_seconds: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_cap: Optional[float] = None,
+        max_tracked_users: int = 10000,
+        tracer: Optional[Tracer] = None,
+    ):
+        rates = dict(api_rates or DEFAULT_API_RATES)
+        for api, (rate, burst) in list(rates.items()):
+            prefix = f"GOOGLE_QUOTA_{api.upper()}"
+            rates[api] = (_env_float(f"{prefix}_RPS", rate), _env_float(f"{prefix}_BURST", burst))
+
+        self.api_buckets = {api: TokenBucket(rate, burst) for api, (rate, burst) in rates.items()}
+        self.user_rate = user_rate if user_rate is not None else _env_float("GOOGLE_QUOTA_USER_RPS", 5.0)
+        self.user_burst = user_burst if user_burst is not None else _env_float("GOOGLE_QUOTA_USER_BURST", 10)
+        self.deadline_seconds = (
+            deadline_seconds if deadline_seconds is not None
+            else _env_float("GOOGLE_QUOTA_DEADLINE_SECONDS", 10.0)
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GOOGLE_QUOTA_MAX_RETRIES", "4"))
+        self.backoff_base = backoff_base if backoff_base is not None else _env_float("GOOGLE_QUOTA_BACKOFF_BASE", 0.5)
+        self.backoff_cap = backoff_cap if backoff_cap is not None else _env_float("GOOGLE_QUOTA_BACKOFF_CAP", 16.0)
+        self.max_tracked_users = max_tracked_users
+        self.tracer = tracer or Tracer("integrations", exporter="none")
+
+        # (api, user_id) -> TokenBucket, least recently used first
+        self.user_buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, Any]] = {
+            api: {
+                "queue_depth": 0,
+                "max_queue_depth": 0,
+                "requests": 0,
+                "succeeded": 0,
+                "failed": 0,
+                "retries": 0,
+                "rate_limited": 0,
+                "server_errors": 0,
+                "deadline_exceeded": 0,
+                "throttle_seconds": 0.0,
+                "backoff_seconds": 0.0,
+            }
+            for api in self.api_buckets
+        }
+
+    def _user_bucket(self, api: str, user_id: str) -> TokenBucket:
+        key = (api, user_id)
+        bucket = self.user_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self.user_buckets[key] = bucket
+            if len(self.user_buckets) > self.max_tracked_users:
+                # Evict the least recently used bucket that nobody is waiting on
+                for old_key, old_bucket in self.user_buckets.items():
+                    if not old_bucket._lock.locked():
+                        del self.user_buckets[old_key]
+                        break
+        else:
+            self.user_buckets.move_to_end(key)
+        return bucket
+
+    def max_cost(self, api: str) -> float:
+        """
+        The largest cost both of the API's buckets can admit at once (their smaller burst).
+        """
+        return min(self.api_buckets[api].capacity, self.user_burst)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)].
+        """
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def is_rate_limited(error: Exception) -> bool:
+        """
+        True for Google throttling the request: 429 and 403 rate limits.
+        """
+        if not isinstance(error, HttpError):
+            return False
+        status = int(error.resp.status)
+        if status == 429:
+            return True
+        if status == 403:
+            content = error.content.decode("utf-8", "ignore") if isinstance(error.content, bytes) else str(error.content)
+            return any(reason in content for reason in RATE_LIMIT_REASONS)
+        return False
+
+    @classmethod
+    def is_retryable(cls, error: Exception) -> bool:
+        """
+        True for errors that are worth retrying: 429, 5xx and 403 rate limits.
+        """
+        if cls.is_rate_limited(error):
+            return True
+        return isinstance(error, HttpError) and int(error.resp.status) >= 500
+
+    async def acquire(self, api: str, user_id: str, deadline: float, cost: float = 1.0):
+        """
+        Wait for both the per-user and the per-API bucket to admit the request.
+        """
+        stats = self.stats[api]
+        stats["queue_depth"] += 1
+        stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"])
+        try:
+            waited = await self._user_bucket(api, user_id).acquire(deadline, cost)
+            waited += await self.api_buckets[api].acquire(deadline, cost)
+            stats["throttle_seconds"] += waited
+        except QuotaDeadlineExceeded as e:
+            stats["deadline_exceeded"] += 1
+            raise QuotaDeadlineExceeded(api, e.retry_after)
+        finally:
+            stats["queue_depth"] -= 1
+
+    async def execute(self, api: str, user_id: str, request: Any, cost: float = 1.0,
+                      deadline_seconds: Optional[float] = None) -> Any:
+        """
+        Run `request.execute()` (a googleapiclient HttpRequest or BatchHttpRequest)
+        once admitted by the token buckets. The blocking HTTP call runs in a worker
+        thread so the event loop is not stalled. Waiting and retrying stop at the
+        caller's request deadline (X-Request-Deadline-Ms) if that comes first.
+        """
+        if api not in self.api_buckets:
+            raise ValueError(f"Unknown Google API: {api}")
+
+        stats = self.stats[api]
+        stats["requests"] += 1
+        budget = deadline_seconds or self.deadline_seconds
+        remaining = remaining_seconds()
+        if remaining is not None:
+            budget = min(budget, remaining)
+        deadline = time.monotonic() + budget
+
+        attempt = 0
+        while True:
+            with self.tracer.span("google.quota_wait", api=api):
+                await self.acquire(api, user_id, deadline, cost)
+            try:
+                with self.tracer.span(f"google.{api}.execute", kind="client", api=api, attempt=attempt + 1, cost=cost):
+                    result = await asyncio.to_thread(request.execute)
+                stats["succeeded"] += 1
+                return result
+            except Exception as e:
+                if not self.is_retryable(e):
+                    stats["failed"] += 1
+                    raise
+                rate_limited = self.is_rate_limited(e)
+                stats["rate_limited" if rate_limited else "server_errors"] += 1
+                delay = self.backoff_delay(attempt)
+                if attempt >= self.max_retries or time.monotonic() + delay > deadline:
+                    stats["failed"] += 1
+                    if rate_limited:
+                        raise QuotaDeadlineExceeded(api, max(delay, 1.0)) from e
+                    raise GoogleUpstreamError(api, int(e.resp.status)) from e
+                attempt += 1
+                stats["retries"] += 1
+                stats["backoff_seconds"] += delay
+                await asyncio.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current queue depth, throttle time and throughput counters per API.
+        """
+        return {
+            "apis": {
+                api: {
+                    **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.stats[api].items()},
+                    "rate_per_second": bucket.rate,
+                    "burst": bucket.capacity,
+                    "available_tokens": round(bucket.tokens, 2),
+                }
+                for api, bucket in self.api_buckets.items()
+            },
+            "per_user": {"rate_per_second": self.user_rate, "burst": self.user_burst},
+            "tracked_users": len(self.user_buckets),
+        }
@@ -1,34 +1,142 @@
 import os
 import datetime
 import base64
-from fastapi import FastAPI, HTTPException, Depends, Header
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Callable, List, Optional
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 import requests
 from dotenv import load_dotenv
-from slack_sdk.webhook import WebhookClient
+from app.google_quota import GoogleRequestScheduler, GoogleUpstreamError, QuotaDeadlineExceeded
+from app.google_batch import GoogleBatchRunner
+from app.gmail_sync import GmailHistorySync
+from app.response_cache import SingleFlightCache
+from app import resilience
+from app.columnar_encoding import COLUMNAR_MEDIA_TYPE, encode_user_data, wants_columnar
+from app.conditional_responses import ConditionalResponder, content_etag, json_bytes
+from app.slack_delivery import SlackDeliveryError, SlackDigestSender
+from app.profiling import Profiler, ProfilingMiddleware, create_profiling_router
+from app.loop_monitor import (
+    LOOP_BLOCK_THRESHOLD_MS,
+    LOOP_MONITOR_ENABLED,
+    LOOP_MONITOR_INTERVAL_MS,
+    LOOP_MONITOR_MAX_OFFENDERS,
+    EventLoopMonitor,
+    create_loop_monitor_router,
+)
+from app.tracing import Tracer, TracingMiddleware
 
 # Load environment variables from the .env file
 load_dotenv()
 
-app = FastAPI(title="Integrations Service")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Monitors event-loop lag while running; releases shared outbound clients (and flushes
+    queued Slack digests) on shutdown.
+    """
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    try:
+        yield
+    finally:
+        if slack_sender is not None:
+            await slack_sender.close()
+        loop_monitor.stop()
+
+app = FastAPI(title="Integrations Service", lifespan=lifespan)
+
+# Request tracing: continues the caller's trace (traceparent header) and records
+# spans around Google client execution and Slack delivery.
+tracer = Tracer("integrations")
+# On-demand CPU/memory profiling and slow-request capture under /admin/profiling (see app/profiling.py)
+profiler = Profiler("integrations")
+# Event-loop lag and the endpoints that block the loop, under /admin/event-loop (see app/loop_monitor.py)
+loop_monitor = EventLoopMonitor(LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS, LOOP_MONITOR_MAX_OFFENDERS)
+# Google calls give up at the caller's X-Request-Deadline-Ms (see app/resilience.py)
+app.add_middleware(resilience.DeadlineMiddleware)
+app.add_middleware(TracingMiddleware, tracer=tracer)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.include_router(create_profiling_router(profiler))
+app.include_router(create_loop_monitor_router(loop_monitor))
 
 # Scopes for Google APIs
 SCOPES = [
     'https://www.googleapis.com/auth/calendar.readonly',
     'https://www.googleapis.com/auth/calendar',  # For creating events
     'https://www.googleapis.com/auth/fitness.activity.read',
-    'https://www.googleapis.com/auth/gmail.compose'  # For drafting emails
+    'https://www.googleapis.com/auth/gmail.compose',  # For drafting emails
+    'https://www.googleapis.com/auth/gmail.readonly'  # For the incremental inbox sync (subjects and snippets)
 ]
 
 # A simple in-memory store for user credentials.
 # In a real application, this would be a database.
 credentials_store = {}
 
+# Every outbound Google API call is admitted through this scheduler so that
+# bursts are smoothed against per-API and per-user quotas.
+google_scheduler = GoogleRequestScheduler(tracer=tracer)
+google_batch_runner = GoogleBatchRunner(google_scheduler)
+
+# Per-user Gmail historyId watermarks for /api/v1/data/emails/sync
+gmail_sync = GmailHistorySync(
+    google_scheduler,
+    google_batch_runner,
+    bootstrap_messages=int(os.getenv("GMAIL_SYNC_BOOTSTRAP_MESSAGES", "20")),
+    bootstrap_query=os.getenv("GMAIL_SYNC_BOOTSTRAP_QUERY", "newer_than:1d"),
+    max_messages=int(os.getenv("GMAIL_SYNC_MAX_MESSAGES", "100"))
+)
+
+# Calendar and heart-rate results per (user, endpoint, window): concurrent requests
+# share one Google call and repeats within the TTL are served from memory.
+# DATA_CACHE_TTL_SECONDS=0 disables the cache.
+data_cache = SingleFlightCache(
+    ttl_seconds=float(os.getenv("DATA_CACHE_TTL_SECONDS", "15")),
+    stale_seconds=float(os.getenv("DATA_CACHE_STALE_SECONDS", "45")),
+    max_entries=int(os.getenv("DATA_CACHE_MAX_ENTRIES", "5000"))
+)
+
+# ETags and 304s on the data endpoints, and gzip for bodies of at least
+# DATA_GZIP_MIN_BYTES (0 disables compression). See app/conditional_responses.py
+conditional = ConditionalResponder(gzip_min_bytes=int(os.getenv("DATA_GZIP_MIN_BYTES", "1024")))
+
+def invalidate_user_data(user_id: str, endpoint: str):
+    """
+    Drops a user's cached results for one endpoint after a write that changes them.
+    """
+    data_cache.invalidate(lambda key: key[0] == user_id and key[1] == endpoint)
+
+# Shared Slack sender (pooled connections, per-channel coalescing), created on first use
+slack_sender: Optional[SlackDigestSender] = None
+
+async def get_slack_sender(webhook_url: str) -> SlackDigestSender:
+    """
+    The shared sender for `webhook_url`. When the webhook URL changes, the previous
+    sender delivers what it has queued and releases its session.
+    """
+    global slack_sender
+    if slack_sender is None or slack_sender.webhook_url != webhook_url:
+        previous, slack_sender = slack_sender, SlackDigestSender(webhook_url, tracer=tracer)
+        if previous is not None:
+            await previous.close()
+    return slack_sender
+
+# Partial-response selector for the streaming calendar export: only the fields
+# the Assistant Service needs for feature computation are requested from Google.
+CALENDAR_STREAM_FIELDS = "nextPageToken,items(start,end,summary,description)"
+# Longest window the calendar stream accepts (hours) and Google's largest page size
+CALENDAR_STREAM_MAX_HOURS = int(os.getenv("CALENDAR_STREAM_MAX_HOURS", str(366 * 24)))
+CALENDAR_STREAM_MAX_PAGE_SIZE = 2500
+
+# Upper bound on items accepted by a single bulk endpoint call
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
 # Pydantic models for request validation
 class CalendarEventRequest(BaseModel):
     title: str
@@ -40,23 +148,34 @@ class EmailRequest(BaseModel):
     subject: str
     body: str
 
+class BulkCalendarEventRequest(BaseModel):
+    events: List[CalendarEventRequest]
+
+class BulkEmailRequest(BaseModel):
+    emails: List[EmailRequest]
+
 class SlackNotificationRequest(BaseModel):
     message: str
     channel: str = "#team-harmonia"
 
-def get_credentials_from_token(authorization: Optional[str] = Header(None)):
+def get_user_id(authorization: Optional[str] = Header(None)) -> str:
     """
-    Dependency to get credentials from JWT token or fallback to stored credentials.
-    In a real app, this would validate the JWT and fetch user credentials from DB.
+    Dependency that resolves the user the request is made on behalf of.
     """
     if authorization and authorization.startswith("Bearer "):
         # For now, we'll use the stored credentials regardless of the token
         # In production, you'd validate the JWT and fetch user-specific credentials
         token = authorization.split(" ")[1]
         # TODO: Validate JWT token and get user_id
-        user_id = "user_id"  # This would come from the JWT
-    else:
-        user_id = "user_id"  # Fallback to default user
+        return "user_id"  # This would come from the JWT
+    return "user_id"  # Fallback to default user
+
+def get_credentials_from_token(authorization: Optional[str] = Header(None)):
+    """
+    Dependency to get credentials from JWT token or fallback to stored credentials.
+    In a real app, this would validate the JWT and fetch user credentials from DB.
+    """
+    user_id = get_user_id(authorization)
     
     creds = credentials_store.get(user_id)
     if not creds:
@@ -139,67 +258,312 @@ async def google_auth_callback(code: str, state: str):
     
     return {"message": "Authentication successful! You can now use the API."}
 
-@app.get("/api/v1/data/calendar")
-async def get_calendar_events(creds: Credentials = Depends(get_credentials)):
+def quota_exceeded_error(e: QuotaDeadlineExceeded) -> HTTPException:
     """
-    Fetches the user's calendar events for the next 24 hours.
+    Translate a scheduler rejection into a 429 the caller can back off on.
     """
-    try:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, int(round(e.retry_after))))}
+    )
+
+def upstream_error(e: GoogleUpstreamError) -> HTTPException:
+    """
+    Translate a Google outage (server errors after retries) into a 503 or 502, not a quota 429.
+    """
+    return HTTPException(status_code=503 if e.status == 503 else 502, detail=str(e))
+
+def data_response(
+    data: dict,
+    render_columnar: Callable[[], bytes],
+    accept: Optional[str],
+    if_none_match: Optional[str],
+    accept_encoding: Optional[str],
+    timestamp: Optional[str] = None
+) -> Response:
+    """
+    The JSON (or, if requested via the Accept header, columnar) response for a data payload,
+    with an ETag over `data` (a 304 if the client already holds it) and gzip for large bodies.
+    `timestamp` is added to the JSON body but not to the ETag.
+    """
+    data_json = json_bytes(data)
+    if wants_columnar(accept):
+        return conditional.respond(
+            content_etag("columnar", data_json), render_columnar, COLUMNAR_MEDIA_TYPE, if_none_match, accept_encoding
+        )
+
+    def render_json() -> bytes:
+        if timestamp is None:
+            return data_json
+        return data_json[:-1] + b',"timestamp":' + json_bytes(timestamp) + b"}"
+
+    return conditional.respond(
+        content_etag("json", data_json), render_json, "application/json", if_none_match, accept_encoding
+    )
+
+async def load_calendar_events(creds: Credentials, user_id: str) -> List[dict]:
+    """
+    The user's next calendar events, from data_cache when they were fetched moments ago.
+    """
+    async def fetch_events():
         service = build('calendar', 'v3', credentials=creds)
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        events_result = service.events().list(
+        events_result = await google_scheduler.execute("calendar", user_id, service.events().list(
             calendarId='primary',
             timeMin=now,
             maxResults=10,
             singleEvents=True,
             orderBy='startTime'
-        ).execute()
-        return {"events": events_result.get('items', [])}
+        ))
+        return events_result.get('items', [])
+
+    try:
+        return await data_cache.get((user_id, "calendar", "next_10"), fetch_events)
+    except QuotaDeadlineExceeded as e:
+        raise quota_exceeded_error(e)
+    except GoogleUpstreamError as e:
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/v1/data/heart_rate")
-async def get_heart_rate(creds: Credentials = Depends(get_credentials)):
+@app.get("/api/v1/data/calendar")
+async def get_calendar_events(
+    creds: Credentials = Depends(get_credentials),
+    user_id: str = Depends(get_user_id),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
     """
-    Fetches heart rate data for the last 24 hours.
+    Fetches the user's calendar events for the next 24 hours.
+    Returns the columnar binary encoding if requested via the Accept header.
+    Served from data_cache when the same user's events were fetched moments ago.
+    Answers 304 when If-None-Match holds the current ETag.
+    """
+    events = await load_calendar_events(creds, user_id)
+    return data_response(
+        {"events": events}, lambda: encode_user_data(calendar_events=events), accept, if_none_match, accept_encoding
+    )
+
+@app.get("/api/v1/data/calendar/stream")
+async def stream_calendar_events(
+    hours: int = Query(24, ge=1, le=CALENDAR_STREAM_MAX_HOURS),
+    page_size: int = Query(250, ge=1, le=CALENDAR_STREAM_MAX_PAGE_SIZE),
+    creds: Credentials = Depends(get_credentials),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Streams every calendar event in the next `hours` hours as newline-delimited JSON.
+    Pages are fetched lazily via nextPageToken while the response is being written.
+    If a later page fails, a final {"error": ...} line is emitted and the stream ends.
     """
+    service = build('calendar', 'v3', credentials=creds)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def list_page(page_token: Optional[str]):
+        return service.events().list(
+            calendarId='primary',
+            timeMin=now.isoformat(),
+            timeMax=(now + datetime.timedelta(hours=hours)).isoformat(),
+            maxResults=page_size,
+            singleEvents=True,
+            orderBy='startTime',
+            pageToken=page_token,
+            fields=CALENDAR_STREAM_FIELDS
+        )
+
+    # Fetch the first page before responding so auth/quota errors keep their status code
     try:
+        first_page = await google_scheduler.execute("calendar", user_id, list_page(None))
+    except QuotaDeadlineExceeded as e:
+        raise quota_exceeded_error(e)
+    except GoogleUpstreamError as e:
+        raise upstream_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def generate_events():
+        page = first_page
+        while True:
+            for event in page.get('items', []):
+                yield json.dumps(event) + "\n"
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                return
+            try:
+                page = await google_scheduler.execute("calendar", user_id, list_page(page_token))
+            except Exception as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+                return
+
+    return StreamingResponse(generate_events(), media_type="application/x-ndjson")
+
+async def load_heart_rate_points(creds: Credentials, user_id: str) -> List[dict]:
+    """
+    The user's heart rate points for the last 24 hours, from data_cache when they were fetched moments ago.
+    """
+    async def fetch_points():
         service = build('fitness', 'v1', credentials=creds)
         end_time_micros = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000000)
         start_time_micros = end_time_micros - (24 * 60 * 60 * 1000000)
         
         data_source = "derived:com.google.heart_rate.bpm:com.google.android.apps.fitness:blood_pressure"
         
-        data_points = service.users().dataSources().datasets().get(
+        data_points = await google_scheduler.execute("fitness", user_id, service.users().dataSources().datasets().get(
             userId="me",
             dataSourceId=data_source,
             datasetId=f"{start_time_micros}-{end_time_micros}"
-        ).execute()
-        
-        return {"heart_rate_data": data_points.get("point", [])}
+        ))
+        return data_points.get("point", [])
+
+    try:
+        return await data_cache.get((user_id, "heart_rate", "last_24h"), fetch_points)
+    except QuotaDeadlineExceeded as e:
+        raise quota_exceeded_error(e)
+    except GoogleUpstreamError as e:
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/data/heart_rate")
+async def get_heart_rate(
+    creds: Credentials = Depends(get_credentials),
+    user_id: str = Depends(get_user_id),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    Fetches heart rate data for the last 24 hours.
+    Returns the columnar binary encoding if requested via the Accept header.
+    Served from data_cache when the same user's data was fetched moments ago.
+    Answers 304 when If-None-Match holds the current ETag.
+    """
+    points = await load_heart_rate_points(creds, user_id)
+    return data_response(
+        {"heart_rate_data": points}, lambda: encode_user_data(heart_rate_data=points), accept, if_none_match, accept_encoding
+    )
+
 @app.get("/api/v1/data/aggregate")
-async def get_all_user_data(creds: Credentials = Depends(get_credentials)):
+async def get_all_user_data(
+    include_calendar: bool = True,
+    creds: Credentials = Depends(get_credentials),
+    user_id: str = Depends(get_user_id),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
     """
     A single endpoint to get all data required by the Assistant Service.
+    Callers that consume /api/v1/data/calendar/stream pass include_calendar=false.
+    Returns the columnar binary encoding if requested via the Accept header.
+    Answers 304 when If-None-Match holds the current ETag, which covers the data
+    but not the response timestamp.
     """
-    calendar_events = await get_calendar_events(creds=creds)
-    heart_rate_data = await get_heart_rate(creds=creds)
+    calendar_events = await load_calendar_events(creds, user_id) if include_calendar else []
+    heart_rate_data = await load_heart_rate_points(creds, user_id)
     
     # You can add more data points here
     
+    timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return data_response(
+        {"calendar_events": calendar_events, "heart_rate_data": heart_rate_data},
+        lambda: encode_user_data(
+            calendar_events=calendar_events, heart_rate_data=heart_rate_data, meta={"timestamp": timestamp}
+        ),
+        accept,
+        if_none_match,
+        accept_encoding,
+        timestamp=timestamp
+    )
+
+@app.get("/api/v1/data/emails/sync")
+async def sync_emails(
+    start_history_id: Optional[str] = None,
+    full: bool = False,
+    creds: Credentials = Depends(get_credentials),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Returns only the inbox messages added since the user's last sync (subject and
+    snippet, no bodies) and advances the user's Gmail historyId watermark.
+    Pass start_history_id to sync from an earlier point instead of the stored watermark.
+    The first sync (or one with full=true, or after the watermark expired) returns the
+    most recent messages instead.
+    """
+    try:
+        service = build('gmail', 'v1', credentials=creds)
+        return await gmail_sync.sync(service, user_id, start_history_id, full)
+    except QuotaDeadlineExceeded as e:
+        raise quota_exceeded_error(e)
+    except GoogleUpstreamError as e:
+        raise upstream_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to sync emails: {str(e)}")
+
+def build_calendar_event_body(event_request: CalendarEventRequest) -> dict:
+    """
+    Builds the Calendar API event resource for a break starting now.
+    """
+    # Calculate start and end times
+    start_time = datetime.datetime.now(datetime.timezone.utc)
+    end_time = start_time + datetime.timedelta(minutes=event_request.duration_minutes)
+    
+    return {
+        'summary': event_request.title,
+        'description': event_request.description,
+        'start': {
+            'dateTime': start_time.isoformat(),
+            'timeZone': 'UTC',
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': 'UTC',
+        },
+    }
+
+def build_draft_body(email_request: EmailRequest) -> dict:
+    """
+    Builds the Gmail API draft resource with a base64url-encoded RFC 2822 message.
+    """
+    # Create the email message
+    message = f"To: {email_request.to}\nSubject: {email_request.subject}\n\n{email_request.body}"
+    
+    # Encode the message
+    encoded_message = base64.urlsafe_b64encode(message.encode()).decode()
+    
     return {
-        "calendar_events": calendar_events["events"],
-        "heart_rate_data": heart_rate_data["heart_rate_data"],
-        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        'message': {
+            'raw': encoded_message
+        }
     }
 
+def summarize_bulk_results(results: List[dict]) -> dict:
+    """
+    Wraps per-item bulk results with an overall status and counts.
+    """
+    succeeded = sum(1 for r in results if r["status"] == "success")
+    failed = len(results) - succeeded
+    if failed == 0:
+        status = "success"
+    elif succeeded == 0:
+        status = "failed"
+    else:
+        status = "partial"
+    return {"status": status, "succeeded": succeeded, "failed": failed, "results": results}
+
+def validate_bulk_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="At least one item is required.")
+    if count > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items are accepted per request.")
+
 @app.post("/api/v1/create_calendar_event")
 async def create_calendar_event(
     event_request: CalendarEventRequest, 
-    creds: Credentials = Depends(get_credentials_from_token)
+    creds: Credentials = Depends(get_credentials_from_token),
+    user_id: str = Depends(get_user_id)
 ):
     """
     Creates a calendar event for the user.
@@ -207,24 +571,12 @@ async def create_calendar_event(
     try:
         service = build('calendar', 'v3', credentials=creds)
         
-        # Calculate start and end times
-        start_time = datetime.datetime.now(datetime.timezone.utc)
-        end_time = start_time + datetime.timedelta(minutes=event_request.duration_minutes)
+        event = build_calendar_event_body(event_request)
         
-        event = {
-            'summary': event_request.title,
-            'description': event_request.description,
-            'start': {
-                'dateTime': start_time.isoformat(),
-                'timeZone': 'UTC',
-            },
-            'end': {
-                'dateTime': end_time.isoformat(),
-                'timeZone': 'UTC',
-            },
-        }
-        
-        created_event = service.events().insert(calendarId='primary', body=event).execute()
+        created_event = await google_scheduler.execute(
+            "calendar", user_id, service.events().insert(calendarId='primary', body=event)
+        )
+        invalidate_user_data(user_id, "calendar")
         
         return {
             "status": "success",
@@ -232,13 +584,18 @@ async def create_calendar_event(
             "event_link": created_event.get('htmlLink'),
             "message": f"Event '{event_request.title}' created successfully"
         }
+    except QuotaDeadlineExceeded as e:
+        raise quota_exceeded_error(e)
+    except GoogleUpstreamError as e:
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create calendar event: {str(e)}")
 
 @app.post("/api/v1/draft_email")
 async def draft_email(
     email_request: EmailRequest, 
-    creds: Credentials = Depends(get_credentials_from_token)
+    creds: Credentials = Depends(get_credentials_from_token),
+    user_id: str = Depends(get_user_id)
 ):
     """
     Creates a draft email using Gmail API.
@@ -246,28 +603,109 @@ async def draft_email(
     try:
         service = build('gmail', 'v1', credentials=creds)
         
-        # Create the email message
-        message = f"To: {email_request.to}\nSubject: {email_request.subject}\n\n{email_request.body}"
+        draft = build_draft_body(email_request)
         
-        # Encode the message
-        encoded_message = base64.urlsafe_b64encode(message.encode()).decode()
-        
-        draft = {
-            'message': {
-                'raw': encoded_message
-            }
-        }
-        
-        created_draft = service.users().drafts().create(userId='me', body=draft).execute()
+        created_draft = await google_scheduler.execute(
+            "gmail", user_id, service.users().drafts().create(userId='me', body=draft)
+        )
         
         return {
             "status": "success",
             "draft_id": created_draft.get('id'),
             "message": f"Draft email to {email_request.to} created successfully"
         }
+    except QuotaDeadlineExceeded as e:
+        raise quota_exceeded_error(e)
+    except GoogleUpstreamError as e:
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create email draft: {str(e)}")
 
+@app.post("/api/v1/create_calendar_events")
+async def create_calendar_events(
+    bulk_request: BulkCalendarEventRequest,
+    creds: Credentials = Depends(get_credentials_from_token),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Creates many calendar events using Google batch requests.
+    Returns a result per event, in request order; only failed items are retried.
+    """
+    validate_bulk_size(len(bulk_request.events))
+    try:
+        service = build('calendar', 'v3', credentials=creds)
+        
+        factories = [
+            (lambda body=build_calendar_event_body(event_request):
+                service.events().insert(calendarId='primary', body=body))
+            for event_request in bulk_request.events
+        ]
+        outcomes = await google_batch_runner.run("calendar", user_id, service, factories)
+        invalidate_user_data(user_id, "calendar")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create calendar events: {str(e)}")
+    
+    results = []
+    for index, (event_request, outcome) in enumerate(zip(bulk_request.events, outcomes)):
+        if outcome["ok"]:
+            created_event = outcome["response"]
+            results.append({
+                "index": index,
+                "status": "success",
+                "event_id": created_event.get('id'),
+                "event_link": created_event.get('htmlLink'),
+                "message": f"Event '{event_request.title}' created successfully"
+            })
+        else:
+            results.append({
+                "index": index,
+                "status": "error",
+                "status_code": outcome["status_code"],
+                "detail": f"Failed to create calendar event: {outcome['error']}"
+            })
+    return summarize_bulk_results(results)
+
+@app.post("/api/v1/draft_emails")
+async def draft_emails(
+    bulk_request: BulkEmailRequest,
+    creds: Credentials = Depends(get_credentials_from_token),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Creates many Gmail drafts using Google batch requests.
+    Returns a result per draft, in request order; only failed items are retried.
+    """
+    validate_bulk_size(len(bulk_request.emails))
+    try:
+        service = build('gmail', 'v1', credentials=creds)
+        
+        factories = [
+            (lambda body=build_draft_body(email_request):
+                service.users().drafts().create(userId='me', body=body))
+            for email_request in bulk_request.emails
+        ]
+        outcomes = await google_batch_runner.run("gmail", user_id, service, factories)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create email drafts: {str(e)}")
+    
+    results = []
+    for index, (email_request, outcome) in enumerate(zip(bulk_request.emails, outcomes)):
+        if outcome["ok"]:
+            results.append({
+                "index": index,
+                "status": "success",
+                "draft_id": outcome["response"].get('id'),
+                "message": f"Draft email to {email_request.to} created successfully"
+            })
+        else:
+            results.append({
+                "index": index,
+                "status": "error",
+                "status_code": outcome["status_code"],
+                "detail": f"Failed to create email draft: {outcome['error']}"
+            })
+    return summarize_bulk_results(results)
+
 @app.post("/api/v1/send_slack_notification")
 async def send_slack_notification(
     notification_request: SlackNotificationRequest,
@@ -275,6 +713,8 @@ async def send_slack_notification(
 ):
     """
     Sends a Slack notification using webhook.
+    Messages to the same channel arriving within SLACK_COALESCE_WINDOW_SECONDS are
+    delivered together as one digest post.
     """
     try:
         slack_webhook_url = os.getenv("SLACK_WEBHOOK_URL")
@@ -286,20 +726,21 @@ async def send_slack_notification(
                 "note": "Set SLACK_WEBHOOK_URL environment variable for actual Slack integration"
             }
         
-        # Use Slack SDK for better handling
-        webhook = WebhookClient(slack_webhook_url)
-        response = webhook.send(
-            text=notification_request.message
+        # Shared async sender: reuses connections and coalesces bursts per channel
+        sender = await get_slack_sender(slack_webhook_url)
+        result = await sender.send(
+            notification_request.channel,
+            notification_request.message
         )
         
-        if response.status_code == 200:
-            return {
-                "status": "success",
-                "message": f"Notification sent to {notification_request.channel}"
-            }
-        else:
-            raise HTTPException(status_code=response.status_code, detail="Failed to send Slack notification")
-            
+        return {
+            "status": "success",
+            "message": f"Notification sent to {notification_request.channel}",
+            "coalesced_messages": result["coalesced_messages"]
+        }
+    
+    except SlackDeliveryError as e:
+        raise HTTPException(status_code=e.status_code, detail="Failed to send Slack notification")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send Slack notification: {str(e)}")
 
@@ -308,4 +749,22 @@ async def health_check():
     """
     Health check endpoint for service monitoring.
     """
-    return {"status": "healthy", "service": "integrations"}
\ No newline at end of file
+    return {"status": "healthy", "service": "integrations"}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime metrics for capacity monitoring (Google quota usage, queue depth, throttle time).
+    """
+    return {
+        "service": "integrations",
+        "google_quota": google_scheduler.snapshot(),
+        "slack": slack_sender.snapshot() if slack_sender is not None else None,
+        "gmail_sync": gmail_sync.snapshot(),
+        "data_cache": data_cache.snapshot(),
+        "conditional_responses": conditional.snapshot(),
+        "deadlines": dict(resilience.deadline_stats),
+        "tracing": tracer.snapshot(),
+        "profiling": profiler.snapshot(),
+        "event_loop": loop_monitor.snapshot()
+    }
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Request deadlines propagated by callers.
+
+The Assistant and Actions Services send the time they will still wait for a
+response in the X-Request-Deadline-Ms header. DeadlineMiddleware turns it into
+a deadline for the request. A request that arrives with no budget left gets a
+504 straight away. Otherwise the GoogleRequestScheduler stops queueing and
+retrying at the deadline instead of working on an answer nobody is waiting for.
+
+The deadline functions and DeadlineMiddleware are the same in every service's
+resilience.py, so a budget means the same thing at each hop.
+"""
+
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, Mapping, Optional
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Absolute deadline (time.monotonic()) of the request being served, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+deadline_stats = {"with_deadline": 0, "expired_on_arrival": 0}
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Runs the block under a deadline `seconds` from now, or the enclosing one if that is sooner.
+    """
+    current = _deadline.get()
+    deadline = current
+    if seconds is not None and seconds > 0:
+        deadline = time.monotonic() + seconds
+        if current is not None:
+            deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """
+    Seconds left before the current request's deadline (may be negative), or None without one.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_headers() -> Dict[str, str]:
+    """
+    The header telling a downstream service how long the caller will still wait.
+    """
+    remaining = remaining_seconds()
+    return {} if remaining is None else {DEADLINE_HEADER: str(max(0, int(remaining * 1000)))}
+
+
+def deadline_from_headers(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    The caller's remaining budget in seconds from an X-Request-Deadline-Ms header
+    (0 or less once it has passed), or None without a valid header.
+    """
+    for key, value in headers.items():
+        if key.lower() == DEADLINE_HEADER.lower():
+            try:
+                return int(value) / 1000
+            except ValueError:
+                return None
+    return None
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: runs each request under the deadline its caller sent (if any).
+    A request that arrives with no budget left is answered 504 without running it.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = deadline_from_headers(
+            {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        )
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        deadline_stats["with_deadline"] += 1
+        if budget <= 0:
+            deadline_stats["expired_on_arrival"] += 1
+            body = json.dumps({"detail": "Request deadline already passed"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        with deadline_scope(budget):
+            await self.app(scope, receive, send)
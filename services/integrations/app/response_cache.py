@@ -0,0 +1,131 @@
+"""
+Short-lived cache with single-flight fetching for the Google-backed data endpoints.
+
+The dashboard, the Assistant Service and its scheduler often ask for the same
+user's calendar or heart rate within a second of each other. Entries are keyed
+on (user, endpoint, window). For each key:
+
+- A fresh entry (younger than `ttl_seconds`) is served straight from memory.
+- A stale entry (up to `stale_seconds` past the TTL) is still served, and one
+  background fetch refreshes it (stale-while-revalidate).
+- Otherwise the caller fetches. Concurrent callers for the same key wait on
+  that one in-flight fetch instead of starting their own ("coalesced").
+
+The fetch runs as its own task, so a caller that disconnects does not cancel
+it for the others. Failures are not cached: every waiter of a failed fetch gets
+the exception, and a failed background refresh leaves the stale entry in place.
+At most `max_entries` results are kept (least recently used are evicted).
+
+Cached values are shared between requests and must be treated as read-only.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlightCache:
+    """
+    TTL + stale-while-revalidate cache where concurrent misses share one fetch.
+    """
+    def __init__(self, ttl_seconds: float = 15.0, stale_seconds: float = 45.0, max_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        # key -> (stored at (monotonic), value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+            "refreshes": 0, "fetch_errors": 0, "evictions": 0, "invalidations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic(), value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _start_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        async def run():
+            try:
+                value = await fetch()
+            except Exception:
+                self.stats["fetch_errors"] += 1
+                raise
+            # Invalidated while in flight: the result may predate the change, so serve it but do not keep it
+            if self._in_flight.get(key) is task:
+                self._store(key, value)
+            return value
+
+        task = asyncio.ensure_future(run())
+        self._in_flight[key] = task
+
+        def done(finished: asyncio.Task):
+            if self._in_flight.get(key) is finished:
+                del self._in_flight[key]
+            # Retrieve the exception so unawaited background refreshes do not log warnings
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(done)
+        return task
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for `key`, calling `fetch()` (at most once at a time per key) when needed.
+        """
+        if not self.enabled:
+            return await fetch()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._entries.move_to_end(key)
+                self.stats["stale_hits"] += 1
+                if key not in self._in_flight:
+                    self.stats["refreshes"] += 1
+                    self._start_fetch(key, fetch)
+                return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = self._start_fetch(key, fetch)
+        # shield: a disconnecting caller must not cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+    def invalidate(self, match: Callable[[Hashable], bool]):
+        """
+        Drops every entry whose key satisfies `match` (e.g. after the user changed their calendar).
+        """
+        for key in [key for key in self._entries if match(key)]:
+            del self._entries[key]
+            self.stats["invalidations"] += 1
+        for key in [key for key in self._in_flight if match(key)]:
+            del self._in_flight[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_rate": round((lookups - self.stats["misses"]) / lookups, 4) if lookups else None,
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,196 @@
+"""
+Shared asynchronous Slack webhook sender with per-channel message coalescing.
+
+All notifications go through one AsyncWebhookClient backed by a single
+aiohttp session, so connections to Slack are reused. Messages for the same
+channel that arrive within SLACK_COALESCE_WINDOW_SECONDS are combined into
+one digest post; every caller awaits the outcome of the digest its message
+was part of. 429 responses are retried after the Retry-After interval Slack
+asks for (exponential backoff for 5xx or when the header is missing).
+"""
+
+import asyncio
+import os
+import random
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from slack_sdk.webhook.async_client import AsyncWebhookClient
+
+from app.tracing import Tracer
+
+
+class SlackDeliveryError(Exception):
+    """
+    Raised to every waiter of a digest that Slack did not accept.
+    """
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Slack returned {status_code}: {body}")
+        self.status_code = status_code
+
+
+def format_digest(messages: List[str]) -> str:
+    """
+    Combine queued messages into one post; identical messages are listed once with a count.
+    """
+    if len(messages) == 1:
+        return messages[0]
+    counts = Counter(messages)
+    lines = [f"• {message}" + (f" (×{count})" if count > 1 else "") for message, count in counts.items()]
+    return f"Harmonia digest ({len(messages)} updates):\n" + "\n".join(lines)
+
+
+def _retry_after_seconds(headers: Any) -> Optional[float]:
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class SlackDigestSender:
+    """
+    Coalescing, rate-limit-aware Slack webhook sender. Create one per process.
+    """
+    def __init__(
+        self,
+        webhook_url: str,
+        window_seconds: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        timeout: int = 30,
+        tracer: Optional[Tracer] = None,
+    ):
+        self.webhook_url = webhook_url
+        self.window_seconds = (
+            window_seconds if window_seconds is not None
+            else float(os.getenv("SLACK_COALESCE_WINDOW_SECONDS", "1.0"))
+        )
+        self.max_batch = max_batch or int(os.getenv("SLACK_COALESCE_MAX_MESSAGES", "20"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("SLACK_MAX_RETRIES", "3"))
+        self.timeout = timeout
+        self.tracer = tracer or Tracer("integrations", exporter="none")
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._client: Optional[AsyncWebhookClient] = None
+        # channel -> [(message, future)] waiting for the next digest
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+        self._channel_locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: set = set()
+        self.stats = {
+            "messages_received": 0,
+            "digests_sent": 0,
+            "messages_coalesced": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "failed_digests": 0,
+        }
+
+    def _get_client(self) -> AsyncWebhookClient:
+        if self._client is None:
+            self._session = aiohttp.ClientSession()
+            self._client = AsyncWebhookClient(self.webhook_url, timeout=self.timeout, session=self._session)
+        return self._client
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def send(self, channel: str, message: str) -> Dict[str, Any]:
+        """
+        Queue a message for `channel` and wait until the digest containing it is delivered.
+        """
+        self.stats["messages_received"] += 1
+        future = asyncio.get_running_loop().create_future()
+        queue = self._pending.setdefault(channel, [])
+        queue.append((message, future))
+
+        if len(queue) >= self.max_batch or self.window_seconds <= 0:
+            timer = self._timers.pop(channel, None)
+            if timer:
+                timer.cancel()
+            self._spawn(self._flush(channel))
+        elif channel not in self._timers:
+            self._timers[channel] = self._spawn(self._flush_after(channel, self.window_seconds))
+
+        return await future
+
+    async def _flush_after(self, channel: str, delay: float):
+        await asyncio.sleep(delay)
+        self._timers.pop(channel, None)
+        await self._flush(channel)
+
+    async def _flush(self, channel: str):
+        batch = self._pending.pop(channel, [])
+        if not batch:
+            return
+
+        # Digests for one channel are posted one at a time, in order
+        lock = self._channel_locks.setdefault(channel, asyncio.Lock())
+        async with lock:
+            try:
+                await self._post(format_digest([message for message, _ in batch]))
+                self.stats["digests_sent"] += 1
+                self.stats["messages_coalesced"] += len(batch) - 1
+                result = {"status": "success", "channel": channel, "coalesced_messages": len(batch)}
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                self.stats["failed_digests"] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _post(self, text: str):
+        client = self._get_client()
+        attempt = 0
+        while True:
+            with self.tracer.span("slack.webhook", kind="client", attempt=attempt + 1) as span:
+                response = await client.send(text=text)
+                span.set_attribute("http.status_code", response.status_code)
+            if response.status_code == 200:
+                return response
+
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or attempt >= self.max_retries:
+                raise SlackDeliveryError(response.status_code, response.body)
+
+            delay = _retry_after_seconds(response.headers) if response.status_code == 429 else None
+            if response.status_code == 429:
+                self.stats["rate_limited"] += 1
+            if delay is None:
+                delay = min(30.0, 0.5 * (2 ** attempt))
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay + random.uniform(0, 0.25 * delay))
+
+    async def close(self):
+        """
+        Deliver anything still queued, then release the HTTP session.
+        """
+        for timer in list(self._timers.values()):
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(*(self._flush(channel) for channel in list(self._pending)), return_exceptions=True)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            self._client = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "window_seconds": self.window_seconds,
+            "pending_by_channel": {channel: len(queue) for channel, queue in self._pending.items()},
+        }
@@ -0,0 +1,198 @@
+"""
+Single-flight fetching, TTL and stale-while-revalidate of the data endpoint cache.
+"""
+
+import asyncio
+
+import pytest
+
+from app.response_cache import SingleFlightCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    # Only the cache's clock: the event loop keeps the real one
+    monkeypatch.setattr("app.response_cache.time", fake)
+    return fake
+
+
+class Source:
+    """
+    A fetch that counts its calls and can be held open until released.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.fail = False
+        self.hold = False
+
+    async def fetch(self):
+        self.calls += 1
+        call = self.calls
+        if self.hold:
+            await self.release.wait()
+        if self.fail:
+            raise RuntimeError(f"fetch {call} failed")
+        return {"call": call}
+
+
+def test_concurrent_misses_share_one_fetch(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(), Source()
+        source.hold = True
+        waiters = [asyncio.ensure_future(cache.get("k", source.fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        source.release.set()
+        return await asyncio.gather(*waiters), cache, source
+
+    results, cache, source = asyncio.run(scenario())
+    assert source.calls == 1
+    assert results == [{"call": 1}] * 5
+    assert cache.stats["misses"] == 1
+    assert cache.stats["coalesced"] == 4
+
+
+def test_fresh_entries_are_served_from_memory(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(ttl_seconds=15), Source()
+        first = await cache.get("k", source.fetch)
+        clock.now += 14
+        return first, await cache.get("k", source.fetch), cache, source
+
+    first, second, cache, source = asyncio.run(scenario())
+    assert first == second == {"call": 1}
+    assert source.calls == 1
+    assert cache.stats["hits"] == 1
+
+
+def test_stale_entries_are_served_while_one_refresh_runs(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(ttl_seconds=15, stale_seconds=45), Source()
+        await cache.get("k", source.fetch)
+        clock.now += 20
+        stale = [await cache.get("k", source.fetch) for _ in range(3)]
+        await asyncio.sleep(0)
+        return stale, await cache.get("k", source.fetch), cache, source
+
+    stale, refreshed, cache, source = asyncio.run(scenario())
+    assert stale == [{"call": 1}] * 3
+    assert refreshed == {"call": 2}
+    assert source.calls == 2
+    assert cache.stats["stale_hits"] == 3
+    assert cache.stats["refreshes"] == 1
+
+
+def test_entries_past_the_stale_window_are_fetched_again(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(ttl_seconds=15, stale_seconds=45), Source()
+        await cache.get("k", source.fetch)
+        clock.now += 60
+        return await cache.get("k", source.fetch), cache
+
+    value, cache = asyncio.run(scenario())
+    assert value == {"call": 2}
+    assert cache.stats["misses"] == 2
+
+
+def test_failures_reach_every_waiter_and_are_not_cached(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(), Source()
+        source.hold, source.fail = True, True
+        waiters = [asyncio.ensure_future(cache.get("k", source.fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        source.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        source.fail = False
+        return results, await cache.get("k", source.fetch), cache
+
+    results, retried, cache = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == {"call": 2}
+    assert cache.stats["fetch_errors"] == 1
+
+
+def test_failed_refresh_keeps_the_stale_entry(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(ttl_seconds=15, stale_seconds=45), Source()
+        await cache.get("k", source.fetch)
+        clock.now += 20
+        source.fail = True
+        stale = await cache.get("k", source.fetch)
+        await asyncio.sleep(0)
+        return stale, await cache.get("k", source.fetch), cache
+
+    stale, still_stale, cache = asyncio.run(scenario())
+    assert stale == still_stale == {"call": 1}
+    assert cache.stats["fetch_errors"] == 1
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_fetch(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(), Source()
+        source.hold = True
+        leaving = asyncio.ensure_future(cache.get("k", source.fetch))
+        staying = asyncio.ensure_future(cache.get("k", source.fetch))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        source.release.set()
+        return await staying, leaving.cancelled(), source
+
+    value, cancelled, source = asyncio.run(scenario())
+    assert cancelled
+    assert value == {"call": 1}
+    assert source.calls == 1
+
+
+def test_invalidation_drops_entries_and_in_flight_results(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(), Source()
+        await cache.get(("u1", "calendar"), source.fetch)
+        await cache.get(("u2", "calendar"), source.fetch)
+        source.hold = True
+        in_flight = asyncio.ensure_future(cache.get(("u1", "heart_rate"), source.fetch))
+        await asyncio.sleep(0)
+        cache.invalidate(lambda key: key[0] == "u1")
+        source.release.set()
+        await in_flight
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.stats["invalidations"] == 1
+    # The fetch that was in flight during the invalidation is served but not kept
+    assert cache.snapshot()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(max_entries=2), Source()
+        for key in ("a", "b"):
+            await cache.get(key, source.fetch)
+        await cache.get("a", source.fetch)
+        await cache.get("c", source.fetch)
+        await cache.get("a", source.fetch)
+        await cache.get("b", source.fetch)
+        return cache, source
+
+    cache, source = asyncio.run(scenario())
+    assert source.calls == 4
+    assert cache.stats["evictions"] == 2
+
+
+def test_disabled_cache_always_fetches(clock):
+    async def scenario():
+        cache, source = SingleFlightCache(ttl_seconds=0), Source()
+        await cache.get("k", source.fetch)
+        await cache.get("k", source.fetch)
+        return source
+
+    assert asyncio.run(scenario()).calls == 2
@@ -0,0 +1,105 @@
+"""
+Summarizes the shadow scoring log written by the Assistant Service (SHADOW_LOG_PATH).
+
+Reads the current log and its rotated backups (shadow_scoring.jsonl,
+shadow_scoring.jsonl.1, ...) and prints, per candidate model, the agreement
+with the live model, the stress-level deltas, a live-vs-candidate confusion
+matrix and the inference latency of both. Several logs (one per preforked
+worker) are merged in time order.
+
+    python tools/shadow_report.py services/assistant/shadow_scoring.jsonl
+    python tools/shadow_report.py services/assistant/shadow_scoring.worker-*.jsonl
+    python tools/shadow_report.py shadow_scoring.jsonl --since 2026-10-01T00:00:00 --no-matrix
+"""
+
+import argparse
+import glob
+import json
+import statistics
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+
+def load_records(path, since=None):
+    # Oldest backup (highest suffix) first, so records come out in time order
+    backups = [p for p in glob.glob(f"{path}.*") if p.rsplit(".", 1)[1].isdigit()]
+    backups.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+    records = []
+    for log_path in backups + [path]:
+        try:
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        record = json.loads(line)
+                        if since is None or record["timestamp"] >= since:
+                            records.append(record)
+        except FileNotFoundError:
+            continue
+    return records
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def render_matrix(pairs):
+    levels = sorted({level for pair in pairs for level in pair})
+    counts = Counter(pairs)
+    lines = ["    live \\ cand " + "".join(f"{level:>6}" for level in levels)]
+    for live in levels:
+        lines.append(f"    {live:>11} " + "".join(f"{counts.get((live, cand), 0) or '.':>6}" for cand in levels))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="+", help="paths of the current shadow logs (rotated backups are read too)")
+    parser.add_argument("--since", help="only records at or after this ISO timestamp (UTC)")
+    parser.add_argument("--no-matrix", action="store_true", help="skip the confusion matrices")
+    args = parser.parse_args()
+
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc).timestamp()
+    records = [record for path in args.logs for record in load_records(path, since)]
+    if len(args.logs) > 1:
+        records.sort(key=lambda record: record["timestamp"])
+    if not records:
+        print("No shadow records found.")
+        return
+
+    live_latencies = [record["live_latency_ms"] for record in records]
+    pairs = defaultdict(list)
+    latencies = defaultdict(list)
+    errors = Counter()
+    for record in records:
+        for name, result in record["candidates"].items():
+            if "error" in result:
+                errors[name] += 1
+                continue
+            pairs[name].append((record["live_level"], result["level"]))
+            latencies[name].append(result["latency_ms"])
+
+    first = datetime.fromtimestamp(records[0]["timestamp"], timezone.utc).isoformat(timespec="seconds")
+    last = datetime.fromtimestamp(records[-1]["timestamp"], timezone.utc).isoformat(timespec="seconds")
+    print(f"{len(records)} samples from {first} to {last}")
+    print(f"live model latency: p50 {percentile(live_latencies, 0.5):.2f} ms, p95 {percentile(live_latencies, 0.95):.2f} ms")
+    for name in sorted(set(pairs) | set(errors)):
+        model_pairs = pairs[name]
+        deltas = [cand - live for live, cand in model_pairs]
+        print(f"\n{name}: {len(model_pairs)} compared, {errors[name]} errors")
+        if not model_pairs:
+            continue
+        agreement = sum(1 for delta in deltas if delta == 0) / len(deltas)
+        print(f"  agreement {agreement:.1%}, mean delta {statistics.fmean(deltas):+.3f}, "
+              f"mean |delta| {statistics.fmean(abs(delta) for delta in deltas):.3f}")
+        print("  deltas: " + ", ".join(f"{delta:+d}: {count}" for delta, count in sorted(Counter(deltas).items())))
+        print(f"  latency: p50 {percentile(latencies[name], 0.5):.2f} ms, p95 {percentile(latencies[name], 0.95):.2f} ms")
+        if not args.no_matrix:
+            print(render_matrix(model_pairs))
+
+
+if __name__ == "__main__":
+    main()
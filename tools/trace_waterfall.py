@@ -0,0 +1,188 @@
+"""
+Rebuilds per-request waterfalls from the spans exported by the Harmonia services.
+
+Spans come from TRACE_EXPORTER=jsonl files (one per service) or from the local
+collector started by this tool (TRACE_EXPORTER=collector).
+
+    # run a collector that appends every span it receives to traces.jsonl
+    python tools/trace_waterfall.py collect --port 4319 --output traces.jsonl
+
+    # waterfalls of the 5 slowest /recommend requests
+    python tools/trace_waterfall.py show traces.jsonl --root "POST /api/v1/recommend" --slowest 5
+
+    # one specific trace, across per-service files
+    python tools/trace_waterfall.py show services/*/traces.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+
+    # time per (service, span name) across all traces
+    python tools/trace_waterfall.py summary traces.jsonl
+"""
+
+import argparse
+import glob
+import json
+import statistics
+import sys
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+
+
+def load_spans(patterns):
+    spans = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        spans.append(json.loads(line))
+    return spans
+
+
+def group_traces(spans):
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    return traces
+
+
+def trace_root(spans):
+    """
+    The span without a recorded parent that started first (the request's entry point).
+    """
+    ids = {span["span_id"] for span in spans}
+    roots = [span for span in spans if span.get("parent_id") not in ids]
+    return min(roots or spans, key=lambda span: span["start_time"])
+
+
+def render_waterfall(spans, width=40):
+    root = trace_root(spans)
+    origin = min(span["start_time"] for span in spans)
+    total_ms = max(
+        (span["start_time"] - origin) * 1000 + span["duration_ms"] for span in spans
+    ) or 1.0
+
+    children = defaultdict(list)
+    for span in spans:
+        children[span.get("parent_id")].append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span["start_time"])
+
+    lines = [f"trace {root['trace_id']}  {root['service']} {root['name']}  {total_ms:.1f} ms  ({len(spans)} spans)"]
+    seen = set()
+
+    def walk(span, depth):
+        if span["span_id"] in seen:
+            return
+        seen.add(span["span_id"])
+        offset_ms = (span["start_time"] - origin) * 1000
+        start_col = int(offset_ms / total_ms * width)
+        bar_len = max(1, int(span["duration_ms"] / total_ms * width))
+        bar = " " * start_col + "█" * min(bar_len, width - start_col)
+        label = f"{'  ' * depth}{span['service']}: {span['name']}"
+        flag = " !" if span.get("status") == "error" else ""
+        lines.append(f"{label:<60.60} {offset_ms:>9.1f} {span['duration_ms']:>9.1f}  |{bar:<{width}}|{flag}")
+        for child in children.get(span["span_id"], []):
+            walk(child, depth + 1)
+
+    lines.append(f"{'span':<60} {'start ms':>9} {'dur ms':>9}")
+    walk(root, 0)
+    # Spans whose parent was not exported (e.g. sampled out or from another file)
+    for span in sorted(spans, key=lambda span: span["start_time"]):
+        if span["span_id"] not in seen:
+            walk(span, 1)
+    return "\n".join(lines)
+
+
+def command_show(args):
+    traces = group_traces(load_spans(args.files))
+    if args.trace:
+        selected = [args.trace] if args.trace in traces else []
+    else:
+        candidates = [
+            (trace_root(spans), trace_id) for trace_id, spans in traces.items()
+            if not args.root or trace_root(spans)["name"] == args.root
+        ]
+        candidates.sort(key=lambda item: item[0]["duration_ms"], reverse=True)
+        selected = [trace_id for _, trace_id in candidates[:args.slowest]]
+
+    if not selected:
+        print("No matching traces.", file=sys.stderr)
+        return 1
+    for trace_id in selected:
+        print(render_waterfall(traces[trace_id], width=args.width))
+        print()
+    return 0
+
+
+def command_summary(args):
+    durations = defaultdict(list)
+    for span in load_spans(args.files):
+        durations[(span["service"], span["name"])].append(span["duration_ms"])
+
+    print(f"{'service':<14}{'span':<48}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'total ms':>12}")
+    rows = sorted(durations.items(), key=lambda item: sum(item[1]), reverse=True)
+    for (service, name), values in rows:
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"{service:<14}{name[:47]:<48}{len(values):>7}{statistics.median(values):>10.1f}{p95:>10.1f}{sum(values):>12.1f}")
+    return 0
+
+
+def command_collect(args):
+    lock = Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                spans = json.loads(body)
+            except json.JSONDecodeError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            with lock, open(args.output, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(span) + "\n" for span in spans))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *log_args):
+            pass
+
+    server = ThreadingHTTPServer((args.host, args.port), CollectorHandler)
+    print(f"Collecting spans on http://{args.host}:{args.port}/v1/spans into {args.output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("show", help="print request waterfalls")
+    show.add_argument("files", nargs="+", help="span JSONL files or glob patterns")
+    show.add_argument("--trace", help="trace id to show")
+    show.add_argument("--root", help="only traces whose root span has this name, e.g. 'POST /api/v1/recommend'")
+    show.add_argument("--slowest", type=int, default=5, help="number of slowest traces to show")
+    show.add_argument("--width", type=int, default=40, help="width of the timeline column")
+    show.set_defaults(handler=command_show)
+
+    summary = commands.add_parser("summary", help="latency per service and span name")
+    summary.add_argument("files", nargs="+")
+    summary.set_defaults(handler=command_summary)
+
+    collect = commands.add_parser("collect", help="run a local span collector")
+    collect.add_argument("--host", default="127.0.0.1")
+    collect.add_argument("--port", type=int, default=4319)
+    collect.add_argument("--output", default="traces.jsonl")
+    collect.set_defaults(handler=command_collect)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()